@@ -4,11 +4,25 @@
     * acq400.py : Acq400 class, represents an ACQ400 UUT
     * acq400_ui.py : common user interface elements for apps
     * netclient.py : Netclient class, TCP socket wrapper
-    * shotcontrol.py : Shotcontrol class, handles transient shots
+    * shotcontrol.py : Shotcontrol class, handles transient shots, one event loop for all uuts, concurrent upload, phase timing, ShotPipeline overlapped shot loop
     * acq400_print.py : cmd line interface functions
     * agilent33210.py : SCPI cmd wrapper
     * cleanup.py : cleanup on exit
     * rad_dds.py : support for RADCELF triple DDS
+    * demuxer.py : host side demux engine
+    * dirfile.py : incremental per channel dirfile writer, reader
+    * aionetclient.py : asyncio site clients, pipelined batch_get/batch_set
+    * schema_cache.py : persisted site list and knob tables, lazy site connection
+    * es_index.py : vectorized event signature index, persisted beside the data
+    * es_split.py : split files or live streams into bursts at each event signature
+    * stl.py : STL normalise and pipelined pattern generator upload
+    * waveforms.py : vectorized, cached AWG waveforms and DAC ready channel sets
+    * calibration.py : per channel slope, offset as arrays, block raw to volts conversion
+    * slowmon.py : batched slowmon ring buffer reader, gap detection, binary and CSV sinks
+    * slowmon_archive.py : asyncio multi uut slowmon archive, rolling chunks, time indexed query
+    * stream_engine.py : receive thread, buffer pool, bounded queue and sinks for continuous streams
+    * disk_writer.py : aligned staging, writev, O_DIRECT, preallocated rolling files, fsync policy
+    * continuity.py : vectorized spad sample count, TLATCH continuity check across buffers
 
 """
 import sys
@@ -16,6 +30,7 @@ import sys
 from .netclient import Netclient
 from .netclient import Siteclient
 from .netclient import Logclient
+from .netclient import LazySiteclient
 from .acq400 import Acq400, STATE, AcqPorts, Mgt508Ports, ChannelClient, MgtDramPullClient, sigsel, factory, Mgt508
 from .acq400 import freq, freqpv, intpv, pv, activepv, floatpv
 from .acq400 import Acq2106
@@ -27,11 +42,19 @@ if sys.version_info > (3, 0):
 from .shotcontrol import *
 from . import cleanup
 from . import awg_data
+from . import slowmon
+from . import stream_engine
+from . import disk_writer
+from . import continuity
 from .acq400_ui import Acq400UI, ArgTypes
 from .acq400_print import PR, pprint
 from .intSI import *
 from .debug import Debugger
 from .utils import timing, timing_ms
+from .demuxer import demux, demux_spad
+from .dirfile import DirfileWriter, DirfileReader
+from .calibration import Calibration
+from .aionetclient import AsyncSiteclient, AsyncAcq400
 from .afhba404 import *
 from .agilent33210 import Agilent33210A
 from .propellor import *
@@ -18,6 +18,8 @@ acq400.py interface to one acq400 appliance instance
 """
 
 import threading
+import selectors
+import asyncio
 import re
 
 import os
@@ -36,6 +38,15 @@ import timeit
 import time
 
 from . import utils
+from . import dirfile
+from . import schema_cache
+from . import es_index
+from . import stl as stl_mod
+from . import calibration
+from . import slowmon
+from . import stream_engine
+from . import disk_writer
+from . import continuity
 
 class DataNotAvailableError(Exception):
     pass
@@ -147,34 +158,55 @@ class RawClient(netclient.Netclient):
         """
         netclient.Netclient.__init__(self, addr, port)
 
-    def read(self, nelems, data_size=2):
+    def read_into(self, out):
+        """read data from channel data server direct to caller-owned buffer
+
+        Args:
+            out (ndarray|memoryview|bytearray): contiguous, writable buffer eg np.memmap
+        Returns:
+            int: bytes received, less than len(out) on early termination
+        """
+        view = memoryview(out).cast('B')
+        pos = 0
+        while pos < len(view):
+            nrx = self.sock.recv_into(view[pos:])
+            if nrx == 0:
+                break               # end of file
+            pos += nrx
+        return pos
+
+    def read(self, nelems, data_size=2, out=None):
         """read data from channel data server
 
         Args:
             nelems (int): data elements 
             data_size (int, optional): data size in bytes 2|4 short or int. Defaults to 2.
+            out (ndarray|memoryview, optional): receive into this buffer, no copy, C contiguous, any dtype,
+                at least nelems*data_size bytes. Defaults to new array.
         Returns:
-            ndarray: channel data
+            ndarray: channel data, a view of out if supplied
+        Raises:
+            ValueError: out is not C contiguous or too small
         """
         _dtype = np.dtype('i4' if data_size == 4 else 'i2')   # hmm, what if unsigned?
 
-        buf = bytearray(nelems*data_size)
-        try:
-            view = memoryview(buf).cast('B')
-        except:
-            # python 2.7 hack
-            view = memoryview(buf)
-        pos = 0
-        while len(view):
-            nrx = self.sock.recv_into(view)
-            if nrx == 0:
-                break               # end of file
-            view = view[nrx:]
-            pos += nrx
+        nbuf = nelems*data_size // _dtype.itemsize
+
+        if out is None:
+            buf = np.empty(nbuf, _dtype)
+        else:
+            if isinstance(out, np.ndarray) and not out.flags.c_contiguous:
+                raise ValueError("out must be C contiguous")
+            view = memoryview(out).cast('B')
+            if view.nbytes < nbuf * _dtype.itemsize:
+                raise ValueError("out {} bytes, need {}".format(view.nbytes, nbuf * _dtype.itemsize))
+            buf = np.frombuffer(view, _dtype, count=nbuf)
+
+        pos = self.read_into(buf) // _dtype.itemsize
 
-        if pos > 0 and pos < nelems:
-            print("WARNING: early termination at {}/{}".format(pos, nelems))
-        return np.frombuffer(buf[:pos], _dtype)
+        if pos > 0 and pos < len(buf):
+            print("WARNING: early termination at {}/{}".format(pos, len(buf)))
+        return buf[:pos]
 
     def get_blocks(self, nelems, data_size=2):
         block = np.array([1])
@@ -211,89 +243,222 @@ class ExitCommand(Exception):
 def signal_handler(signal, frame):
     raise ExitCommand()
 
-class Statusmonitor:
-    """ monitors the status channel
+class StatusMux:
+    """one thread multiplexing the status (TSTAT) connections of all uuts
 
-    Efficient event-driven monitoring in a separate thread
+    Lines are split per connection and handed to Statusmonitor.on_line(),
+    no per uut thread, no polling. Use StatusMux.instance().
     """
-    st_re = re.compile(r"([0-9]) ([0-9]+) ([0-9]+) ([0-9]+) ([0-9])+" )
-    st_shot_re = re.compile(r"SHOT=([0-9]),([0-9]+),([0-9]+),([0-9]+)")
-    st_failed_to_find_event_re = re.compile(r"ERROR EVENT NOT FOUND")
-    st_timer_re = re.compile(r"Timer::report\(([0-9]+)\) ([A-Z]{3}) ([0-9]+) msec")
+    _instance = None
+    _instance_lock = threading.Lock()
+    RX_CHUNK = 4096
 
-    def __repr__(self):
-        return repr(self.logclient)
-    
-    def st_monitor(self):
-        self.data_valid = "UNKNOWN"
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
 
-        while self.quit_requested == False:
+    @classmethod
+    def after_fork_in_child(cls):
+        """the mux thread does not survive fork(): the child starts its own on first use"""
+        cls._instance = None
+        cls._instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.ops = []                   # (register|unregister, monitor, done Event), run on the mux thread
+        self.lock = threading.Lock()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.rxbuf = bytearray(self.RX_CHUNK)
+        self.thread = threading.Thread(target=self.run, name="StatusMux", daemon=True)
+        self.thread.start()
+
+    def _op(self, op, monitor, wait):
+        done = threading.Event()
+        with self.lock:
+            self.ops.append((op, monitor, done))
+        self.wake_w.send(b'x')
+        if wait and threading.current_thread() is not self.thread:
+            done.wait(5)
+
+    def register(self, monitor):
+        self._op(True, monitor, False)
+
+    def unregister(self, monitor, wait=True):
+        self._op(False, monitor, wait)
+
+    def _run_ops(self):
+        try:
+            while self.wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self.lock:
+            ops, self.ops = self.ops, []
+        for register, monitor, done in ops:
+            sock = monitor.logclient.sock
             try:
-                st = self.logclient.poll()
-            except OSError as err:
-                if self.quit_requested:
-                    return
+                if register:
+                    self.selector.register(sock, selectors.EVENT_READ, monitor)
                 else:
-                    raise err
+                    self.selector.unregister(sock)
+            except (KeyError, ValueError, OSError):
+                pass
+            done.set()
 
-            if self.trace > 1:
-                print("%s <%s>" % (repr(self), st))
+    def run(self):
+        view = memoryview(self.rxbuf)
+        while True:
+            for key, mask in self.selector.select():
+                monitor = key.data
+                if monitor is None:
+                    self._run_ops()
+                    continue
+                try:
+                    nrx = key.fileobj.recv_into(view)
+                except OSError:
+                    nrx = 0
+                if nrx == 0:
+                    self.selector.unregister(key.fileobj)
+                    monitor.on_closed()
+                    continue
+                try:
+                    monitor.on_data(view[:nrx])
+                except Exception as err:
+                    print("ERROR: StatusMux {} {}".format(repr(monitor), err))
 
 
-            match = self.st_failed_to_find_event_re.search(st)
-            if match:
-                self.data_valid = "ERROR EVENT NOT FOUND"
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=StatusMux.after_fork_in_child)
 
-            match = self.st_timer_re.search(st)
-            if match:
-                print("TIMER: {} {} {} ms".format(match.group(2), match.group(1), match.group(3)))
-                if match.group(2) == "ROI":
+
+class Statusmonitor:
+    """ monitors the status channel
+
+    Efficient event-driven monitoring: all uuts share one StatusMux thread,\
+    each line is parsed in one pass, waits block on a Condition, no polling.
+    """
+    # one combined pattern: ERROR, Timer::report, SHOT= or the 5 field status
+    st_all_re = re.compile(r"(?P<fail>ERROR EVENT NOT FOUND)"
+                           r"|Timer::report\((?P<timer_n>[0-9]+)\) (?P<timer_k>[A-Z]{3}) (?P<timer_ms>[0-9]+) msec"
+                           r"|SHOT=(?P<shot>[0-9],[0-9]+,[0-9]+,[0-9]+)"
+                           r"|(?P<st>[0-9] [0-9]+ [0-9]+ [0-9]+ [0-9]+)")
+    EOL = b"\r\n"
+
+    def __repr__(self):
+        return repr(self.logclient)
+
+    def on_data(self, chunk):
+        """StatusMux: bytes received, split to lines"""
+        self.rxbuf += chunk
+        if self.rxbuf.find(self.EOL, max(0, len(self.rxbuf) - len(chunk) - 1)) < 0:
+            return
+        *lines, rest = bytes(self.rxbuf).split(self.EOL)
+        self.rxbuf = bytearray(rest)
+        for line in lines:
+            if self.quit_requested:
+                return
+            self.on_line(line.decode("latin-1"))
+
+    def on_closed(self):
+        if not self.quit_requested:
+            print("{} status connection closed".format(self.uut))
+        self.set_flag(closed=True)
+
+    def on_line(self, st):
+        if self.trace > 1:
+            print("%s <%s>" % (repr(self), st))
+
+        # fast path, the common line is just the 5 status fields
+        fields = st.split()
+        if len(fields) == 5 and all(ff.isdigit() for ff in fields):
+            self.on_status([int(x) for x in fields])
+            return
+
+        for match in self.st_all_re.finditer(st):
+            kind = match.lastgroup
+            if kind == "fail":
+                self.data_valid = "ERROR EVENT NOT FOUND"
+            elif kind == "timer_ms":
+                print("TIMER: {} {} {} ms".format(match.group("timer_k"), match.group("timer_n"), match.group("timer_ms")))
+                if match.group("timer_k") == "ROI":
                     self.search_roi_count += 1
-                elif match.group(2) == "ALL":
+                elif match.group("timer_k") == "ALL":
                     self.search_all_count += 1
                 else:
-                    print("ERROR bad match {}".format(match.group(1)))
-
-            match = self.st_shot_re.search(st)
-            if match:
-                status1 = [int(x) for x in match.groups()]
+                    print("ERROR bad match {}".format(match.group("timer_n")))
+            elif kind == "shot":
+                status1 = [int(x) for x in match.group("shot").split(",")]
                 if status1[0] == 1:
                     self.data_valid = "ARM"
                 elif status1[0] == 0:
                     if self.data_valid == "ARM" and status1[1] > 0 and status1[1] == status1[3]:
                         self.data_valid = "DATA_VALID"
-                continue
-
-            match = self.st_re.search(st)
-            # status is a match. need to look at group(0). It's NOT a LIST!
-            if match:
-                statuss = match.groups()
-                status1 = [int(x) for x in statuss]
-                if self.trace > 1:
-                    print("%s <%s" % (repr(self), status1))
-                if self.status != None:
-                    if self.status[SF.STATE] != status1[SF.STATE]:
-                        self.state_changed.set()
-#                    print("Status check %s %s" % (self.status0[0], status[0]))
-                    if self.status[SF.STATE] != 0 and status1[SF.STATE] == 0:
-                        if self.trace:
-                            print("%s STOPPED!" % (self.uut))
-                        self.stopped.set()
-                        self.armed.clear()
-#                print("status[0] is %d" % (status[0]))
-                    if status1[SF.STATE] == 1:
-                        if self.trace:
-                            print("%s ARMED!" % (self.uut))
-                        self.armed.set()
-                        self.stopped.clear()
-                    if self.status[SF.STATE] == 0 and status1[SF.STATE] > 1:
-                        if self.trace:
-                            print("ERROR: %s skipped ARM %d -> %d" % (self.uut, self.status[0], status1[0]))
-                        self.quit_requested = True
-                        os.kill(self.main_pid, signal.SIGINT)
-                        sys.exit(1)
-                self.status = status1
-
+                return
+            elif kind == "st":
+                self.on_status([int(x) for x in match.group("st").split()])
+                return
+
+    def on_status(self, status1):
+        if self.trace > 1:
+            print("%s <%s" % (repr(self), status1))
+        if self.status != None:
+            if self.status[SF.STATE] != status1[SF.STATE]:
+                for listener in self.state_listeners:
+                    try:
+                        listener(self.status[SF.STATE], status1[SF.STATE])
+                    except Exception as err:
+                        # a bad listener must not drop the status update
+                        print("WARNING: %s state listener %s failed: %s" % (self.uut, listener, err))
+                self.state_changed.set()
+            if self.status[SF.STATE] != 0 and status1[SF.STATE] == 0:
+                if self.trace:
+                    print("%s STOPPED!" % (self.uut))
+                self.stopped.set()
+                self.armed.clear()
+            if status1[SF.STATE] == 1:
+                if self.trace:
+                    print("%s ARMED!" % (self.uut))
+                self.armed.set()
+                self.stopped.clear()
+            if self.status[SF.STATE] == 0 and status1[SF.STATE] > 1:
+                if self.trace:
+                    print("ERROR: %s skipped ARM %d -> %d" % (self.uut, self.status[0], status1[0]))
+                self.quit_requested = True
+                os.kill(self.main_pid, signal.SIGINT)
+        self.status = status1
+        self.notify()
+
+    def notify(self):
+        """wake all waiters to check their conditions"""
+        with self.cond:
+            self.cond.notify_all()
+        if self.async_waiters:
+            for waiter in list(self.async_waiters):
+                waiter()
+
+    def set_flag(self, **kwargs):
+        self.__dict__.update(kwargs)
+        self.notify()
+
+    # setting break_requested or quit_requested wakes the waiters
+    @property
+    def break_requested(self):
+        return self._break_requested
+    @break_requested.setter
+    def break_requested(self, value):
+        self.set_flag(_break_requested=value)
+
+    @property
+    def quit_requested(self):
+        return self._quit_requested
+    @quit_requested.setter
+    def quit_requested(self, value):
+        self.set_flag(_quit_requested=value)
 
     def get_state(self):
         return self.status[SF.STATE]
@@ -310,17 +475,45 @@ class Statusmonitor:
     def get_elapsed(self):
         return self.status[SF.ELAPSED]
 
+    def wait_for(self, predicate, timeout=None):
+        """blocks until predicate() is True, or break_requested, or timeout
 
-    def wait_event(self, ev, descr=""):
-    #       print("wait_%s 02 %d" % (descr, ev.is_set()))
-        while ev.wait(0.1) == False and not self.break_requested:
-            if self.quit_requested:
-                print("QUIT REQUEST call exit %s" % (descr))
-                sys.exit(1)
+        Returns:
+            bool: predicate() result
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: predicate() or self.break_requested or self.quit_requested or self.closed,
+                               timeout)
+        return predicate()
+
+    def wait_state(self, state, timeout=None):
+        """blocks until uut STATE is state"""
+        return self.wait_for(lambda: self.get_state() == state, timeout)
+
+    async def async_wait_for(self, predicate, timeout=None):
+        """awaitable wait_for(), resolved from the StatusMux thread, no polling"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def waiter():
+            if predicate() or self.break_requested or self.quit_requested or self.closed:
+                loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(predicate()))
+        self.async_waiters.append(waiter)
+        try:
+            waiter()
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self.async_waiters.remove(waiter)
+
+    async def async_wait_state(self, state, timeout=None):
+        return await self.async_wait_for(lambda: self.get_state() == state, timeout)
 
-#        print("wait_%s 88 %d" % (descr, ev.is_set()))
+    def wait_event(self, ev, descr=""):
+        self.wait_for(ev.is_set)
+        if self.quit_requested:
+            print("QUIT REQUEST call exit %s" % (descr))
+            sys.exit(1)
         ev.clear()
-#        print("wait_%s 99 %d" % (descr, ev.is_set()))
         return self.get_state()
 
     def wait_armed(self):
@@ -335,12 +528,21 @@ class Statusmonitor:
         """blocks until state has changed"""
         self.wait_event(self.state_changed, "state_change")
 
+    def close(self):
+        self.quit_requested = True
+        if self.mux is StatusMux._instance:
+            self.mux.unregister(self)
+        self.logclient.close()
+
     trace = int(os.getenv("STATUSMONITOR_TRACE", "0"))
 
 
     def __init__(self, _uut, _status):
-        self.break_requested = False
-        self.quit_requested = False
+        self.cond = threading.Condition()
+        self.async_waiters = []
+        self.closed = False
+        self._break_requested = False
+        self._quit_requested = False
         self.trace = Statusmonitor.trace
         self.uut = _uut
         self.main_pid = os.getpid()
@@ -348,13 +550,14 @@ class Statusmonitor:
         self.stopped = threading.Event()
         self.armed = threading.Event()
         self.state_changed = threading.Event()
-        self.logclient = netclient.Logclient(_uut, AcqPorts.TSTAT)
-        self.st_thread = threading.Thread(target=self.st_monitor)
-        self.st_thread.setDaemon(True)
-        self.st_thread.start()
+        self.state_listeners = []       # callables (old_state, new_state) run on each state change
         self.data_valid = "UNKNOWN"
         self.search_roi_count = 0
         self.search_all_count = 0
+        self.rxbuf = bytearray()
+        self.logclient = netclient.Logclient(_uut, AcqPorts.TSTAT)
+        self.mux = StatusMux.instance()
+        self.mux.register(self)
 
 
 class NullFilter:
@@ -401,8 +604,67 @@ class Acq400:
     handles multiple channel post shot upload
     """
 
-    def init_site_client(self, site):
+    def new_site_client(self, site):
+        """Siteclient for site, a LazySiteclient when the schema cache knows the site"""
+        ss = self.schema["sites"].get(str(site)) if self.schema else None
+        if ss:
+            return netclient.LazySiteclient(self.uut, AcqPorts.SITE0+site, ss["knobs"], ss["static"])
         svc = netclient.Siteclient(self.uut, AcqPorts.SITE0+site)
+        if self.lazy:
+            self.schema_dirty.append((site, svc))
+        return svc
+
+    def load_schema(self, s0):
+        """find current schema for self.uut, from site0_client() or the cache"""
+        try:
+            self.schema_key, self.schema = Acq400.schemas.pop(self.uut)
+        except KeyError:
+            self.schema_key = schema_cache.uut_key(s0)
+            self.schema = schema_cache.read(self.uut)
+            if not schema_cache.is_current(self.schema, self.schema_key):
+                self.schema = None
+        if self.schema is None:
+            self.schema_dirty.append((0, s0))
+
+    def save_schema(self):
+        """add newly enumerated sites to the schema cache"""
+        if not self.schema_dirty:
+            return
+        sites = dict(self.schema["sites"]) if self.schema else {}
+        for site, svc in self.schema_dirty:
+            sites[str(site)] = schema_cache.site_schema(svc)
+        self.schema = schema_cache.make_schema(self.schema_key, sites)
+        self.schema_dirty = []
+        schema_cache.write(self.uut, self.schema)
+
+    @classmethod
+    def site0_client(cls, uut, lazy=None):
+        """s0 Siteclient. With lazy, the knob table and static values come from a current schema cache
+
+        Args:
+            uut (str): uut hostname or ip-address
+            lazy (bool, optional): use schema cache. Defaults to Acq400.lazy_sites.
+
+        Returns:
+            netclient.Siteclient: s0 client
+        """
+        if not (cls.lazy_sites if lazy is None else lazy):
+            return netclient.Siteclient(uut, AcqPorts.SITE0)
+        schema = schema_cache.read(uut)
+        ss = schema["sites"].get("0") if schema else None
+        s0 = netclient.Siteclient(uut, AcqPorts.SITE0, knobs=ss["knobs"] if ss else None)
+        key = schema_cache.uut_key(s0)
+        if ss and schema_cache.is_current(schema, key):
+            s0.preload(ss["static"])
+        else:
+            if ss:
+                s0.build_knobs(s0.sr("help"))
+            schema = None
+        cls.schemas[uut] = (key, schema)
+        return s0
+
+    def init_site_client(self, site):
+        svc = self.new_site_client(site)
         self.svc["s%d" % site] = svc
         self.modules[site] = svc
 
@@ -457,14 +719,17 @@ class Acq400:
 
     uuts_methods = {}        # for cloning by new
     uuts = {}                # for re-use by factory
+    lazy_sites = int(os.getenv("ACQ400_LAZY_SITES", "0"))
+    schemas = {}             # uut : (key, current schema or None) from site0_client()
 
-    def __init__(self, _uut, monitor=True, s0_client=None):
+    def __init__(self, _uut, monitor=True, s0_client=None, lazy=None):
         """init acq400
 
         Args:
             _uut (srt): uut hostname or ip-address
             monitor (bool, optional): start statusmonitor. Defaults to True.
             s0_client (netclient.Siteclient, optional): existing siteclient. Defaults to None.
+            lazy (bool, optional): use persisted knob schema, connect sites on first use. Defaults to ACQ400_LAZY_SITES.
         """
 
         try:
@@ -484,37 +749,87 @@ class Acq400:
         # channel index from 1,..
         self.cal_eslo = [0, ]
         self.cal_eoff = [0, ]
+        self.calibration = None     # calibration.Calibration, fetched once per shot
         self.mb_clk_min = 4000000
-
-        s0 = self.svc["s0"] = s0_client if s0_client else netclient.Siteclient(self.uut, AcqPorts.SITE0)
-        sl = s0.SITELIST.split(",")
+        self.stl_loaded = {}     # port : last stl.Stl loaded
+        self.stream_eng = None   # stream_engine.StreamEngine of stream()
+        self.lazy = Acq400.lazy_sites if lazy is None else lazy
+        self.schema = None
+        self.schema_dirty = []
+
+        s0 = self.svc["s0"] = s0_client if s0_client else Acq400.site0_client(self.uut, self.lazy)
+        if self.lazy:
+            self.load_schema(s0)
+            sl = self.schema_key["SITELIST"].split(",")
+        else:
+            sl = s0.SITELIST.split(",")
         sl.pop(0)
         self.awg_site = 0
-        site_enumerators = {}
-        for sm in sl:
-            site_enumerators[sm] = \
-                    threading.Thread(target=self.init_site_client,\
-                        args=(int(sm.split("=").pop(0)),)\
-                    )
-        for sm in sl:
-            site_enumerators[sm].start()
-
-
-        for sm in sl:
-#            print("join {}".format(site_enumerators[sm]))
-            site_enumerators[sm].join(10.0)
+        if self.schema:
+            for sm in sl:
+                self.init_site_client(int(sm.split("=").pop(0)))
+        else:
+            site_enumerators = {}
+            for sm in sl:
+                site_enumerators[sm] = \
+                        threading.Thread(target=self.init_site_client,\
+                            args=(int(sm.split("=").pop(0)),)\
+                        )
+            for sm in sl:
+                site_enumerators[sm].start()
+
+
+            for sm in sl:
+#                print("join {}".format(site_enumerators[sm]))
+                site_enumerators[sm].join(10.0)
         self.make_sa_sd_aliases()
 
         self.sites = [int(s.split('=')[0]) for s in sl]
+        if self.lazy:
+            self.save_schema()
 
         if monitor:
             # init _status so that values are valid even if this Acq400 doesn't run a shot ..
             try: _status = [int(x) for x in s0.state.replace('STX ', '').split(" ")]
             except: _status = [0,0,0,0,0]
             self.statmon = Statusmonitor(self.uut, _status)
+            self.statmon.state_listeners.append(self.invalidate_knob_cache)
+            self.statmon.state_listeners.append(self.invalidate_calibration)
+        if netclient.Siteclient.cache_ttl >= 0:
+            self.enable_knob_cache(netclient.Siteclient.cache_ttl)
         Acq400.uuts_methods[_uut] = self.__dict__   # store the dict for reuse by __init__
         Acq400.uuts[_uut] = self                    # store the object for reuse by factory()
 
+    def site_clients(self):
+        """unique site clients, aliases sA, sD removed"""
+        return list({ id(svc): svc for svc in self.svc.values() if svc }.values())
+
+    def enable_knob_cache(self, ttl=0):
+        """enable knob read cache on all site clients
+
+        Static knobs eg MODEL, MTYPE are cached forever, others for ttl seconds if ttl > 0.\
+        Writes and uut state changes invalidate cached dynamic knobs.
+
+        Args:
+            ttl (float, optional): cache time for dynamic knobs, 0: static knobs only. Defaults to 0.
+        """
+        for svc in self.site_clients():
+            svc.enable_cache(ttl)
+
+    def invalidate_knob_cache(self, *args):
+        for svc in self.site_clients():
+            svc.invalidate_cache()
+
+    def knob_cache_stats(self):
+        """Returns:
+            dict: hits, misses summed over all sites
+        """
+        stats = { "hits": 0, "misses": 0 }
+        for svc in self.site_clients():
+            for key, value in svc.cache_stats().items():
+                stats[key] += value
+        return stats
+
     def get_sys_info(self):
         """Gets uut system information
 
@@ -544,10 +859,8 @@ class Acq400:
 
     def close(self):
         """Closes uut connection gracefully"""
-        self.statmon.quit_requested = True
-
         try:
-            self.statmon.logclient.close()
+            self.statmon.close()
         except Exception as e:
             print(f"error closing statmon log client {e}")
 
@@ -603,12 +916,35 @@ class Acq400:
     def fetch_all_calibration(self):
         """Gets uut calibration and stores in instance"""
         try:
-            for m in self.get_aggregator_svc_list():
-                self.cal_eslo.extend(m.AI_CAL_ESLO.split(' ')[3:])
-                self.cal_eoff.extend(m.AI_CAL_EOFF.split(' ')[3:])
+            self.calibration = calibration.Calibration.from_sites(self.get_aggregator_svc_list())
+            self.cal_eslo = list(self.calibration.eslo)
+            self.cal_eoff = list(self.calibration.eoff)
         except:
             pass
 
+    def get_calibration(self, refresh=False):
+        """calibration for all aggregated channels, fetched once per shot
+
+        Args:
+            refresh (bool, optional): fetch again now. Defaults to False.
+
+        Returns:
+            calibration.Calibration: slope, offset per channel
+
+        Raises:
+            IndexError: no calibration available
+        """
+        if self.calibration is None or refresh:
+            self.fetch_all_calibration()
+        if self.calibration is None:
+            raise IndexError("{} no calibration".format(self.uut))
+        return self.calibration
+
+    def invalidate_calibration(self, old=None, new=None):
+        """state listener: drop calibration on ARM, gains may have changed for the new shot"""
+        if new is None or new == STATE.ARM:
+            self.calibration = None
+
     def scale_raw(self, raw, volts=False):
         for (sx, m) in list(self.modules.items()):
             if m.MODEL.startswith("ACQ43"):
@@ -634,28 +970,42 @@ class Acq400:
         Returns:
             ndarray: calibrated data array
         """
-        if len(self.cal_eslo) == 1:
-            self.fetch_all_calibration()
-
-        eslo = float(self.cal_eslo[chan])
-        eoff = float(self.cal_eoff[chan])
+        cal = self.get_calibration()
 
         if self.verbose > 1 or (self.verbose and chan < 4):
-            print("chan {} v = {}*{} + {}".format(chan, raw[0], eslo, eoff))
+            print("chan {} v = {}*{} + {}".format(chan, np.ravel(raw)[0], cal.eslo[chan], cal.eoff[chan]))
+
+        return cal.volts(raw, chan)
+
+    def read_volts(self, channels=(), nsam=None, dtype=np.float64, **kwargs):
+        """read_channels() then calibrate the [channel][sample] block in one operation
 
-        return np.add(np.multiply(raw, eslo), eoff)
+        Args:
+            channels (tuple/int, optional): channels 1.., not 0 (muxed). Default all.
+            nsam (int, optional): Number of samples. Defaults to None.
+            dtype (np.dtype, optional): eg np.float32 to halve memory. Defaults to np.float64.
+
+        Returns:
+            ndarray: [channel][sample] volts
+        """
+        channels = (channels, ) if type(channels) == int else tuple(channels)
+        raw = self.read_channels(channels, nsam, **kwargs)
+        if len(channels) == 0:
+            channels = tuple(range(1, len(raw) + 1))
+        return self.get_calibration().volts(self.scale_raw(np.asarray(raw), volts=True), channels, dtype=dtype)
 
 
-    def read_chan(self, chan, nsam = 0, data_size = None):
+    def read_chan(self, chan, nsam = 0, data_size = None, out = None):
         """Reads a channels data
 
         Args:
             chan (int): channel number
             nsam (int, optional): Number of samples. Defaults to 0.
             data_size (int, optional): data size in bytes. Defaults to None.
+            out (ndarray|memoryview, optional): caller-owned buffer, data is received in place. Defaults to None.
 
         Returns:
-            ndarray
+            ndarray: channel data, a view of out if supplied
         """
         if data_size == None:
             data_size = 4 if self.s0.data32 == '1' else 2
@@ -664,22 +1014,81 @@ class Acq400:
             nsam = int(self.s0.raw_data_size) // data_size
         if chan != 0 and nsam == 0:
             nsam = self.pre_samples()+self.post_samples()
+        if out is not None:
+            nsam = min(nsam, memoryview(out).nbytes // data_size)
 
         cc = ChannelClient(self.uut, chan)
-        ccraw = cc.read(nsam, data_size=data_size)
+        ccraw = cc.read(nsam, data_size=data_size, out=out)
         cc.close()
         if self.save_data:
-            try:
-                os.makedirs(self.save_data)
-            except OSError as exception:
-                if exception.errno != errno.EEXIST:
-                    raise
-
-            with open("%s/%s_CH%02d" % (self.save_data, self.uut, chan), 'wb') as fid:
-                ccraw.tofile(fid, '')
+            self.save_chan(chan, ccraw)
 
         return ccraw
 
+    def save_chan(self, chan, ccraw):
+        """store channel data as save_data/UUT_CHnn, a field in the save_data dirfile"""
+        dirfile.DirfileWriter.open(self.save_data).write_field("%s_CH%02d" % (self.uut, chan), ccraw)
+
+    upload_connections = int(os.getenv("ACQ400_UPLOAD_CONNECTIONS", "8"))
+
+    def read_chans_concurrent(self, channels, nsam, data_size, max_connections=None, out=None):
+        """Reads a set of channels concurrently, one ChannelClient per channel
+
+        At most max_connections channels are in flight at any time, each\
+        channel is received directly into its own row of one preallocated array.
+
+        Args:
+            channels (list): channel numbers 1..N
+            nsam (int): number of samples per channel
+            data_size (int): data size in bytes 2|4
+            max_connections (int, optional): max concurrent sockets. Defaults to upload_connections.
+            out (ndarray, optional): C-contiguous [channel][sample] destination eg np.memmap. Defaults to new array.
+
+        Returns:
+            ndarray: [channel][sample] data
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not max_connections:
+            max_connections = Acq400.upload_connections
+        _dtype = np.dtype('i4' if data_size == 4 else 'i2')
+        if out is None:
+            data = np.zeros((len(channels), nsam), dtype=_dtype)
+        else:
+            data = out
+            nsam = min(nsam, data.shape[1])
+        nrx = [0] * len(channels)
+
+        def read_row(ix):
+            chan = channels[ix]
+            cc = ChannelClient(self.uut, chan)
+            try:
+                ccraw = cc.read(nsam, data_size=data_size, out=data[ix])
+            finally:
+                cc.close()
+            nrx[ix] = len(ccraw)
+            if self.save_data:
+                self.save_chan(chan, ccraw)
+            if self.trace > 1:
+                print("%s CH%02d complete.." % (self.uut, chan))
+
+        start = timeit.default_timer()
+        with ThreadPoolExecutor(max_workers=min(max_connections, max(len(channels), 1))) as pool:
+            list(pool.map(read_row, range(len(channels))))
+        tt = timeit.default_timer() - start
+
+        nbytes = sum(nrx) * data_size
+        self.upload_rate = nbytes/1000000/tt if tt > 0 else 0
+        if self.trace:
+            print("%s upload %d channels x %d connections complete.. %.3f s %.2f MB/s" %
+                    (self.uut, len(channels), max_connections, tt, self.upload_rate))
+
+        nmin = min(nrx) if nrx else 0
+        if nmin < nsam:
+            print("WARNING: {} short channel read, truncating at {}/{}".format(self.uut, nmin, nsam))
+            data = data[:, :nmin]
+        return data
+
     def read_decims(self, nsam = 0):
         if nsam == 0:
             nsam = self.pre_samples()+self.post_samples()
@@ -816,7 +1225,7 @@ class Acq400:
 
         return chx
     
-    def _read_channels_2(self, channels=(), nsam=None, localdemux=None):
+    def _read_channels_2(self, channels=(), nsam=None, localdemux=None, max_connections=None, out=None, memmap=None):
         """read selected channels return post shot data.
         
             channels: ()        = return all channels demuxed
@@ -828,10 +1237,19 @@ class Acq400:
                 channels (tuple/int, optional): Channels to read. Default all.
                 nsam (int, optional): Number of samples. Defaults to None.
                 localdemux (bool, optional): depreciated. Defaults to None.
+                max_connections (int, optional): concurrent channel uploads when data is demuxed on uut.\
+                    Defaults to upload_connections.
+                out (ndarray, optional): caller-owned destination, data is received in place, no intermediate copies.\
+                    uut demuxed: [channel][sample] array, else muxed array of nsam elements. Defaults to None.
+                memmap (str, optional): stream data to this file and return np.memmap backed views,\
+                    see read_channels_memmap(). Defaults to None.
 
             Returns:
                 ndarray:  channel data
         """
+        if memmap:
+            return self.read_channels_memmap(memmap, channels, nsam, max_connections)
+
         channels = (channels, ) if type(channels) == int else channels # convert int to tuple
         want_raw = True if channels == (0,) else False # 0 means all channels no demux "raw"
         want_all_cooked = len(channels) == 0
@@ -847,27 +1265,25 @@ class Acq400:
             if is_cooked and want_raw:
                 print('data is_cooked but we want_raw : consider running shots with DEMUX=0 to save effort')
 
-            data = []
-            nsam = nsam if nsam else ch_data_size // data_size
+            nsam = nsam if nsam and nsam > 0 else ch_data_size // data_size
             nspad = int(self.s0.spad.split(',')[1])
             nspad_chan = nspad if data_size==4 else nspad*2
             ndata_chan = nchan - nspad_chan
             if want_all_cooked or want_raw:
                 channels = [ch for ch in range(1, ndata_chan+1)]
 
-            for chan in channels:
-                data.append(self.read_chan(chan, nsam, data_size))
+            data = self.read_chans_concurrent(list(channels), nsam, data_size, max_connections, out=out)
                 
             if want_raw:
-                return np.array(data, order='F').T.reshape(1, -1) #return muxed data
+                return data.T.reshape(1, -1) #return muxed data
             else:
-                return np.array(data, order='F') #return specified channels
+                return data #return specified channels
         
         else: #if data has NOT been demuxed on uut           
             nsam = nsam if nsam else raw_data_size // data_size
-            data = self.read_chan(0, nsam, data_size)
+            data = self.read_chan(0, nsam, data_size, out=out)
             if want_raw:
-                return np.array([data]) #return all channels no demux
+                return data.reshape(1, -1) #return all channels no demux
             else:
                 data = data.reshape(-1, nchan).transpose() #demux channels
                 if len(channels) > 0:
@@ -877,6 +1293,66 @@ class Acq400:
         
     read_channels = _read_channels_2
 
+    def read_channels_memmap(self, fname, channels=(), nsam=None, max_connections=None):
+        """read selected channels post shot data to disk, return np.memmap backed data.
+
+            For shots larger than RAM: data is received direct to file fname, nothing\
+            is demuxed or copied in memory, analysis pages in only what it touches.
+
+            channels: ()        = return all channels, [channel][sample] view
+            channels: 0         = return all channels muxed, [1][nsam*nchan]
+            channels: (1,2,3)   = return specific channels
+
+            uut demuxed: fname holds only the selected channels, [channel][sample].
+            else: fname holds the muxed shot [sample][channel], the demux is a strided view,\
+            selected channels are returned as a list of row views.
+
+            Args:
+                fname (str): output file, overwritten.
+                channels (tuple/int, optional): Channels to read. Default all.
+                nsam (int, optional): Number of samples. Defaults to None.
+                max_connections (int, optional): concurrent channel uploads. Defaults to upload_connections.
+
+            Returns:
+                np.memmap | list: [channel][sample] np.memmap backed array, or a list of np.memmap\
+                row views when a channel subset is read from a muxed shot. Muxed [1][nsam*nchan]\
+                from a demuxed uut is an in memory copy.
+        """
+        channels = (channels, ) if type(channels) == int else channels
+        want_raw = channels == (0,)
+
+        data_size = 4 if int(self.s0.data32) else 2
+        _dtype = np.dtype('i4' if data_size == 4 else 'i2')
+        raw_data_size = int(self.s0.raw_data_size)
+        nchan = int(self.s0.NCHAN)
+        is_cooked = raw_data_size < 1
+
+        if is_cooked:
+            nsam = nsam if nsam and nsam > 0 else int(self.sA.ch_data_size) // data_size
+            if len(channels) == 0 or want_raw:
+                nspad = int(self.s0.spad.split(',')[1])
+                ndata_chan = nchan - (nspad if data_size==4 else nspad*2)
+                channels = [ch for ch in range(1, ndata_chan+1)]
+
+            mm = np.memmap(fname, dtype=_dtype, mode='w+', shape=(len(channels), nsam))
+            data = self.read_chans_concurrent(list(channels), nsam, data_size, max_connections, out=mm)
+            mm.flush()
+            if want_raw:
+                print('data is_cooked but we want_raw : muxed result is a copy, consider running shots with DEMUX=0')
+                return data.T.reshape(1, -1)
+            return data
+        else:
+            nsam = nsam if nsam and nsam > 0 else raw_data_size // data_size
+            mm = np.memmap(fname, dtype=_dtype, mode='w+', shape=(nsam,))
+            data = self.read_chan(0, nsam, data_size, out=mm)
+            mm.flush()
+            if want_raw:
+                return data.reshape(1, -1)
+            data = data[:len(data) - len(data)%nchan].reshape(-1, nchan).T #strided view, no copy
+            if len(channels) > 0:
+                return [data[ch-1] for ch in channels]
+            return data
+
     def read_transient_timebase(self, nsamples, pre=0):
         try:
             fs = freq(self.sA.ACQ480_OSR)
@@ -952,16 +1428,70 @@ class Acq400:
                     return
             raise ValueError("frequency out of range {}".format(hz))
 
-    def load_stl(self, stl, port, trace = False, wait_eof = True, wait_eol = True):
+    stl_pipeline = int(os.getenv("ACQ400_STL_PIPELINE", "1"))
+
+    def load_stl(self, stl, port, trace = False, wait_eof = True, wait_eol = True, skip_unchanged = False):
         """Send a STL file to the specified port
 
+        Lines are checked on the host, then streamed while acknowledgements are read
+        concurrently. ACQ400_STL_PIPELINE=0 selects the original line by line handshake.
+
         Args:
-            stl (str): stl string each line separated by newlines
+            stl (str or stl.Stl): stl string each line separated by newlines
             port (int): port num see AcqPorts
             trace (bool, optional): print each line sent. Defaults to False.
             wait_eof (bool, optional): wait for end of file. Defaults to True.
             wait_eol (bool, optional): wait for end of line. Defaults to True.
+            skip_unchanged (bool, optional): no upload if the same STL is loaded, see loaded_stl(). Defaults to False.
+
+        Returns:
+            dict: lines, acks, seconds, lines_per_sec, or None if skipped
+
+        Raises:
+            stl.StlError: uut reported errors
+            stl.StlTimeout: uut stopped replying, see stl.ACK_TIMEOUT
+        """
+        if skip_unchanged or isinstance(stl, stl_mod.Stl):
+            if not isinstance(stl, stl_mod.Stl):
+                stl = stl_mod.Stl.from_text(stl)
+            if skip_unchanged and stl == self.loaded_stl(port):
+                if trace or self.verbose:
+                    print("load_stl {} unchanged, skip".format(stl))
+                return None
+            text = stl.text()
+        else:
+            text = stl
+        if not self.stl_pipeline:
+            stats = self.load_stl_lockstep(text, port, trace, wait_eof, wait_eol)
+        else:
+            lines = stl_mod.normalise(text)
+            with netclient.Netclient(self.uut, port) as nc:
+                stats = stl_mod.load(nc.sock, lines, wait_eof=wait_eof, wait_eol=wait_eol, trace=trace)
+            if trace or self.verbose:
+                print("load_stl {lines} lines {seconds:.3f}s {lines_per_sec:.0f} lines/s".format(**stats))
+        if isinstance(stl, stl_mod.Stl):
+            self.stl_loaded[port] = stl
+        else:
+            self.stl_loaded.pop(port, None)
+        return stats
+
+    def loaded_stl(self, port=AcqPorts.GPGSTL):
+        """STL currently loaded on port
+
+        GPG is read back from the uut with read_stl(), other ports return the last Stl loaded by this process.
+
+        Returns:
+            stl.Stl: loaded STL or None if not known
         """
+        if port == AcqPorts.GPGSTL:
+            try:
+                return stl_mod.Stl.parse(self.read_stl(), validate=False)
+            except (ValueError, OSError):
+                return None
+        return self.stl_loaded.get(port)
+
+    def load_stl_lockstep(self, stl, port, trace = False, wait_eof = True, wait_eol = True):
+        """load_stl() one line per round trip, for reference"""
         termex = re.compile("\n")
         with netclient.Netclient(self.uut, port) as nc:
             lines = stl.split("\n")
@@ -999,14 +1529,15 @@ class Acq400:
         with netclient.Netclient(self.uut, AcqPorts.GPGDUMP) as nc:
             return nc.receive_message(termex)
 
-    def load_gpg(self, stl, trace = False):
+    def load_gpg(self, stl, trace = False, skip_unchanged = False):
         """Send stl to GPG port
 
         Args:
-            stl (str): stl string each line seperated by newlines
+            stl (str or stl.Stl): stl string each line seperated by newlines
             trace (bool, optional): print each line sent. Defaults to False.
+            skip_unchanged (bool, optional): compare with read_stl(), no upload if the same. Defaults to False.
         """
-        self.load_stl(stl, AcqPorts.GPGSTL, trace)
+        return self.load_stl(stl, AcqPorts.GPGSTL, trace, skip_unchanged=skip_unchanged)
 
 
     def load_dpg(self, stl, trace = False):
@@ -1018,11 +1549,11 @@ class Acq400:
         """
         self.load_stl(stl, AcqPorts.DPGSTL, trace, wait_eol=False)
 
-    def load_wrpg(self, stl, trace = False):
-        self.load_stl(stl, AcqPorts.WRPG, trace)
+    def load_wrpg(self, stl, trace = False, skip_unchanged = False):
+        return self.load_stl(stl, AcqPorts.WRPG, trace, skip_unchanged=skip_unchanged)
 
-    def load_dio482pg(self, site, stl, trace = False):
-        self.load_stl(stl, AcqPorts.DIO482_PG_STL+int(site)*10, trace)
+    def load_dio482pg(self, site, stl, trace = False, skip_unchanged = False):
+        return self.load_stl(stl, AcqPorts.DIO482_PG_STL+int(site)*10, trace, skip_unchanged=skip_unchanged)
 
     def set_DO(self, site, dox, value = 'P'):
         self.svc["s{}".format(site)].set_knob("DO_{}".format(dox), value)
@@ -1036,12 +1567,18 @@ class Acq400:
     def load_awg(self, data, autorearm=False, continuous=False, repeats=1, port=None, segment=None):
         """Load and config a AWG pattern
 
+        The payload is sent as is, no copies: arrays (including np.memmap) as a memoryview,
+        files with socket.sendfile(). Repeats resend the same buffer.
+
         Args:
-            data (str): AWG pattern
+            data (bytes, ndarray, str or file): AWG pattern, array, file name or open binary file
             autorearm (bool, optional): Rearm and wait after run. Defaults to False.
             continuous (bool, optional): Run pattern continuously. Defaults to False.
             repeats (int, optional): Number of pattern repetitions. Defaults to 1.
             segment (char, optional): Which segment to upload data to
+
+        Returns:
+            dict: bytes, seconds, MBps
         """
         
         if self.awg_site > 0 and segment == None:
@@ -1056,10 +1593,21 @@ class Acq400:
             port = AcqPorts.AWG_CONTINUOUS if continuous else \
                 AcqPorts.AWG_AUTOREARM if autorearm else AcqPorts.AWG_ONCE
 
+        t0 = time.perf_counter()
+        nbytes = 0
         with netclient.Netclient(self.uut, port) as nc:
-            while repeats:
-                nc.sock.send(data)
-                repeats -= 1
+            if isinstance(data, (str, os.PathLike)):
+                with open(data, 'rb') as fp:
+                    nbytes = self._send_awg_file(nc.sock, fp, repeats)
+            elif hasattr(data, 'fileno') and hasattr(data, 'seek'):
+                nbytes = self._send_awg_file(nc.sock, data, repeats)
+            else:
+                if isinstance(data, np.ndarray):
+                    data = np.ascontiguousarray(data)
+                view = memoryview(data).cast('B')
+                for rep in range(repeats):
+                    nc.sock.sendall(view)
+                nbytes = len(view) * repeats
             nc.sock.shutdown(socket.SHUT_WR)
             while True:
                 rx = nc.sock.recv(128)
@@ -1069,6 +1617,22 @@ class Acq400:
                     break
             nc.sock.close()
 
+        seconds = time.perf_counter() - t0
+        self.awg_load_stats = { "bytes": nbytes, "seconds": seconds, "MBps": nbytes/seconds/1e6 if seconds else 0 }
+        if self.trace or self.verbose:
+            print("load_awg {bytes} bytes {seconds:.3f}s {MBps:.1f} MB/s".format(**self.awg_load_stats))
+        return self.awg_load_stats
+
+    @staticmethod
+    def _send_awg_file(sock, fp, repeats):
+        """send file contents repeats times from the current position, in kernel where possible"""
+        start = fp.tell()
+        nbytes = 0
+        for rep in range(repeats):
+            fp.seek(start)
+            nbytes += sock.sendfile(fp)
+        return nbytes
+
     def set_segment(self, segment):
         """Set next awg segment(s)"""
         with netclient.Netclient(self.uut, AcqPorts.AWG_SEGMENT_SELECT) as nc:
@@ -1435,7 +1999,7 @@ class Acq400:
         site_types = { "AISITES": AISITES, "AOSITES": AOSITES, "DIOSITES": DIOSITES }
         return site_types
 
-    def get_es_indices(self, file_path="default", nchan="default", human_readable=0, return_hex_string=0):
+    def get_es_indices(self, file_path="default", nchan="default", human_readable=0, return_hex_string=0, events=(4,)):
         """Returns the location of event samples.
 
         Args:
@@ -1444,6 +2008,7 @@ class Acq400:
             human_readable (int, optional): returns hex interpretations of the event sample data. Defaults to 0.
             return_hex_string (int, optional): if 1 and human_readable 1 returns single string containing all of \
             the event samples. Defaults to 0.
+            events (tuple, optional): event ids N of 0xaa55f15N to return, None for all. Defaults to (4,): trigger.
 
         Returns:
             list: [ [Event sample indices], [Event sample data] ]
@@ -1452,23 +2017,27 @@ class Acq400:
         event_samples = []
         nchan = self.nchan() if nchan == "default" else nchan
 
+        if int(self.s0.data32) == 0:
+            nchan = nchan / 2 # "effective" nchan has halved if data is shorts.
+        nchan = int(nchan)
+
         if file_path == "default":
             data = self.read_muxed_data()
             data = np.array(data)
             if data.dtype == np.int16:
                 # convert shorts back to raw bytes and then to longs.
                 data = np.frombuffer(data.tobytes(), dtype=np.uint32)
+            idx = es_index.build_index(data, nchan)
         else:
-            data = np.fromfile(file_path, dtype=np.uint32)
+            data = np.memmap(file_path, dtype=np.uint32, mode='r', shape=(os.path.getsize(file_path)//4,))
+            idx = es_index.load_index(file_path, nchan)
+        if events is not None:
+            idx = idx[np.isin(idx['event'], events)]
+        offsets = idx['offset']
 
-        if int(self.s0.data32) == 0:
-            nchan = nchan / 2 # "effective" nchan has halved if data is shorts.
-        nchan = int(nchan)
-        for index, sample in enumerate(data[0::nchan]):
-            # if sample == np.int32(0xaa55f154): # aa55
-            if sample == np.uint32(0xaa55f154): # aa55
-                indices.append(index)
-                event_samples.append(data[index*nchan:index*nchan + nchan])
+        for offset in offsets:
+            indices.append(int(offset)//nchan)
+            event_samples.append(np.array(data[offset:offset + nchan]))
 
         if human_readable == 1:
             # Change decimal to hex.
@@ -1496,77 +2065,93 @@ class Acq400:
 
         return [indices, event_samples]
 
-    def stream(self, recvlen=4096*32, port=AcqPorts.STREAM, data_size=2):
-        """Runs stream and yields data buffers
+    def stream_engine(self, recvlen=4096*32, port=AcqPorts.STREAM, data_size=2, nbuf=None, drop=False):
+        """connect to stream port, returns stream_engine.StreamEngine, receive thread starts on first use
 
         Args:
-            recvlen (_type_, optional): buffer size. Defaults to 4096*32.
-            port (_type_, optional): uut port. Defaults to AcqPorts.STREAM value.
+            recvlen (int, optional): elements per buffer. Defaults to 4096*32.
+            port (int, optional): uut port. Defaults to AcqPorts.STREAM value.
             data_size (int, optional): data size in bytes. Defaults to 2.
-
-        Yields:
-            ndarray: data buffer
+            nbuf (int, optional): buffers in pool. Defaults to stream_engine.STREAM_NBUF.
+            drop (bool, optional): discard data when all buffers are busy, rather than wait. Defaults to False.
         """
         dtype = np.dtype('i4' if data_size == 4 else 'i2')   # hmm, what if unsigned?
-        self.stream_nc = netclient.Netclient(self.uut, port)
+        nc = self.stream_nc = netclient.Netclient(self.uut, port)
+        self.stream_eng = stream_engine.StreamEngine(nc.sock, recvlen, dtype, nbuf, drop,
+                                                     on_stop=lambda: self._stream_stopped(nc))
+        return self.stream_eng
 
-        buf = bytearray(recvlen*data_size)
-        while self.stream_nc:
-            view = memoryview(buf).cast('B')
-            pos = 0
+    def _stream_stopped(self, nc):
+        """engine has stopped: release its Netclient"""
+        nc.close()
+        if self.stream_nc is nc:
+            self.stream_nc = None
+
+    def stream(self, recvlen=4096*32, port=AcqPorts.STREAM, data_size=2, *, sink=None, copy=True, nbuf=None, drop=False):
+        """Runs stream, received on a separate thread into a pool of buffers
+
+        Args:
+            recvlen (int, optional): buffer size. Defaults to 4096*32.
+            port (int, optional): uut port. Defaults to AcqPorts.STREAM value.
+            data_size (int, optional): data size in bytes. Defaults to 2.
+            sink (callable or list, optional): sink(data) per buffer, True to stop. Defaults to None: yield buffers.
+            copy (bool, optional): yield a copy of each buffer. False: yield the pool buffer itself, no copy,\
+                REUSED for new data once the next buffer is requested: do not keep it. Defaults to True.
+            nbuf (int, optional): buffers in pool. Defaults to stream_engine.STREAM_NBUF.
+            drop (bool, optional): discard data when all buffers are busy, rather than wait. Defaults to False.
+
+        Returns:
+            sink: dict stats, blocks until a sink returns True or the stream ends.\
+            no sink: generator of ndarray data buffers, connects on first next().\
+            Closing or dropping the generator stops the stream.
+        """
+        if sink is not None:
+            return self.stream_engine(recvlen, port, data_size, nbuf, drop).run(sink)
+        return self._stream_buffers(recvlen, port, data_size, nbuf, drop, copy)
+
+    def _stream_buffers(self, recvlen, port, data_size, nbuf, drop, copy):
+        engine = self.stream_engine(recvlen, port, data_size, nbuf, drop)
+        buffers = iter(engine)
+        try:
+            for data in buffers:
+                yield data.copy() if copy else data
+        finally:
+            buffers.close()
+            engine.stop()
 
-            while len(view) and self.stream_nc:
-                nrx = self.stream_nc.sock.recv_into(view)
-                if nrx == 0:
-                    yield np.frombuffer(buf[:pos], dtype)
-                    pos = 0
-                else:
-                    view = view[nrx:]
-                    pos += nrx
-            yield np.frombuffer(buf[:pos], dtype)
     def stream_close(self):
-            if self.stream_nc:
+            if self.stream_eng:
+                self.stream_eng.stop()
+                self.stream_eng = None
+            elif self.stream_nc:
                 self.stream_nc.close()
                 self.stream_nc = None
             else:
                 print("stream_close(), sorry not possible to close it down ..")
 
     # if spad is set, it's a synthetic spad, not part of ssb
-    def stream_slowmon(self, nspad=None):
-        ssb = int(self.s0.ssb)
-        data_sz = 4 if int(self.s0.data32) else 2
-        if not nspad:
-            nspad = int(self.s0.spad.split(',')[1])
-            spad_sz = nspad*4
-            nchan = (ssb - spad_sz)//data_sz
-        else:
-            main_nspad = int(self.s0.spad.split(',')[1])
-            nchan = (ssb - main_nspad*4)//data_sz
-            ssb = nchan*data_sz + nspad*4
-        ch_dtype = np.dtype('i4' if data_sz == 4 else 'i2')
-        sp_dtype = np.dtype('u4')
-        spad_off = nchan*data_sz//4
+    def slowmon_reader(self, nspad=None, batch=None):
+        """connect to slowmon, returns slowmon.SlowmonReader, iterate for (N, nchan), (N, nspad) batches
+
+        Args:
+            nspad (int, optional): synthetic spad words, eg 4 with slowmon_hw. Defaults to uut spad.
+            batch (int, optional): max records per batch. Defaults to slowmon.SLOWMON_BATCH.
+        """
+        nchan, ch_dtype, nspad = slowmon.geometry(self.s0.ssb, self.s0.data32, self.s0.spad, nspad)
 
         self.slowmon_nc = netclient.Netclient(self.uut, AcqPorts.SLOWMON)
-        buf = bytearray(ssb)
-        view = memoryview(buf).cast('B')
+        return slowmon.SlowmonReader(self.slowmon_nc.sock, nchan, ch_dtype, nspad,
+                                     running=lambda: self.slowmon_nc is not None, batch=batch)
 
-        while self.slowmon_nc:
-            view = memoryview(buf).cast('B')
-            ib = 0
+    def stream_slowmon_batch(self, nspad=None, batch=None):
+        """yields (chx, spx): (N, nchan), (N, nspad) views of all records available, see slowmon.py"""
+        yield from self.slowmon_reader(nspad, batch)
 
-            while ib < ssb and self.slowmon_nc:
-                nrx = self.slowmon_nc.sock.recv_into(view)
-                #print("stream_slowmon: nrx:{} ib:{} len(view) {}".format(nrx, ib, len(view)))
-                if nrx == 0:
-                    print("stream_slowmon: nrx:{} ib:{} len(view) {}".format(nrx, ib, len(view)))
-                    #sys.exit(-1)
-                else:
-                    view = view[nrx:]
-                    ib += nrx
-            chx = np.frombuffer(buf, ch_dtype)[:nchan]
-            spx = np.frombuffer(buf, sp_dtype)[spad_off:]
-            yield(chx, spx)
+    def stream_slowmon(self, nspad=None):
+        """yields (chx, spx) per sample, views valid until the next batch"""
+        for chx, spx in self.stream_slowmon_batch(nspad):
+            for ii in range(len(chx)):
+                yield chx[ii], spx[ii]
 
     def slowmon_close(self):
             if self.slowmon_nc:
@@ -1583,7 +2168,7 @@ class Acq400:
     def __getitem__(self, site):
         return self.SVC(site)
 
-    def stream_to_host(self, seconds=10, megabytes=None, save=None, check=-1, update=1, port=4210, blen=1024):
+    def stream_to_host(self, seconds=10, megabytes=None, save=None, check=-1, update=1, port=4210, blen=1024, direct=False):
         """Run stream to host
 
         Usage:
@@ -1593,10 +2178,14 @@ class Acq400:
             seconds (int, optional): stop stream after n seconds.
             megabytes (int, optional): stop stream after n megabytes.
             save (string, optional): save data to filename.
-            check (int, optional): spad0 int32 column to check spad is contiguous.
+            check (int, optional): spad0 int32 column to check spad is contiguous, across buffers.
             update (int, optional): how often to print status.
             port (int, optional): target port.
             blen (int, optional): buffer base length.
+            direct (bool, optional): save with O_DIRECT, bypass page cache.
+
+        Returns:
+            ContinuityReport: with check, else None
         """
         LINE_UP = '\033[1A'
         ERASE_LINE = '\033[2K'
@@ -1604,21 +2193,21 @@ class Acq400:
         if megabytes: seconds = 999999999
 
         ssb = int(self.s0.ssb)
-        bufferlen = (ssb * blen) + ssb
+        bufferlen = ssb * blen
         buffer = bytearray(bufferlen)
         view = memoryview(buffer).cast('B')
-        view32 = np.ndarray((bufferlen // 4,), dtype=np.int32, buffer=view)
+        checker = continuity.ContinuityChecker(ssb // 4, check) if check >= 0 else None
 
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             sock.connect((self.uut, port))
-            if save: fp = open(save, 'wb')
+            if save: writer = disk_writer.DiskWriter(save, direct=direct)
             
-            start = 0
             cursor = 0
             total_bytes = 0
             timestart = 0
             printlast = 0
             missed_samples = 0
+            runtime = 0
 
             print(f"Stream start {f'{megabytes}MB' if megabytes else f'{seconds}s'} from {self.uut}:{port} to {save if save else 'null'}")
             try:
@@ -1632,17 +2221,14 @@ class Acq400:
 
                     if cursor >= bufferlen:
 
-                        if save: fp.write(buffer[ start : cursor ])
+                        if save: writer.write(view[ : cursor ])
 
-                        if check >= 0:
-                            spad0 = view32[check::ssb // 4]
-                            missed = np.sum(np.abs(np.diff(spad0) - 1))
+                        if checker:
+                            missed = checker.check(view[ : cursor ]).missed
                             if missed: print(f'Warning: {missed} samples missed')
                             missed_samples += missed
-                            buffer[ 0 : ssb ] = buffer[ cursor - ssb : ]
-                            start = ssb
 
-                        cursor = ssb
+                        cursor = 0
                         runtime = time.time() - timestart
 
                         if update > 0 and runtime - printlast > update:
@@ -1659,8 +2245,9 @@ class Acq400:
                             break
 
             except KeyboardInterrupt: pass
-            if save: fp.close()
+            if save: writer.close()
         print(f"Stream complete {runtime:.2f}s {total_bytes} bytes {total_bytes // ssb} samples {f'{missed_samples} missing' if check >= 0 else ''}")
+        return checker.report if checker else None
 
     def get_stream_mask(self):
         """Get stream subset mask channels as list"""
@@ -1864,10 +2451,12 @@ class Acq2106(Acq400):
                 sn_map.append((f's{site}', int(site)))
         for ( service_name, site ) in sn_map:
             try:
-                self.svc[service_name] = netclient.Siteclient(self.uut, AcqPorts.SITE0 + site)
+                self.svc[service_name] = self.new_site_client(site)
             except socket.error:
                 print("uut {} site {} not populated".format(_uut, site))
             self.mod_count += 1
+        if self.lazy:
+            self.save_schema()
 
     def set_mb_clk(self, hz=4000000, src="zclk", fin=1000000):
         print("set_mb_clk {} {} {}".format(hz, src, fin))
@@ -2026,8 +2615,8 @@ class Acq2106_TIGA(Acq2106):
         Acq2106.__init__(self, uut, monitor=monitor, s0_client=s0_client, has_wr=True)
         self.pg_sites = [ sx for sx in range(1,6+1) if sx in self.sites and self.svc["s{}".format(sx)].MTYPE == '7B' ]
 
-    def load_dio482pg(self, site, stl, trace = False):
-        self.load_stl(stl, AcqPorts.DIO482_PG_STL+site*10, trace)
+    def load_dio482pg(self, site, stl, trace = False, skip_unchanged = False):
+        return self.load_stl(stl, AcqPorts.DIO482_PG_STL+site*10, trace, skip_unchanged=skip_unchanged)
 
     def set_DO(self, site, dox, value = 'P'):
         self.svc["s{}".format(site)].set_knob("DO_{}".format(dox), value)
@@ -2080,7 +2669,7 @@ def factory(_uut):
     except KeyError:
         pass
 
-    s0 = netclient.Siteclient(_uut, AcqPorts.SITE0)
+    s0 = Acq400.site0_client(_uut)
 
     acq2106_models = ('acq2106', 'acq2206', 'z7io', 'acq1102')
     model = s0.MODEL
@@ -16,6 +16,7 @@ import epics
 import time
 import socket
 from enum import Enum
+from . import disk_writer
 
 LINE_UP = '\033[1A'
 ERASE_LINE = '\033[2K'
@@ -121,7 +122,7 @@ class acq400e:
         pvname = pv.format(uut=self.uut)
         return self.pvs[pvname].value
     
-    def stream_to_disk(self, ssb=None, maxbytes=None, maxtime=None, update=True):
+    def stream_to_disk(self, ssb=None, maxbytes=None, maxtime=None, update=True, direct=False):
 
         ssb = ssb if ssb else int(self.s0.SSB)
         bufferlen = ssb * 1024
@@ -132,7 +133,7 @@ class acq400e:
 
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             sock.connect((self.uut, Ports.STREAM.value))
-            with open(self.datafile, 'wb') as fp:
+            with disk_writer.DiskWriter(self.datafile, direct=direct) as writer:
                 index = 0
                 tbytes = 0
                 t0 = 0
@@ -153,7 +154,7 @@ class acq400e:
                             tt = time.time() - t0
                             print(f"Streaming {int(tt)}s {(tbytes >> 20) / tt:.5f} MB/s > {self.datafile}")
 
-                        fp.write(buffer[:index])
+                        writer.write(byteview[:index])
                         index = 0
 
                         if maxtime and time.time() - t0 > maxtime:
@@ -170,7 +171,6 @@ class acq400e:
 
                         if update: print(LINE_UP + ERASE_LINE , end="")
 
-                fp.flush()
             sock.shutdown(socket.SHUT_RDWR)
         print(f"{tbytes:,} bytes {tbytes // ssb:,} samples total")
 
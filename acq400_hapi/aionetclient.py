@@ -0,0 +1,247 @@
+"""
+aionetclient.py asyncio interface to acq400 site services
+
+- AsyncSiteclient : one connection per site, commands are pipelined:
+  many commands in flight on one socket, replies are matched in order by the
+  ``acq400.N NN >`` prompt, exactly as Siteclient.termex
+- AsyncAcq400 : all sites of one uut, batch_get() / batch_set() across sites
+- create_uuts() : connect to many uuts concurrently
+
+Bulk configuration then costs about one round trip per site, not one per knob.
+
+example::
+
+    import asyncio
+    from acq400_hapi.aionetclient import AsyncAcq400, create_uuts
+
+    async def main():
+        uuts = await create_uuts(['acq2106_001', 'acq2106_002'])
+        await asyncio.gather(*[ u.batch_set({'s0.transient': 'POST=100000', 's1.shot': 0}) for u in uuts ])
+        print(await uuts[0].batch_get(['s0.NCHAN', 's1.MODEL', 's1.shot']))
+        print(await uuts[0].s1.MODEL)
+        for u in uuts:
+            await u.close()
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import collections
+import os
+import re
+
+from .netclient import Siteclient
+from .acq400 import AcqPorts
+
+
+class AsyncSiteclient:
+    """asyncio site service client with pipelined command/response.
+
+    Use create() to connect, the knob table is built from help as for Siteclient.
+    """
+    termex = re.compile(rb"\n(acq400.[0-9]+ ([0-9]+) >)")
+    PROMPT_MAX = 32                 # longest prompt, rescan overlap
+    trace = int(os.getenv("SITECLIENT_TRACE", "0"))
+
+    def __init__(self, addr, port):
+        self.addr = addr
+        self.port = int(port)
+        self.knobs = {}
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.scan = 0
+        self.reader = None
+        self.writer = None
+        self.rx_task = None
+        self.rx_error = None            # set when _rx_loop has stopped, later commands fail with it
+
+    @classmethod
+    async def create(cls, addr, port, knobs=True):
+        """connect, enable prompt and optionally enumerate knobs"""
+        self = cls(addr, port)
+        self.reader, self.writer = await asyncio.open_connection(addr, self.port)
+        self.rx_task = asyncio.ensure_future(self._rx_loop())
+        await self.sr("prompt on")
+        if knobs:
+            self.knobs = dict((Siteclient.pat.sub(r"_", key), key) for key in (await self.sr("help")).split())
+        return self
+
+    def __repr__(self):
+        return 'AsyncSiteclient(%s, %d)' % (self.addr, self.port)
+
+    async def _rx_loop(self):
+        try:
+            while True:
+                chunk = await self.reader.read(65536)
+                if not chunk:
+                    raise ConnectionError("{} closed".format(repr(self)))
+                self.buffer += chunk
+                while True:
+                    match = self.termex.search(self.buffer, self.scan)
+                    if match is None:
+                        self.scan = max(0, len(self.buffer) - self.PROMPT_MAX)
+                        break
+                    rx = bytes(self.buffer[:match.start(1)]).decode("latin-1").rstrip()
+                    del self.buffer[:match.end(1)]
+                    self.scan = 0
+                    if not self.pending:
+                        # unsolicited prompt, nobody is waiting for it
+                        if self.trace:
+                            print("%s dropped <%s" % (repr(self), rx))
+                        continue
+                    fut = self.pending.popleft()
+                    if not fut.done():
+                        fut.set_result(rx)
+        except BaseException as err:
+            # any exit fails every waiter, none is left to hang
+            if isinstance(err, asyncio.CancelledError):
+                err = ConnectionError("{} closed".format(repr(self)))
+            self.rx_error = err
+            while self.pending:
+                fut = self.pending.popleft()
+                if not fut.done():
+                    fut.set_exception(err)
+            if not isinstance(err, (ConnectionError, OSError)):
+                raise
+
+    def _send(self, messages):
+        """queue one future per message, then write them all in one go. No await: order is preserved"""
+        if self.rx_error is not None:
+            raise self.rx_error
+        loop = asyncio.get_event_loop()
+        futs = [ loop.create_future() for mm in messages ]
+        self.pending.extend(futs)
+        self.writer.write("".join(mm + "\n" for mm in messages).encode())
+        if self.trace:
+            for mm in messages:
+                print("%s >%s" % (repr(self), mm))
+        return futs
+
+    async def sr(self, message):
+        """send a command and receive the reply"""
+        fut = self._send([message])[0]
+        await self.writer.drain()
+        rx = await fut
+        if self.trace:
+            print("%s <%s" % (repr(self), rx))
+        return rx
+
+    async def sr_many(self, messages):
+        """send many commands pipelined, return replies in order"""
+        futs = self._send(list(messages))
+        await self.writer.drain()
+        return list(await asyncio.gather(*futs))
+
+    def knob(self, name):
+        try:
+            return self.knobs[name]
+        except KeyError:
+            if name in self.knobs.values():
+                return name
+            raise AttributeError("'{}' has no knob '{}'".format(repr(self), name))
+
+    async def get_knob(self, name):
+        return await self.sr(self.knob(name))
+
+    async def set_knob(self, name, value):
+        return await self.sr("%s=%s" % (self.knob(name), value))
+
+    async def batch_get(self, names):
+        """query many knobs in one pipelined burst, return {name: value}"""
+        names = list(names)
+        return dict(zip(names, await self.sr_many([ self.knob(nn) for nn in names ])))
+
+    async def batch_set(self, settings):
+        """set many knobs in one pipelined burst, settings {name: value}, return replies"""
+        return await self.sr_many([ "%s=%s" % (self.knob(nn), vv) for nn, vv in settings.items() ])
+
+    def __getattr__(self, name):
+        """await client.KNOB queries the knob"""
+        if name.startswith('_') or name not in self.__dict__.get('knobs', {}):
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        return self.get_knob(name)
+
+    async def close(self):
+        if self.rx_task:
+            self.rx_task.cancel()
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, AttributeError):
+                pass
+
+
+def _split_key(key):
+    """'s1.shot' -> ('s1', 'shot')"""
+    svc, name = key.split('.', 1)
+    return svc, name
+
+
+class AsyncAcq400:
+    """asyncio proxy for Acq400 uut site services. Use create() to connect.
+
+    Knob keys for batch calls are "SERVICE.KNOB" eg "s0.NCHAN", "s1.shot".
+    """
+    def __init__(self, uut):
+        self.uut = uut
+        self.svc = {}
+        self.sites = []
+
+    @classmethod
+    async def create(cls, uut):
+        """connect s0, then all sites in SITELIST concurrently"""
+        self = cls(uut)
+        s0 = self.svc["s0"] = await AsyncSiteclient.create(uut, AcqPorts.SITE0)
+        sl = (await s0.SITELIST).split(",")
+        sl.pop(0)
+        self.sites = [ int(s.split('=')[0]) for s in sl ]
+        clients = await asyncio.gather(*[ AsyncSiteclient.create(uut, AcqPorts.SITE0+site) for site in self.sites ])
+        for site, svc in zip(self.sites, clients):
+            self.svc["s%d" % site] = svc
+        return self
+
+    def __getattr__(self, name):
+        svc = self.__dict__.get('svc', {}).get(name)
+        if svc is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        return svc
+
+    def __getitem__(self, site):
+        return self.svc["s{}".format(site)]
+
+    def __repr__(self):
+        return 'AsyncAcq400(%s)' % (self.uut)
+
+    def _group(self, keys):
+        groups = collections.OrderedDict()
+        for key in keys:
+            svc, name = _split_key(key)
+            groups.setdefault(svc, []).append(name)
+        return groups
+
+    async def batch_get(self, keys):
+        """query many "sX.KNOB" keys, pipelined per site, sites in parallel. Return {key: value}"""
+        groups = self._group(keys)
+        replies = await asyncio.gather(*[ self.svc[svc].batch_get(names) for svc, names in groups.items() ])
+        rc = {}
+        for (svc, names), reply in zip(groups.items(), replies):
+            for name in names:
+                rc["{}.{}".format(svc, name)] = reply[name]
+        return rc
+
+    async def batch_set(self, settings):
+        """set many "sX.KNOB": value pairs, pipelined per site, sites in parallel. Order within a site is kept"""
+        groups = collections.OrderedDict()
+        for key, value in settings.items():
+            svc, name = _split_key(key)
+            groups.setdefault(svc, collections.OrderedDict())[name] = value
+        await asyncio.gather(*[ self.svc[svc].batch_set(kv) for svc, kv in groups.items() ])
+
+    async def close(self):
+        await asyncio.gather(*[ svc.close() for svc in self.svc.values() ])
+
+
+async def create_uuts(uut_names):
+    """connect to many uuts concurrently, return list of AsyncAcq400 in the same order"""
+    return list(await asyncio.gather(*[ AsyncAcq400.create(uut) for uut in uut_names ]))
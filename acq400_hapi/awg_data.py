@@ -2,6 +2,8 @@
 import numpy as np
 import os
 
+from . import waveforms
+
 
 class AwgDefaults:
     def __init__(self, uut_name):
@@ -29,8 +31,7 @@ class RunsFiles:
     def load(self, autorearm = False):
         for ii in range(99999 if self.run_forever else 1):
             for f in self.files:
-                with open(f, mode='rb') as fp:
-                    self.uut.load_awg(fp.read(), autorearm = autorearm)
+                self.uut.load_awg(f, autorearm = autorearm)
                 yield f 
 
 
@@ -38,9 +39,7 @@ class RunsFiles:
 class SinGen:
     NCYCLES = 5
     def sin(self):
-        nsam = self.nsam
-        NCYCLES = self.NCYCLES
-        return np.sin(np.array(list(range(nsam)))*NCYCLES*2*np.pi/nsam)   # sin, amplitude of 1 (volt)
+        return waveforms.sine(self.nsam, self.NCYCLES).copy()   # sin, amplitude of 1 (volt)
 
 class AllFullScale(SinGen):
     def __init__(self, uut, nchan, nsam, run_forever=False):
@@ -49,14 +48,13 @@ class AllFullScale(SinGen):
         self.nsam = nsam
         self.run_forever = run_forever
         self.sw = self.sin()
-        self.aw = np.zeros((nsam,nchan))
-        for ch in range(nchan):
-            self.aw[:,ch] = self.sw
+        self.aw = np.repeat(self.sw[:, None], nchan, axis=1)
 
     def load(self, autorearm = False):
         for ii in range(99999 if self.run_forever else 1):
+            raw = waveforms.to_dac(self.aw, vfs=1.0)        # payload, once per pass over the channels
             for ch in range(self.nchan):
-                self.uut.load_awg((self.aw*(2**15-1)).astype(np.int16), autorearm = autorearm)
+                self.uut.load_awg(raw, autorearm = autorearm)
                 print("loaded array ", self.aw.shape)
                 yield ch
 
@@ -71,17 +69,13 @@ class RainbowGen:
         return np.add(self.sw, self.offset(ch))
 
     def sin(self):
-        nsam = self.nsam
-        NCYCLES = self.NCYCLES    
-        return np.sin(np.array(list(range(nsam)))*NCYCLES*2*np.pi/nsam)   # sin, amplitude of 1 (volt)
+        return waveforms.sine(self.nsam, self.NCYCLES).copy()   # sin, amplitude of 1 (volt)
 
     def sinc(self, ch):
-        nsam = self.nsam
-        nchan = self.nchan
-        NCYCLES = self.NCYCLES
-        xoff = ch*100
-        xx = np.array(list(range(-nsam//2-xoff, nsam//2-xoff)))*NCYCLES*2*np.pi/nsam
-        return [ np.sin(x)/x if x != 0 else 1 for x in xx ]
+        return self._sinc(ch).copy()
+
+    def _sinc(self, ch):
+        return waveforms.sinc(self.nsam, self.NCYCLES, xoff=ch*100)     # cached, read only
 
     def __init__(self, uut, nchan, nsam, run_forever=False, ao0 = 0):
         self.uut = uut
@@ -102,39 +96,42 @@ class RainbowGen:
             self.current = np.zeros(self.nchan)
             print("no defaults")
 
-        for ch in range(nchan):
-            self.aw[:,ch] = self.rainbow(ch)            
+        self.offsets = np.array([ self.offset(ch) for ch in range(nchan) ])
+        self.aw[:] = self.sw[:, None] + self.offsets[None, :]
+        self.base = None        # (gain, int16 rainbow set), shared by every payload
+
+    def _raw_offsets(self):
+        raw_offsets = np.zeros(self.nchan)
+        raw_offsets[self.ao0:self.ao0+len(self.current)] = self.current
+        return raw_offsets
 
     def build(self, ch, sinc_off_ch=-1):
+        """Returns:
+            ndarray: new int16 payload, the rainbow set with channel ch replaced by a sinc
+        """
         if sinc_off_ch == -1:
             sinc_off_ch = ch
-        aw1 = np.copy(self.aw)
-        aw1[:,ch] = np.add(np.multiply(self.sinc(sinc_off_ch),5),2)
-        awr = (aw1*(2**15-1)/10)/self.gain
-        for chx in range(len(self.current)):
-            awr[:,self.ao0+chx] += self.current[chx]
+        raw_offsets = self._raw_offsets()
+        if self.base is None or self.base[0] != self.gain:
+            self.base = (self.gain, waveforms.channel_set(self.sw, self.nchan, offsets=self.offsets,
+                                                          vfs=10*self.gain, raw_offsets=raw_offsets))
+        awr = self.base[1].copy()
+        waveforms.channel_set(self._sinc(sinc_off_ch), 1, offsets=2, amp=5, vfs=10*self.gain,
+                              raw_offsets=raw_offsets[ch:ch+1], out=awr[:, ch:ch+1])
         return awr
     
     def load(self, autorearm = False, continuous=False):
         for ii in range(99999 if self.run_forever else 1):
             for ch in range(self.nchan):        
                 print("loading array ", self.aw.shape)        
-                self.uut.load_awg(self.build(ch).astype(np.int16), autorearm=autorearm, continuous=continuous)
+                self.uut.load_awg(self.build(ch), autorearm=autorearm, continuous=continuous)
                 print("loaded array ", self.aw.shape)
                 yield ch
 
 class Pulse:
     def generate(self):
-        zset = np.zeros(self.interval)
-        pset = zset
-        pset[self.interval-1-self.flat_top:] = 1
-
-        for seg in range(1, self.nsam/self.interval):
-            x1 = seg*self.interval
-            x2 = x1 + self.interval
-            for ch in range(self.nchan):
-                if seg%self.nchan == ch:
-                    self.aw[x1:x2,ch] = pset
+        self.raw = waveforms.pulse_set(self.nsam, self.nchan, self.interval, self.flat_top)
+        self.aw = self.raw * (10/(2**15-1))
 
 
     def __init__(self, uut, nchan, nsam, args = (1000,10)):
@@ -143,10 +140,9 @@ class Pulse:
         self.nsam = nsam
         (self.interval, self.flat_top) = [ int(u) for u in args ]
         print("self.interval {}".format(self.interval))
-        self.aw = np.zeros((nsam,nchan))
         self.generate()
     def load(self, autorearm = False):
-        self.uut.load_awg((self.aw*(2**15-1)/10).astype(np.int16), autorearm = autorearm)
+        self.uut.load_awg(self.raw, autorearm = autorearm)
         yield self
 
 
@@ -0,0 +1,95 @@
+"""calibration.py vectorized raw to volts conversion
+
+Calibration holds the per channel slope (ESLO) and offset (EOFF) of every
+aggregated site as numpy arrays, channel index from 1 as Acq400.chan2volts.
+Fetch once per shot, then convert whole blocks in one broadcast operation:
+
+- [chan][sample] : volts(raw, channels)            eg read_channels() result
+- [sample][chan] : volts(raw, channels, axis=-1)   eg muxed data, slowmon rows
+- single channel : volts(raw, ch)
+
+example::
+
+    cal = uut.get_calibration()
+    chx = uut.read_channels((1, 2, 3))
+    volts = cal.volts(chx, (1, 2, 3), dtype=np.float32)
+"""
+
+import numpy as np
+
+
+class Calibration:
+    """per channel slope, offset
+
+    Args:
+        eslo (array like): slope per channel 1..N
+        eoff (array like): offset per channel 1..N
+    """
+    def __init__(self, eslo, eoff):
+        # index 0 unused, channel index from 1
+        self.eslo = np.concatenate(([0.0], np.asarray(eslo, dtype=np.float64)))
+        self.eoff = np.concatenate(([0.0], np.asarray(eoff, dtype=np.float64)))
+
+    @classmethod
+    def from_sites(cls, sites):
+        """
+        Args:
+            sites (iterable): aggregated site clients, in channel order
+
+        Returns:
+            Calibration: ESLO, EOFF fetched once per site
+        """
+        eslo = []
+        eoff = []
+        for m in sites:
+            eslo.extend(m.AI_CAL_ESLO.split(' ')[3:])
+            eoff.extend(m.AI_CAL_EOFF.split(' ')[3:])
+        return cls(np.array(eslo, dtype=np.float64), np.array(eoff, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.eslo) - 1
+
+    def __repr__(self):
+        return "Calibration({} channels)".format(len(self))
+
+    def coefficients(self, channels=None, nchan=None):
+        """Returns:
+            tuple: (eslo, eoff) for channels, default 1..nchan
+        """
+        if channels is None:
+            channels = np.arange(1, (len(self) if nchan is None else nchan) + 1)
+        return self.eslo[channels], self.eoff[channels]
+
+    def volts(self, raw, channels=None, axis=0, dtype=np.float64, out=None):
+        """convert a block of raw data to volts, eslo*raw + eoff
+
+        Args:
+            raw (ndarray): raw data, any integer or float type
+            channels (int or list, optional): channel numbers from 1, int: raw is one channel.\
+                Defaults to 1..raw.shape[axis].
+            axis (int, optional): channel axis, 0: [chan][sample], -1: [sample][chan]. Defaults to 0.
+            dtype (np.dtype, optional): result type eg np.float32. Defaults to np.float64.
+            out (ndarray, optional): destination, may be raw itself if raw is float for in place conversion.\
+                Defaults to new array.
+
+        Returns:
+            ndarray: volts
+
+        Raises:
+            IndexError: no calibration for a channel
+        """
+        raw = np.asarray(raw)
+        if isinstance(channels, (int, np.integer)):
+            eslo, eoff = self.eslo[channels], self.eoff[channels]
+        else:
+            eslo, eoff = self.coefficients(channels, raw.shape[axis] if raw.ndim else 1)
+            if raw.ndim > 1:
+                shape = [1] * raw.ndim
+                shape[axis] = len(eslo)
+                eslo = eslo.reshape(shape)
+                eoff = eoff.reshape(shape)
+        if out is None:
+            out = np.empty(raw.shape, dtype=dtype)
+        np.multiply(raw, eslo.astype(out.dtype), out=out, casting='unsafe')
+        np.add(out, eoff.astype(out.dtype), out=out)
+        return out
@@ -149,7 +149,7 @@ class ch_egu(ch_raw):
         if self.args.WSIZE == 4:
             yy = yy/256
         try:
-            return self.args.the_uut.chan2volts(self.ch, yy), self.egu_fmt.format(self.ch), SMOO
+            return self.args.the_uut.get_calibration().volts(yy, self.ch), self.egu_fmt.format(self.ch), SMOO
         except:
             return yy, raw_fmt.format(self.ch), SMOO
 
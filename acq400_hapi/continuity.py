@@ -0,0 +1,163 @@
+"""continuity.py vectorized continuity check of spad sample counters and TLATCH
+
+A counter column (spad[0] sample count, TLATCH, ..) in a muxed stream should
+advance by step every row. ContinuityChecker finds every row where it does not,
+in one vectorized pass per buffer, u32 wrap safe. State carries across calls:
+
+- the last count, so a gap at a buffer boundary is seen
+- the row phase, so buffers need not start on a row boundary
+
+Results accumulate in a ContinuityReport: discontinuities, missed samples,
+step histogram and the first max_positions discontinuity positions.
+
+example::
+
+    checker = continuity.ContinuityChecker(row_words=ssb//4, column=nchan//2)
+    for buf in uut.stream(recvlen=0x100000, data_size=4):
+        if checker.check(buf).discontinuities:
+            print(checker.report)
+
+    uut.stream(sink=[FileSink("data.dat"), checker])     # inline sink
+"""
+
+import numpy as np
+
+
+class ContinuityReport:
+    """continuity check result
+
+    Attributes:
+        samples (int): counter values checked
+        discontinuities (int): rows where the counter did not advance by step
+        missed (int): samples skipped, sum of forward steps beyond step, in step units
+        backward (int): discontinuities where the counter went back or repeated
+        histogram (dict): {step: occurrences} including the good step
+        positions (ndarray): sample index of the first max_positions discontinuities
+        steps (ndarray): counter step at each position
+        first (int): first counter value, None if none seen
+        last (int): last counter value, None if none seen
+    """
+    def __init__(self, max_positions=1000):
+        self.max_positions = max_positions
+        self.samples = 0
+        self.discontinuities = 0
+        self.missed = 0
+        self.backward = 0
+        self.histogram = {}
+        self.positions = np.zeros(0, dtype=np.int64)
+        self.steps = np.zeros(0, dtype=np.int64)
+        self.first = None
+        self.last = None
+
+    @property
+    def ok(self):
+        return self.discontinuities == 0
+
+    def merge(self, other):
+        """add a later report to this one"""
+        self.samples += other.samples
+        self.discontinuities += other.discontinuities
+        self.missed += other.missed
+        self.backward += other.backward
+        for step, count in other.histogram.items():
+            self.histogram[step] = self.histogram.get(step, 0) + count
+        room = self.max_positions - len(self.positions)
+        if room > 0 and len(other.positions):
+            self.positions = np.concatenate((self.positions, other.positions[:room]))
+            self.steps = np.concatenate((self.steps, other.steps[:room]))
+        if self.first is None:
+            self.first = other.first
+        if other.last is not None:
+            self.last = other.last
+        return self
+
+    def __str__(self):
+        return "samples {} discontinuities {} missed {} backward {}".format(
+                self.samples, self.discontinuities, self.missed, self.backward)
+
+    def __repr__(self):
+        return "ContinuityReport({})".format(self)
+
+
+class ContinuityChecker:
+    """u32 counter continuity, carried across buffers
+
+    Args:
+        row_words (int, optional): u32 words per row, ssb//4, for muxed data. Defaults to None: check_counts() only.
+        column (int, optional): counter column, u32 words from the start of the row. Defaults to 0.
+        step (int, optional): expected increment per row. Defaults to 1.
+        max_positions (int, optional): discontinuity positions kept. Defaults to 1000.
+    """
+    def __init__(self, row_words=None, column=0, step=1, max_positions=1000):
+        self.row_words = row_words
+        self.column = column
+        self.step = step
+        self.max_positions = max_positions
+        self.phase = 0                  # u32 words of the current row seen in earlier buffers
+        self.report = ContinuityReport(max_positions)
+
+    def column_of(self, data):
+        """Returns:
+            ndarray: u32 counter values in muxed data, a strided view, no copy
+        """
+        words = np.frombuffer(data, dtype=np.uint32)
+        return words[(self.column - self.phase) % self.row_words::self.row_words]
+
+    def check(self, data):
+        """check the counter column of muxed data
+
+        Args:
+            data (buffer): ndarray of any dtype, bytes or memoryview, length a multiple of 4 bytes
+
+        Returns:
+            ContinuityReport: this buffer, also merged into report
+        """
+        counts = self.column_of(data)
+        self.phase = (self.phase + memoryview(data).nbytes // 4) % self.row_words
+        return self.check_counts(counts)
+
+    def check_counts(self, counts):
+        """check counter values, continuing from the last call
+
+        Args:
+            counts (ndarray): counter values, int32 or uint32
+
+        Returns:
+            ContinuityReport: these values, also merged into report
+        """
+        counts = np.asarray(counts).astype(np.uint32, copy=False)
+        result = ContinuityReport(self.max_positions)
+        if len(counts) == 0:
+            return result
+        last = self.report.last
+        steps = np.empty(len(counts), dtype=np.uint32)
+        np.subtract(counts[1:], counts[:-1], out=steps[1:])
+        if last is None:
+            steps[0] = self.step
+        else:
+            steps[0] = (int(counts[0]) - last) & 0xffffffff
+        steps = steps.view(np.int32)
+
+        bad = np.flatnonzero(steps != self.step)
+        bad_steps = steps[bad].astype(np.int64)
+        result.samples = len(counts)
+        result.discontinuities = len(bad)
+        result.missed = int(np.sum(bad_steps[bad_steps > self.step] - self.step)) // self.step
+        result.backward = int(np.count_nonzero(bad_steps <= 0))
+        good = len(counts) - len(bad) - (1 if last is None else 0)
+        if good:
+            result.histogram[self.step] = good
+        if len(bad):
+            values, occurrences = np.unique(bad_steps, return_counts=True)
+            result.histogram.update(zip(values.tolist(), occurrences.tolist()))
+            result.positions = bad[:self.max_positions] + self.report.samples
+            result.steps = bad_steps[:self.max_positions]
+        result.first = int(counts[0])
+        result.last = int(counts[-1])
+        self.report.merge(result)
+        return result
+
+    def __call__(self, data):
+        """StreamEngine sink, never stops the stream"""
+        self.check(data)
+        return False
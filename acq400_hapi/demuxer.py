@@ -0,0 +1,111 @@
+"""demuxer.py host side demux engine
+
+- demux() : muxed [sample][channel] to [channel][sample] in a single blocked pass
+- demux_spad() : as demux(), scratchpad columns split out as u32 [spad][sample]
+
+Data is walked once, a block of samples at a time, the block is sized to stay
+in cache while it is transposed. This replaces the per channel idiom::
+
+    for ch in range(NCHAN):
+        raw_channels[ch][i0:i1] = data[ch::NCHAN]
+
+which makes NCHAN passes over the whole buffer.
+"""
+
+import os
+import numpy as np
+
+# block size in bytes: fits comfortably in L2
+BLOCK_BYTES = int(os.getenv("DEMUX_BLOCK_BYTES", "262144"))
+
+
+def block_samples(nchan, itemsize):
+    """number of samples per demux block for nchan x itemsize sample"""
+    return max(64, BLOCK_BYTES // (nchan * itemsize))
+
+
+def _channel_index(channels, nchan):
+    """return a slice if channels is a contiguous range, else an index array"""
+    if channels is None:
+        return slice(0, nchan)
+    ix = np.asarray(channels, dtype=np.intp)
+    if len(ix) > 0 and np.all(np.diff(ix) == 1):
+        return slice(int(ix[0]), int(ix[-1]) + 1)
+    return ix
+
+
+def demux(data, nchan, channels=None, out=None, block=None):
+    """demux muxed data [sample][channel] to [channel][sample]
+
+    Args:
+        data (ndarray): muxed data, 1D or [sample][channel]. Incomplete final sample is dropped.
+        nchan (int): channels per sample
+        channels (list, optional): channel indices from 0, subset to demux. Defaults to all.
+        out (ndarray, optional): [channel][sample] destination, may be a view eg chx[:, i0:i1]. Defaults to new array.
+        block (int, optional): samples per block. Defaults to block_samples().
+
+    Returns:
+        ndarray: [channel][sample] data
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:len(data) - len(data) % nchan].reshape(-1, nchan)
+    nsam = data.shape[0]
+    cix = _channel_index(channels, nchan)
+    nout = len(range(nchan)[cix]) if isinstance(cix, slice) else len(cix)
+
+    if out is None:
+        out = np.empty((nout, nsam), dtype=data.dtype)
+    elif out.shape[1] < nsam:
+        nsam = out.shape[1]
+
+    if not block:
+        block = block_samples(nchan, data.itemsize)
+
+    for s0 in range(0, nsam, block):
+        s1 = min(s0 + block, nsam)
+        out[:, s0:s1] = data[s0:s1, cix].T
+
+    return out[:, :nsam]
+
+
+def demux_spad(data, ndata, nspad, channels=None, block=None):
+    """demux muxed data with trailing scratchpad, split data and spad
+
+    Sample layout: ndata channels of data.dtype followed by nspad u32 spad words.
+
+    Args:
+        data (ndarray): muxed data, 1D, dtype int16 or int32
+        ndata (int): data channels per sample
+        nspad (int): u32 spad words per sample
+        channels (list, optional): data channel indices from 0. Defaults to all.
+        block (int, optional): samples per block. Defaults to block_samples().
+
+    Returns:
+        tuple: (ndarray [channel][sample], ndarray u32 [spad][sample])
+    """
+    data = np.asarray(data)
+    ssb = ndata * data.itemsize + nspad * 4
+    if ssb % data.itemsize or ssb % 4:
+        raise ValueError("sample size {} not aligned".format(ssb))
+    nwords = ssb // data.itemsize
+    nsam = data.nbytes // ssb
+    data = data[:nsam * nwords]
+    mux = data.reshape(-1, nwords)
+    mux32 = data.view(np.uint32).reshape(-1, ssb // 4)
+    spad_off = ndata * data.itemsize // 4
+
+    cix = _channel_index(channels, ndata)
+    nout = len(range(ndata)[cix]) if isinstance(cix, slice) else len(cix)
+    chx = np.empty((nout, nsam), dtype=data.dtype)
+    spx = np.empty((nspad, nsam), dtype=np.uint32)
+
+    if not block:
+        block = block_samples(nwords, data.itemsize)
+
+    for s0 in range(0, nsam, block):
+        s1 = min(s0 + block, nsam)
+        chx[:, s0:s1] = mux[s0:s1, :ndata][:, cix].T
+        spx[:, s0:s1] = mux32[s0:s1, spad_off:].T
+
+    return chx, spx
@@ -0,0 +1,254 @@
+"""dirfile.py incremental per channel dirfile output
+
+- DirfileWriter : append demuxed blocks to per channel files as they arrive
+- DirfileReader : read or tail a dirfile while it is being written
+
+A dirfile is a directory with one RAW file per field and a ``format`` file
+describing the fields, see https://getdata.sourceforge.net/dirfile.html
+
+The writer also keeps an ``INDEX`` file holding the count of samples that are
+complete in every field. It is replaced atomically after each append, so a
+reader that honours it never sees a partly written sample.
+
+example::
+
+    df = DirfileWriter.open("DATA/acq2106_061")
+    for buf in uut.stream(data_size=2):
+        df.append_muxed(buf, nchan)
+    df.close()
+"""
+
+import os
+import threading
+import time
+import numpy as np
+
+from .demuxer import demux
+
+
+# dirfile RAW type codes, 'c' is the legacy UINT8 and has no signed form
+DIRFILE_TYPES = {
+    'int8': 'INT8', 'uint8': 'UINT8',
+    'int16': 's', 'uint16': 'u',
+    'int32': 'S', 'uint32': 'U',
+    'int64': 'i', 'uint64': 'I',
+    'float32': 'f', 'float64': 'd',
+}
+NUMPY_TYPES = {
+    'c': np.uint8, 'INT8': np.int8, 'UINT8': np.uint8, 's': np.int16, 'u': np.uint16, 'S': np.int32, 'U': np.uint32,
+    'i': np.int64, 'I': np.uint64, 'f': np.float32, 'd': np.float64,
+    'INT16': np.int16, 'UINT16': np.uint16, 'INT32': np.int32, 'UINT32': np.uint32,
+    'INT64': np.int64, 'UINT64': np.uint64, 'FLOAT32': np.float32, 'FLOAT64': np.float64,
+}
+
+INDEX = "INDEX"
+FORMAT = "format"
+
+
+def read_format(root):
+    """Returns:
+        dict: {name: np.dtype} of the RAW fields in root/format, in file order, empty if none
+    """
+    fields = {}
+    try:
+        with open(os.path.join(root, FORMAT)) as fp:
+            for line in fp:
+                fx = line.split()
+                if len(fx) >= 3 and not fx[0].startswith('#') and fx[1] == 'RAW':
+                    fields[fx[0]] = np.dtype(NUMPY_TYPES[fx[2]])
+    except FileNotFoundError:
+        pass
+    return fields
+
+
+def _replace(path, text):
+    tmp = "{}.tmp".format(path)
+    with open(tmp, 'w') as fp:
+        fp.write(text)
+    os.replace(tmp, path)
+
+
+class DirfileWriter:
+    """appends data to per channel RAW files, keeps format and INDEX consistent.
+
+    Args:
+        root (str): dirfile directory, created if needed
+        fields (list, optional): field names, in [channel] order for append(). Defaults to none.
+        dtype (np.dtype, optional): field data type. Defaults to np.int16.
+        uut (str, optional): name for format file header. Defaults to None.
+        append (bool, optional): reuse an existing dirfile: its fields are kept and appended to.
+            Defaults to False: a new dirfile, fields truncated.
+    """
+    writers = {}                # one writer per root, for re-use by open()
+    writers_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, root, fields=(), dtype=np.int16, uut=None, append=False):
+        """return the writer for root, so that several producers share one format file"""
+        key = os.path.abspath(root)
+        with cls.writers_lock:
+            writer = cls.writers.get(key)
+            if writer is None:
+                writer = cls.writers[key] = cls(root, fields, dtype, uut, append)
+            else:
+                for name in fields:
+                    writer.add_field(name, dtype)
+            return writer
+
+    def __init__(self, root, fields=(), dtype=np.int16, uut=None, append=False):
+        self.root = root
+        self.uut = uut
+        self.lock = threading.RLock()
+        self.fields = {}            # name : [fp, dtype, nsamples]
+        self.order = []
+        self.residue = None
+        self.nsamples = 0
+        os.makedirs(root, exist_ok=True)
+        for name, dt in (read_format(root).items() if append else ()):
+            self.fields[name] = [None, dt, os.path.getsize(os.path.join(root, name))//dt.itemsize
+                                 if os.path.exists(os.path.join(root, name)) else 0]
+            self.order.append(name)
+        for name in fields:
+            self.add_field(name, dtype, update=False)
+        self.update_format()
+        self.update_index()
+
+    def add_field(self, name, dtype=np.int16, update=True):
+        """register new field, truncates any previous file of that name. Registered fields, including
+        those kept by append=True, are left alone"""
+        with self.lock:
+            if name in self.fields:
+                return
+            open(os.path.join(self.root, name), 'wb').close()
+            self.fields[name] = [None, np.dtype(dtype), 0]      # file opened on first append
+            self.order.append(name)
+            if update:
+                self.update_format()
+
+    def update_format(self):
+        with self.lock:
+            text = "# dirfile format file{}\n".format(" for {}".format(self.uut) if self.uut else "")
+            for name in self.order:
+                text += "{} RAW {} 1\n".format(name, DIRFILE_TYPES[self.fields[name][1].name])
+            _replace(os.path.join(self.root, FORMAT), text)
+
+    def update_index(self):
+        with self.lock:
+            self.nsamples = min((fd[2] for fd in self.fields.values()), default=0)
+            _replace(os.path.join(self.root, INDEX), "{}\n".format(self.nsamples))
+
+    def append_field(self, name, data, flush=True):
+        """append samples to one field, creating it on first use"""
+        with self.lock:
+            if name not in self.fields:
+                self.add_field(name, data.dtype)
+            fd = self.fields[name]
+            if fd[0] is None:
+                fd[0] = open(os.path.join(self.root, name), 'ab')
+            np.asarray(data, dtype=fd[1]).tofile(fd[0])
+            fd[2] += len(data)
+            if flush:
+                self.flush()
+
+    def write_field(self, name, data):
+        """write complete field, replacing previous content, eg one channel per shot. No file is held open."""
+        with self.lock:
+            if name not in self.fields:
+                self.add_field(name, data.dtype)
+            fd = self.fields[name]
+            if fd[0] is not None:
+                fd[0].close()
+                fd[0] = None
+            with open(os.path.join(self.root, name), 'wb') as fp:
+                np.asarray(data, dtype=fd[1]).tofile(fp)
+            fd[2] = len(data)
+            self.update_index()
+
+    def append(self, chx, names=None):
+        """append demuxed block [channel][sample], row n to field names[n]"""
+        with self.lock:
+            for name, row in zip(names if names else self.order, chx):
+                self.append_field(name, row, flush=False)
+            self.flush()
+
+    def append_muxed(self, raw, nchan, channels=None):
+        """demux and append muxed block [sample][channel], partial samples carry to next call
+
+        Args:
+            raw (ndarray): muxed data
+            nchan (int): channels per sample
+            channels (list, optional): channel indices from 0, in field order. Defaults to all.
+        """
+        with self.lock:
+            if self.residue is not None and len(self.residue):
+                raw = np.concatenate((self.residue, raw))
+            nkeep = len(raw) - len(raw) % nchan
+            self.residue = raw[nkeep:].copy()
+            self.append(demux(raw[:nkeep], nchan, channels=channels))
+
+    def flush(self):
+        with self.lock:
+            for fd in self.fields.values():
+                if fd[0] is not None:
+                    fd[0].flush()
+            self.update_index()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            for fd in self.fields.values():
+                if fd[0] is not None:
+                    fd[0].close()
+                    fd[0] = None
+        with DirfileWriter.writers_lock:
+            DirfileWriter.writers.pop(os.path.abspath(self.root), None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class DirfileReader:
+    """reads fields of a dirfile, safe against a concurrent DirfileWriter.
+
+    Args:
+        root (str): dirfile directory
+    """
+    def __init__(self, root):
+        self.root = root
+        self.fields = {}
+        self.read_format()
+
+    def read_format(self):
+        if not os.path.exists(os.path.join(self.root, FORMAT)):
+            raise FileNotFoundError(os.path.join(self.root, FORMAT))
+        self.fields.update(read_format(self.root))
+
+    def nsamples(self):
+        """samples complete in every field"""
+        try:
+            with open(os.path.join(self.root, INDEX)) as fp:
+                return int(fp.read())
+        except (IOError, ValueError):
+            return min((os.path.getsize(os.path.join(self.root, name))//dt.itemsize
+                        for name, dt in self.fields.items()), default=0)
+
+    def read(self, name, start=0, end=None):
+        """read field samples [start:end], end defaults to nsamples()"""
+        dt = self.fields[name]
+        end = self.nsamples() if end is None else end
+        return np.fromfile(os.path.join(self.root, name), dtype=dt,
+                           count=max(end - start, 0), offset=start*dt.itemsize)
+
+    def tail(self, names=None, interval=1.0, start=0):
+        """generator: yield (start, {name: new samples}) as the writer adds data. Runs until closed."""
+        names = names if names else list(self.fields)
+        while True:
+            end = self.nsamples()
+            if end > start:
+                yield start, { name: self.read(name, start, end) for name in names }
+                start = end
+            else:
+                time.sleep(interval)
@@ -0,0 +1,293 @@
+"""disk_writer.py high rate stream to disk writer stage
+
+DiskWriter copies incoming buffers (any size, any buffer type) into a pool of
+page aligned staging blocks, one memcpy and no slicing copies. A writer thread
+drains full blocks with one os.writev() per batch, so the receive loop never
+waits on the disk while a block is free.
+
+- WRITER_BLOCK bytes per staging block, WRITER_NBLOCK blocks in the pool
+- direct=True : O_DIRECT, page cache bypassed. Aligned blocks, unaligned tail
+  written without O_DIRECT. Falls back to buffered where unsupported (eg tmpfs)
+- file_bytes : rolling files, fname.format(index) or fname(index) names each,
+  preallocated with posix_fallocate, truncated to size written on close
+- fsync : "none", "file" fdatasync each file before close, "batch" after every writev
+
+DiskWriter is a StreamEngine sink, or call write(data) from any receive loop.
+
+example::
+
+    with disk_writer.DiskWriter("data.dat", direct=True) as writer:
+        for buf in uut.stream(recvlen=0x100000, data_size=4):
+            writer.write(buf)
+    print(writer.stats())
+
+    uut.stream(sink=disk_writer.DiskWriter("{:04d}.dat", file_bytes=0x4000000))
+"""
+
+import os
+import fcntl
+import queue
+import threading
+import time
+import numpy as np
+
+WRITER_ALIGN = 4096
+WRITER_BLOCK = int(os.getenv("WRITER_BLOCK", "0x400000"), 0)     # staging block bytes
+WRITER_NBLOCK = int(os.getenv("WRITER_NBLOCK", "8"))             # staging blocks in pool
+WRITER_FSYNC = os.getenv("WRITER_FSYNC", "none")                 # none, file, batch
+
+O_DIRECT = getattr(os, "O_DIRECT", 0)
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 16
+
+
+def aligned_buffer(nbytes, align=WRITER_ALIGN):
+    """Returns:
+        ndarray: nbytes uint8, first byte on an align boundary, as O_DIRECT requires
+    """
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    offset = -raw.ctypes.data % align
+    return raw[offset:offset + nbytes]
+
+
+def _writev_all(fd, views):
+    """writev() until every view is written, resumes after short writes"""
+    while views:
+        nbytes = os.writev(fd, views)
+        while views and nbytes >= len(views[0]):
+            nbytes -= len(views[0])
+            views = views[1:]
+        if views and nbytes:
+            views[0] = views[0][nbytes:]
+
+
+class DiskWriter:
+    """staged, threaded writer to one file or a series of rolling files
+
+    Args:
+        fname (str or callable): file name, with file_bytes: fname.format(index) or fname(index)
+        file_bytes (int, optional): roll to a new file after this many bytes. Defaults to one file.
+        direct (bool, optional): open with O_DIRECT. Defaults to False.
+        fsync (str, optional): "none", "file" or "batch". Defaults to WRITER_FSYNC.
+        block (int, optional): staging block bytes, multiple of WRITER_ALIGN. Defaults to WRITER_BLOCK.
+        nblock (int, optional): staging blocks in pool, >= 2. Defaults to WRITER_NBLOCK.
+        preallocate (bool, optional): posix_fallocate each file to file_bytes. Defaults to True.
+    """
+    def __init__(self, fname, file_bytes=None, direct=False, fsync=None, block=None, nblock=None, preallocate=True):
+        self.fname = fname
+        self.file_bytes = file_bytes
+        self.direct = direct and O_DIRECT != 0
+        self.fsync = fsync if fsync else WRITER_FSYNC
+        if self.fsync not in ("none", "file", "batch"):
+            raise ValueError("fsync {} not one of none, file, batch".format(self.fsync))
+        self.preallocate = preallocate
+        block = block if block else WRITER_BLOCK
+        self.block_bytes = max(WRITER_ALIGN, block - block % WRITER_ALIGN)
+        self.free = queue.Queue()
+        for ii in range(max(2, nblock if nblock else WRITER_NBLOCK)):
+            self.free.put(aligned_buffer(self.block_bytes))
+        self.full = queue.Queue()
+        self.error = None
+
+        # consumer side
+        self.block = None
+        self.fill = 0
+        self.file_index = -1
+        self.file_fill = 0
+        self.current = None             # name of file being written
+        self.last_file = None           # name of file being or last written
+        self.counters = { "bytes": 0, "files": 0, "writes": 0, "block_waits": 0, "wait_seconds": 0.0,
+                          "write_seconds": 0.0, "fsync_seconds": 0.0 }
+        self.t0 = time.perf_counter()
+
+        self.fd = None
+        self.thread = threading.Thread(target=self._writer, name="DiskWriter", daemon=True)
+        self.thread.start()
+
+    def _name(self, index):
+        return self.fname(index) if callable(self.fname) else self.fname.format(index)
+
+    def _get_block(self):
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            pass
+        t1 = time.perf_counter()
+        self.counters["block_waits"] += 1
+        block = self.free.get()
+        self.counters["wait_seconds"] += time.perf_counter() - t1
+        return block
+
+    def _submit(self, eof):
+        self.full.put((self.block, self.fill, eof))
+        self.block = None
+        self.fill = 0
+        if eof:
+            self.file_fill = 0
+            self.current = None
+
+    def write(self, data):
+        """copy data into staging, full blocks go to the writer thread. Blocks only when no block is free
+
+        Args:
+            data (buffer): ndarray, bytes, bytearray or memoryview, C contiguous
+        """
+        if self.error:
+            raise self.error
+        mv = memoryview(data).cast('B')
+        pos = 0
+        while pos < len(mv):
+            if self.current is None:
+                self.file_index += 1
+                self.current = self.last_file = self._name(self.file_index)
+                self.full.put(self.current)
+            if self.block is None:
+                self.block = self._get_block()
+            nbytes = min(len(mv) - pos, self.block_bytes - self.fill)
+            if self.file_bytes:
+                nbytes = min(nbytes, self.file_bytes - self.file_fill)
+            self.block[self.fill:self.fill+nbytes] = np.frombuffer(mv[pos:pos+nbytes], dtype=np.uint8)
+            self.fill += nbytes
+            self.file_fill += nbytes
+            self.counters["bytes"] += nbytes
+            pos += nbytes
+            eof = self.file_bytes is not None and self.file_fill == self.file_bytes
+            if self.fill == self.block_bytes or eof:
+                self._submit(eof)
+
+    def __call__(self, data):
+        """StreamEngine sink"""
+        self.write(data)
+        return False
+
+    def flush(self):
+        """write all staged data and wait until the writer thread has it on the file"""
+        if self.block is not None and self.fill:
+            self._submit(False)
+        self.full.join()
+        if self.error:
+            raise self.error
+
+    def close(self):
+        """write out the last, partial block, close the file and stop the writer thread"""
+        if self.thread is None:
+            return
+        if self.current is not None:
+            if self.block is None:
+                self.block = self._get_block()
+            self._submit(True)
+        self.full.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # writer thread
+
+    def _open(self, fname):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        try:
+            self.fd = os.open(fname, flags | (O_DIRECT if self.direct else 0), 0o644)
+        except OSError:
+            if not self.direct:
+                raise
+            print("WARNING: O_DIRECT not supported for {}, buffered write".format(fname))
+            self.direct = False
+            self.fd = os.open(fname, flags, 0o644)
+        self.fd_direct = self.direct
+        self.fd_bytes = 0
+        if self.preallocate and self.file_bytes and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self.fd, 0, self.file_bytes)
+            except OSError:
+                self.preallocate = False
+        self.counters["files"] += 1
+
+    def _sync(self):
+        t1 = time.perf_counter()
+        os.fdatasync(self.fd) if hasattr(os, "fdatasync") else os.fsync(self.fd)
+        self.counters["fsync_seconds"] += time.perf_counter() - t1
+
+    def _close_file(self):
+        if self.fsync == "file":
+            self._sync()
+        if self.preallocate and self.file_bytes and self.fd_bytes < self.file_bytes:
+            os.ftruncate(self.fd, self.fd_bytes)
+        os.close(self.fd)
+        self.fd = None
+
+    def _write_batch(self, batch):
+        views = [ memoryview(block)[:nbytes] for block, nbytes, eof in batch if nbytes ]
+        tail = views[-1] if views and len(views[-1]) % WRITER_ALIGN else None
+        if tail is not None and self.fd_direct:
+            # O_DIRECT needs aligned length: unaligned tail is written buffered
+            views = views[:-1]
+        t1 = time.perf_counter()
+        try:
+            if views:
+                _writev_all(self.fd, views)
+            if tail is not None and self.fd_direct:
+                fcntl.fcntl(self.fd, fcntl.F_SETFL, fcntl.fcntl(self.fd, fcntl.F_GETFL) & ~O_DIRECT)
+                self.fd_direct = False
+                _writev_all(self.fd, [tail])
+        finally:
+            for block, nbytes, eof in batch:
+                self.free.put(block)
+        self.counters["write_seconds"] += time.perf_counter() - t1
+        self.counters["writes"] += 1
+        self.fd_bytes += sum(nbytes for block, nbytes, eof in batch)
+        if self.fsync == "batch":
+            self._sync()
+
+    def _writer(self):
+        pending = None
+        while True:
+            item = pending if pending is not None else self.full.get()
+            pending = None
+            if item is None:
+                self.full.task_done()
+                break
+            batch = [item]
+            try:
+                if self.error is not None:
+                    # stop writing at the first error, write() and flush() report it
+                    if not isinstance(item, str):
+                        self.free.put(item[0])
+                    continue
+                if isinstance(item, str):
+                    self._open(item)
+                    continue
+                # gather every block already queued for this file, one writev
+                while not batch[-1][2] and len(batch) < IOV_MAX:
+                    try:
+                        nxt = self.full.get_nowait()
+                    except queue.Empty:
+                        break
+                    if not isinstance(nxt, tuple):
+                        pending = nxt
+                        break
+                    batch.append(nxt)
+                self._write_batch(batch)
+                if batch[-1][2]:
+                    self._close_file()
+            except OSError as err:
+                self.error = err
+            finally:
+                for ii in batch:
+                    self.full.task_done()
+        if self.fd is not None:
+            self._close_file()
+
+    def stats(self):
+        """Returns:
+            dict: bytes, files, writes, seconds, MBps, block_waits, wait_seconds, write_seconds, fsync_seconds
+        """
+        stats = dict(self.counters)
+        stats["seconds"] = time.perf_counter() - self.t0
+        stats["MBps"] = stats["bytes"] / 0x100000 / stats["seconds"] if stats["seconds"] else 0
+        return stats
@@ -0,0 +1,137 @@
+"""es_index.py vectorized event signature (ES) index for muxed data
+
+An ES is a sample inserted into the data stream at each event. It starts with
+ES_WORDS u32 words 0xaa55f15N (N: event id, eg f154 trigger, f15f), followed by
+the sample count and clock count at ES_SAMPLE, ES_CLK.
+
+- find_es() : word offsets of all ES in one vectorized pass, blocked for memmap
+- decode() : compact structured index: offset, event, sample, clk
+- load_index() : index for a data file, optionally persisted beside it for instant reuse
+
+example::
+
+    idx = es_index.load_index("acq2106_123/000001/0000", stride=nchan32, persist=True)
+    bursts = idx['offset'] // nchan32
+"""
+
+import os
+import numpy as np
+
+ES_MAGIC = 0xaa55f150
+ES_MASK = 0xfffffff0
+ES_WORDS = 4                # signature words checked
+ES_SAMPLE = 4               # sample count word
+ES_CLK = 5                  # clock count word
+
+BLOCK_WORDS = int(os.getenv("ES_BLOCK_WORDS", "0x1000000"), 0)
+
+ES_DTYPE = np.dtype([('offset', np.int64), ('event', np.uint8), ('sample', np.uint32), ('clk', np.uint32)])
+INDEX_SUFFIX = ".esidx.npz"
+
+
+def _match(words):
+    return (words & ES_MASK) == ES_MAGIC
+
+
+def is_es(data):
+    """True if data starts with a complete signature
+
+    Args:
+        data (bytes or ndarray): raw data, at least ES_WORDS u32
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        words = np.frombuffer(data, dtype=np.uint32, count=min(ES_WORDS, len(data)//4))
+    else:
+        words = np.asarray(data).view(np.uint32)[:ES_WORDS]
+    return len(words) == ES_WORDS and bool(np.all(_match(words)))
+
+
+def find_es(data, stride=1):
+    """find all ES in one pass
+
+    Args:
+        data (ndarray): u32 data, np.memmap ok
+        stride (int, optional): sample size in u32, ES are only looked for at sample starts. 1: any word. Defaults to 1.
+
+    Returns:
+        ndarray: int64 word offsets of ES
+    """
+    data = data.view(np.uint32)
+    stride = int(stride)
+    nsam = (len(data) - ES_WORDS) // stride + 1
+    if nsam <= 0:
+        return np.empty(0, dtype=np.int64)
+    block = max(1, BLOCK_WORDS // stride)
+    hits = []
+    for s0 in range(0, nsam, block):
+        s1 = min(s0 + block, nsam)
+        cand = np.flatnonzero(_match(data[s0*stride:s1*stride:stride])).astype(np.int64)
+        cand = cand*stride + s0*stride
+        for ww in range(1, ES_WORDS):
+            cand = cand[_match(data[cand + ww])]
+        hits.append(cand)
+    return np.concatenate(hits)
+
+
+def decode(data, offsets):
+    """Returns:
+        ndarray: ES_DTYPE record per ES, sample and clk are 0 if past the end of data
+    """
+    data = data.view(np.uint32)
+    idx = np.zeros(len(offsets), dtype=ES_DTYPE)
+    idx['offset'] = offsets
+    idx['event'] = data[offsets] & 0xf
+    for field, ww in (('sample', ES_SAMPLE), ('clk', ES_CLK)):
+        ok = offsets + ww < len(data)
+        idx[field][ok] = data[offsets[ok] + ww]
+    return idx
+
+
+def build_index(data, stride=1):
+    return decode(data, find_es(data, stride))
+
+
+def index_path(fname):
+    return fname + INDEX_SUFFIX
+
+
+def _signature(fname, stride):
+    st = os.stat(fname)
+    return np.array([st.st_size, st.st_mtime_ns, stride], dtype=np.int64)
+
+
+def load_index(fname, stride=1, persist=False):
+    """ES index for a data file, reused from INDEX_SUFFIX file if the data is unchanged
+
+    Args:
+        fname (str): raw data file
+        stride (int, optional): sample size in u32. Defaults to 1.
+        persist (bool, optional): save a new index beside the data. Defaults to False.
+
+    Returns:
+        ndarray: ES_DTYPE index
+    """
+    sig = _signature(fname, stride)
+    try:
+        with np.load(index_path(fname)) as saved:
+            if np.array_equal(saved['signature'], sig):
+                return saved['index']
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+
+    nwords = int(sig[0]) // 4
+    idx = build_index(np.memmap(fname, dtype=np.uint32, mode='r', shape=(nwords,)), stride) if nwords \
+            else np.zeros(0, dtype=ES_DTYPE)
+    if persist:
+        save_index(fname, idx, sig)
+    return idx
+
+
+def save_index(fname, idx, signature):
+    tmp = "{}.{}.tmp".format(index_path(fname), os.getpid())
+    try:
+        with open(tmp, 'wb') as fp:
+            np.savez(fp, index=idx, signature=signature)
+        os.replace(tmp, index_path(fname))
+    except (IOError, OSError) as err:
+        print("WARNING: es_index save {} failed {}".format(index_path(fname), err))
@@ -0,0 +1,176 @@
+"""es_split.py split muxed data into one file per burst at each event signature (ES)
+
+- split_file() : index the file with es_index, then copy each burst in the kernel
+  with os.copy_file_range / os.sendfile, falling back to large read/write
+- EsSplitter : split a live stream eg Acq400.stream(), ES located per buffer,
+  an ES straddling two buffers is held over until complete
+
+Output files are OUT_DIR/0000, 0001 .. , each new file starts with its ES sample.
+
+example::
+
+    es_split.split_file("acq2106_123/000001/0000", uut.s0.ssb, "./split_files")
+
+    with es_split.EsSplitter(ssb, "./split_files") as splitter:
+        for buf in uut.stream(data_size=4):
+            splitter.feed(buf)
+"""
+
+import os
+import numpy as np
+
+from . import es_index
+
+COPY_CHUNK = int(os.getenv("ES_SPLIT_COPY_CHUNK", "0x1000000"), 0)
+
+
+def _out_name(out_dir, file_num):
+    return os.path.join(out_dir, "{:04d}".format(file_num))
+
+
+def copy_range(src_fd, dst_fd, offset, count):
+    """copy count bytes from src_fd at offset to the current position of dst_fd, in kernel where possible"""
+    end = offset + count
+    try:
+        while offset < end:
+            ncopy = os.copy_file_range(src_fd, dst_fd, end - offset, offset)
+            if ncopy == 0:
+                break
+            offset += ncopy
+    except (AttributeError, OSError):
+        pass
+    try:
+        while offset < end:
+            ncopy = os.sendfile(dst_fd, src_fd, offset, end - offset)
+            if ncopy == 0:
+                break
+            offset += ncopy
+    except (AttributeError, OSError):
+        pass
+    while offset < end:
+        chunk = os.pread(src_fd, min(COPY_CHUNK, end - offset), offset)
+        if not chunk:
+            break
+        os.write(dst_fd, chunk)
+        offset += len(chunk)
+
+
+def burst_starts(fname, ssb):
+    """Returns:
+        list: byte offset of each burst, the first burst starts at 0 whether or not it has an ES
+    """
+    offsets = es_index.load_index(fname, ssb//4)['offset'] * 4
+    return [0] + [ int(off) for off in offsets if off > 0 ]
+
+
+def split_file(fname, ssb, out_dir):
+    """split file on ES into out_dir/NNNN, one copy per burst
+
+    Args:
+        fname (str): raw muxed data file
+        ssb (int): sample size in bytes, multiple of 4
+        out_dir (str): output directory, created if needed
+
+    Returns:
+        int: number of files written
+    """
+    ssb = int(ssb)
+    os.makedirs(out_dir, exist_ok=True)
+    starts = burst_starts(fname, ssb)
+    ends = starts[1:] + [os.path.getsize(fname)]
+    src_fd = os.open(fname, os.O_RDONLY)
+    try:
+        for file_num, (start, end) in enumerate(zip(starts, ends)):
+            dst_fd = os.open(_out_name(out_dir, file_num), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                copy_range(src_fd, dst_fd, start, end - start)
+            finally:
+                os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return len(starts)
+
+
+class EsSplitter:
+    """split a stream of buffers on ES, each buffer is written with one write per output file
+
+    Args:
+        ssb (int): sample size in bytes, multiple of 4
+        out_dir (str): output directory, created if needed
+    """
+    def __init__(self, ssb, out_dir):
+        self.ssb = int(ssb)
+        self.stride = self.ssb // 4
+        self.out_dir = out_dir
+        self.residue = b''
+        self.file_num = 0
+        self.fp = None
+        self.nbytes = 0
+        self.nsamples = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _write(self, view):
+        if self.fp is None:
+            self.fp = open(_out_name(self.out_dir, self.file_num), 'wb', buffering=0)
+        self.fp.write(view)
+
+    def _next_file(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+            self.file_num += 1
+
+    def feed(self, buf):
+        """split and write buf, bytes or ndarray. Samples too near the end to check for ES are held over"""
+        data = bytes(self.residue) + bytes(memoryview(buf).cast('B')) if self.residue else memoryview(buf).cast('B')
+        nwords = len(data) // 4
+        if nwords < es_index.ES_WORDS:
+            self.residue = bytes(data)
+            return
+        # sample s can be checked if its signature words are all here
+        ncheck = min((nwords - es_index.ES_WORDS) // self.stride + 1, len(data) // self.ssb)
+        words = np.frombuffer(data, dtype=np.uint32, count=nwords)
+        starts = [ int(off) // self.stride for off in es_index.find_es(words, self.stride) ]
+
+        view = memoryview(data)
+        pos = 0
+        for sam in starts:
+            if sam >= ncheck:
+                break
+            if sam > 0 or self.nsamples > 0:
+                if sam > pos:
+                    self._write(view[pos*self.ssb:sam*self.ssb])
+                self._next_file()
+                pos = sam
+        if ncheck > pos:
+            self._write(view[pos*self.ssb:ncheck*self.ssb])
+        self.nsamples += ncheck
+        self.nbytes += ncheck*self.ssb
+        self.residue = bytes(view[ncheck*self.ssb:])
+
+    def close(self):
+        """write any held over data to the current file"""
+        if self.residue:
+            self._write(memoryview(self.residue))
+            self.residue = b''
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def split_stream(bufs, ssb, out_dir):
+    """split an iterable of buffers, eg uut.stream(), until it ends
+
+    Returns:
+        int: number of files written
+    """
+    with EsSplitter(ssb, out_dir) as splitter:
+        for buf in bufs:
+            splitter.feed(buf)
+    return splitter.file_num + 1
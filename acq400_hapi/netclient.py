@@ -14,6 +14,7 @@ import socket
 import re
 import sys
 import os
+import time
 from threading import Lock
 import select
 
@@ -38,9 +39,27 @@ class Netclient:
     trace = int(os.getenv("NETCLIENT_TRACE", "0"))
     connect_timeout = int(os.getenv("NETCLIENT_CONNECT_TO", "0"))
 
+    termex_cache = {}       # (str pattern, flags) : compiled bytes pattern
+    SCAN_OVERLAP = 64       # rescan margin for a terminator split across recv()
+
+    @staticmethod
+    def bytes_termex(termex):
+        """bytes version of a str terminator regex, compiled once and cached"""
+        pattern = getattr(termex, 'pattern', termex)
+        if isinstance(pattern, bytes):
+            return termex if hasattr(termex, 'search') else re.compile(pattern)
+        flags = getattr(termex, 'flags', 0) & ~re.UNICODE
+        btx = Netclient.termex_cache.get((pattern, flags))
+        if btx is None:
+            btx = Netclient.termex_cache[(pattern, flags)] = re.compile(pattern.encode("latin-1"), flags)
+        return btx
+
     def receive_message(self, termex, maxlen=4096):
         """Read the information from the socket line at a time.
 
+        Received bytes accumulate in a reused buffer, only new data is scanned
+        for the terminator and the message is decoded once.
+
         Args:
             termex (str): regex defines line terminator
             maxlen (int): max read size
@@ -48,20 +67,25 @@ class Netclient:
         Returns:
             string representing message
         """
-
-        match = termex.search(self.buffer)
+        btx = Netclient.bytes_termex(termex)
+        scan = 0
+        match = btx.search(self.buffer)
         while match == None:
-            self.buffer += self.sock.recv(maxlen).decode("latin-1")
+            if len(self.rxchunk) < maxlen:
+                self.rxchunk = bytearray(maxlen)
+            nrx = self.sock.recv_into(self.rxchunk, maxlen)
+            if nrx == 0:
+                raise ConnectionResetError("{} connection closed".format(repr(self)))
+            scan = max(0, len(self.buffer) - Netclient.SCAN_OVERLAP)
+            self.buffer += memoryview(self.rxchunk)[:nrx]
             if Netclient.trace > 1:
-                print("self.buffer {}".format(self.buffer))
-            match = termex.search(self.buffer)
+                print("self.buffer {}".format(self.buffer.decode("latin-1")))
+            match = btx.search(self.buffer, scan)
 
-        rc = self.buffer[:match.start(1)]
-        self.buffer = self.buffer[match.end(1):]
+        rc = self.buffer[:match.start(1)].decode("latin-1")
+        del self.buffer[:match.end(1)]
         return rc
 
-
-
     def send(self, message):
         if Netclient.trace > 1:
             print("send({})".format(message))
@@ -77,7 +101,8 @@ class Netclient:
     def __init__(self, addr, port) :
         if Netclient.trace:
             print("Netclient.init {} {}".format(addr, port))
-        self.buffer = ""
+        self.buffer = bytearray()
+        self.rxchunk = bytearray(4096)
         self.__addr = addr
         self.__port = int(port)
         try:
@@ -103,7 +128,8 @@ class Netclient:
         except socket.error:
             pass
         self.sock.close()
-        Netclient.instances.remove(self)
+        if self in Netclient.instances:
+            Netclient.instances.remove(self)
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
@@ -162,6 +188,64 @@ class Siteclient(Netclient):
     prevent_autocreate = False
     pat = re.compile(r"[:.]")
 
+    # knob read cache, opt in by enable_cache() or SITECLIENT_CACHE_TTL
+    # <0: off, 0: static knobs only, >0: other knobs cached for ttl seconds
+    cache_ttl = float(os.getenv("SITECLIENT_CACHE_TTL", "-1"))
+    # fixed for the life of the connection, cached forever, persisted by schema_cache.
+    # Not knobs a client may set at runtime, eg data32, adc_18b: always read fresh
+    static_knobs = set((
+        "MODEL", "PART_NUM", "MTYPE",
+        "module_name", "module_role", "fpga_version", "software_version",
+        "SITELIST", "is_tiga", "has_mgt", "has_mgtdram", "has_dsp", "has_wr", "has_hudp",
+    ))
+    # never cached, even with ttl > 0
+    volatile_re = re.compile(r"state|STATE|COUNT|_SC$|^shot$|task_active|ELAPSED")
+
+    def enable_cache(self, ttl=0):
+        """enable knob read cache
+
+        Args:
+            ttl (float, optional): 0: static knobs only, >0: cache other knobs for ttl seconds. Defaults to 0.
+        """
+        self.__dict__['cache_ttl'] = ttl
+
+    def disable_cache(self):
+        self.__dict__['cache_ttl'] = -1
+        self.invalidate_cache(static=True)
+
+    def invalidate_cache(self, static=False):
+        """drop cached dynamic knobs, and static knobs if requested. Safe from any thread (eg a state listener)"""
+        with self.cache_lock:
+            if static:
+                self.cache.clear()
+            else:
+                for key in [ kk for kk in self.cache if kk not in self.static_knobs ]:
+                    del self.cache[key]
+
+    def cache_stats(self):
+        return { "hits": self.cache_hits, "misses": self.cache_misses }
+
+    def cached_sr(self, cmd):
+        """knob query through the read cache"""
+        if self.cache_ttl < 0:
+            return self.sr(cmd)
+        static = cmd in self.static_knobs
+        if not static and (self.cache_ttl == 0 or self.volatile_re.search(cmd)):
+            return self.sr(cmd)
+
+        now = time.time()
+        with self.cache_lock:
+            hit = self.cache.get(cmd)
+        if hit and (static or now - hit[1] < self.cache_ttl):
+            self.__dict__['cache_hits'] += 1
+            return hit[0]
+
+        self.__dict__['cache_misses'] += 1
+        rx = self.sr(cmd)
+        with self.cache_lock:
+            self.cache[cmd] = (rx, now)
+        return rx
+
     @synchronized
     def sr(self, message):
         """send a command and receive a reply
@@ -172,6 +256,10 @@ class Siteclient(Netclient):
         Returns:
             rx (str): response string
         """
+        if "=" in message and self.cache:
+            with self.cache_lock:
+                self.cache.pop(message.split("=")[0].strip(), None)
+            self.invalidate_cache()
         if (self.trace):
             print("%s >%s" % (repr(self), message.rstrip()))
         self.sock.send((message+"\n").encode())
@@ -208,7 +296,7 @@ class Siteclient(Netclient):
         if self.knobs == None:
             return object.__setattr__(self, name)
         if self.knobs.get(name) != None:
-                return self.sr(self.knobs.get(name))
+                return self.cached_sr(self.knobs.get(name))
         else:
                 msg = "'{0}' object has no attribute '{1}'"
                 raise AttributeError(msg.format(type(self).__name__, name))
@@ -234,10 +322,22 @@ class Siteclient(Netclient):
 
     trace = int(os.getenv("SITECLIENT_TRACE", "0"))
 
-    def __init__(self, addr, port):
+    def __init__(self, addr, port, knobs=None, static=None):
+        """connect and build the knob table
+
+        Args:
+            addr (str): uut hostname or ip-address
+            port (int): site service port
+            knobs (dict, optional): known knob table, skips help. Defaults to None.
+            static (dict, optional): known static knob values {cmd: value}, preloads the cache. Defaults to None.
+        """
 #        print("Siteclient.init")
         self.knobs = {}
         self.lock = Lock()
+        self.cache = {}
+        self.cache_lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         self.show_responses = False
         Netclient.__init__(self, addr, port)
@@ -246,11 +346,90 @@ class Siteclient(Netclient):
         self.termex = re.compile(r"\n(acq400.[0-9]+ ([0-9]+) >)")
         self.trace = 1 if Siteclient.trace > 1 else 0
         self.sr("prompt on")
-        self.build_knobs(self.sr("help"))
+        if knobs:
+            self.knobs = dict(knobs)
+        else:
+            self.build_knobs(self.sr("help"))
+        if static:
+            self.preload(static)
         self.trace = Siteclient.trace
         self.prevent_autocreate = True
         #self.show_responses = True
 
+    def preload(self, static):
+        """seed the knob cache with known static values {cmd: value}, enables static caching"""
+        if self.cache_ttl < 0:
+            self.enable_cache(0)
+        with self.cache_lock:
+            self.cache.update((cmd, (value, 0)) for cmd, value in static.items())
+
+    def static_values(self):
+        """Returns:
+            dict: {cmd: value} for the static knobs this site has, queried fresh
+        """
+        cmds = [ cmd for cmd in self.knobs.values() if cmd in self.static_knobs ]
+        return { cmd: self.sr(cmd) for cmd in cmds }
+
+
+class LazySiteclient:
+    """stands in for a Siteclient, connects on first use.
+
+    Static knob values known in advance are served without connecting.
+
+    Args:
+        addr (str): uut hostname or ip-address
+        port (int): site service port
+        knobs (dict): knob table
+        static (dict, optional): static knob values {cmd: value}. Defaults to None.
+    """
+    def __init__(self, addr, port, knobs, static=None):
+        # a schema written by an older version may hold knobs no longer static
+        static = { cmd: value for cmd, value in (static or {}).items() if cmd in Siteclient.static_knobs }
+        self.__dict__.update(_addr=addr, _port=int(port), knobs=dict(knobs), static=static,
+                             client=None, cache_ttl=None, _lock=Lock())
+
+    def connect(self):
+        """Returns:
+            Siteclient: the connected client, created on first call
+        """
+        with self._lock:
+            if self.client is None:
+                client = Siteclient(self._addr, self._port, knobs=self.knobs, static=self.static)
+                if self.cache_ttl is not None:
+                    client.enable_cache(self.cache_ttl)
+                self.__dict__['client'] = client
+            return self.client
+
+    def __getattr__(self, name):
+        if self.client is None:
+            cmd = self.knobs.get(name)
+            if cmd in self.static:
+                return self.static[cmd]
+        return getattr(self.connect(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.connect(), name, value)
+
+    def enable_cache(self, ttl=0):
+        if self.client is None:
+            self.__dict__['cache_ttl'] = ttl
+        else:
+            self.client.enable_cache(ttl)
+
+    def invalidate_cache(self, static=False):
+        if self.client is not None:
+            self.client.invalidate_cache(static)
+
+    def cache_stats(self):
+        return self.client.cache_stats() if self.client else { "hits": 0, "misses": 0 }
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+
+    def __repr__(self):
+        return 'LazySiteclient(%s, %d)%s' % (self._addr, self._port, "" if self.client else " unconnected")
+
 
 def run_unit_test():
     SERVER_ADDRESS = 'acq2106_066'
@@ -0,0 +1,87 @@
+"""schema_cache.py persisted uut site list and knob tables
+
+Building an Acq400 normally runs ``help`` on every site. The schema cache saves
+the site list, the knob table of each site and its static knob values (MODEL,
+module_name ...) to ``ACQ400_SCHEMA_CACHE/UUT.json``, keyed by the uut
+fpga_version and software_version. When the key and SITELIST still match, the
+sites are created as netclient.LazySiteclient and connect only on first use.
+
+Enable with ACQ400_LAZY_SITES=1 or Acq400(uut, lazy=True)
+"""
+
+import json
+import os
+
+CACHE_DIR = os.getenv("ACQ400_SCHEMA_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "acq400_hapi"))
+VERSION_KNOBS = ("fpga_version", "software_version")
+
+
+def _path(uut):
+    return os.path.join(CACHE_DIR, "{}.json".format(uut))
+
+
+def read(uut):
+    """Returns:
+        dict: saved schema for uut or None
+    """
+    try:
+        with open(_path(uut)) as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write(uut, schema):
+    """save schema, replaced atomically so that concurrent readers never see a partial file"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = "{}.{}.tmp".format(_path(uut), os.getpid())
+        with open(tmp, 'w') as fp:
+            json.dump(schema, fp)
+        os.replace(tmp, _path(uut))
+    except (IOError, OSError) as err:
+        print("WARNING: schema_cache write {} failed {}".format(uut, err))
+
+
+def remove(uut):
+    try:
+        os.remove(_path(uut))
+    except OSError:
+        pass
+
+
+def uut_key(s0):
+    """version key and SITELIST, queried bypassing any knob cache
+
+    Args:
+        s0 (netclient.Siteclient): site 0 client
+
+    Returns:
+        dict: fpga_version, software_version, SITELIST
+    """
+    key = { kn: s0.sr(s0.knobs.get(kn, kn)) for kn in VERSION_KNOBS }
+    key["SITELIST"] = s0.sr(s0.knobs.get("SITELIST", "SITELIST"))
+    return key
+
+
+def is_current(schema, key):
+    return schema is not None and schema.get("key") == key
+
+
+def site_schema(svc):
+    """Returns:
+        dict: knobs and static values of one connected site
+    """
+    return { "knobs": svc.knobs, "static": svc.static_values() }
+
+
+def make_schema(key, sites):
+    """
+    Args:
+        key (dict): from uut_key()
+        sites (dict): {site: site_schema()}
+
+    Returns:
+        dict: schema for write()
+    """
+    return { "key": key, "sites": { str(site): ss for site, ss in sites.items() } }
@@ -3,6 +3,11 @@ import threading
 import time
 import os
 import errno
+import asyncio
+import collections
+import concurrent.futures
+
+SHOT_TIMING=int(os.getenv("SHOT_TIMING", "0"))    # 1: print timing_report() after each shot
 
 def wait_for_state(uut, state, timeout=0):
     UUTS = [uut]
@@ -48,92 +53,146 @@ class ActionScript:
 
 class ShotController:
     """ShotController handles shot synchronization for a set of uuts
+
+    Event driven: one asyncio loop waits on all uuts at once, each wait resolved\
+    by the uut Statusmonitor as the state arrives, no thread per uut, no polling.
+    Uploads from all uuts run concurrently after STOP.
+    timing holds per phase seconds of the last shot, see timing_report().
+
+    The loop runs on its own thread, so the blocking methods also work where the
+    caller already has a running loop (Jupyter, asyncio apps). close() or use as
+    a context manager to stop the loop thread and the upload executor.
     """
+    def run(self, coro):
+        """run coro to completion on the controller event loop thread, blocks the caller"""
+        async def guard():
+            # SystemExit would escape the loop thread and leave the caller waiting
+            try:
+                return None, await coro
+            except SystemExit as err:
+                return err, None
+
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self.loop.run_forever, name="ShotController", daemon=True)
+                self.loop_thread.start()
+        err, rc = asyncio.run_coroutine_threadsafe(guard(), self.loop).result()
+        if err is not None:
+            raise err
+        return rc
+
+    def close(self):
+        """stop the event loop thread and the upload executor"""
+        with self.loop_lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.loop_thread.join()
+                self.loop.close()
+                self.loop = None
+                self.loop_thread = None
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def prep_shot(self):
+        self.t_shot = self.t_arm = self.t_armed = time.perf_counter()
+        self.timing = { "uut": { u.uut: {} for u in self.uuts } }
         for u in self.uuts:
             u.statmon.stopped.clear()
             u.statmon.armed.clear()
+            u.statmon.break_requested = False
 
-        self.tp = [ threading.Thread(target=u.statmon.wait_stopped) for u in self.uuts]
-
-        for t in self.tp:
-            t.setDaemon(True)
-            t.start()
+    async def _wait_one(self, u, event):
+        await u.statmon.async_wait_for(event.is_set)
+        return time.perf_counter()
 
-        self.ta = [threading.Thread(target=u.statmon.wait_armed) for u in self.uuts]
+    async def async_wait_all(self, event, phase, t0):
+        """wait for statmon event on every uut. Once one has it, the rest have zombie_timeout, then break_requested
 
-        for t in self.ta:
-            t.setDaemon(True)
-            t.start()
+        Args:
+            event (str): "armed" or "stopped"
+            phase (str): timing key, seconds from t0 to each uut and to the last
+            t0 (float): phase start, time.perf_counter()
+        """
+        tasks = { asyncio.ensure_future(self._wait_one(u, getattr(u.statmon, event))): u for u in self.uuts }
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            done, pending = await asyncio.wait(pending, timeout=self.zombie_timeout)
+        if pending:
+            print("we have zombies")
+            for task in pending:
+                print("{} zombie requested to leave".format(tasks[task].uut))
+                tasks[task].statmon.break_requested = True
+            await asyncio.wait(pending)
+        for task, u in tasks.items():
+            if u.statmon.quit_requested:
+                print("QUIT REQUEST call exit %s" % (event))
+                sys.exit(1)
+            getattr(u.statmon, event).clear()
+            self.timing["uut"][u.uut][phase] = task.result() - t0
+        self.timing[phase] = max(task.result() for task in tasks) - t0
 
     def wait_armed(self):
-        wdt = threading.Thread(target=self.wdt, kwargs={'wait_list': self.ta})
-        wdt.start()
-        for t in self.ta:
-            t.join()
-        wdt.join()
+        self.run(self.async_wait_all("armed", "arm", self.t_arm))
+        self.t_armed = time.perf_counter()
 
     def wait_complete(self):
-        # @@TODO start a watcher task. If one or more has completed, kill the rest after a timeout.
-        wdt = threading.Thread(target=self.wdt, kwargs={'wait_list': self.tp}) 
-        wdt.start()
-        for t in self.tp:
-            t.join()
-        wdt.join()   
-
-    def wdt(self, wait_list):
-        loops_with_zombies = 0
-        
-        while True:
-            alive = 0
-            dead = 0
-            for t in wait_list:
-                if t.is_alive():
-                    alive += 1
-                else:
-                    dead += 1
-            if alive == 0:
-                return
-            elif dead == 0:
-                continue
-            else:
-                loops_with_zombies += 1
-                if loops_with_zombies/10 > self.zombie_timeout:
-                    print("we have zombies")
-                    for ix, u in enumerate(self.uuts):
-                        if wait_list[ix].is_alive():
-                            print("{} zombie requested to leave".format(u.uut))
-                            u.statmon.break_requested = True
-            time.sleep(0.1)
-                             
-            
-            
-    def arm_shot_action(u):
-        def _arm_shot_action():
-            time.sleep(1)
+        self.run(self.async_wait_all("stopped", "run", self.t_armed))
+
+    async def async_arm_shot(self):
+        """set_arm on all uuts, slaves concurrently then the master uuts[0], wait until all are ARMED"""
+        loop = asyncio.get_running_loop()
+        self.t_arm = time.perf_counter()
+
+        def set_arm(u):
 #            u.s0.TRANSIENT_SET_ARM = 1
             u.s0.set_arm = 1
-        return _arm_shot_action
 
+        await asyncio.gather(*[ loop.run_in_executor(self.executor, set_arm, u) for u in self.uuts[1:] ])
+        await loop.run_in_executor(self.executor, set_arm, self.uuts[0])
+        self.timing["set_arm"] = time.perf_counter() - self.t_arm
+        await self.async_wait_all("armed", "arm", self.t_arm)
+        self.t_armed = time.perf_counter()
 
     def arm_shot(self):
-        thx = [ threading.Thread(target=ShotController.arm_shot_action(u)) for u in reversed(self.uuts) ]
-        for t in thx:
-            t.start()
-        for t in thx:
-            t.join()
-        self.wait_armed()
+        self.run(self.async_arm_shot())
 
     def abort_shot(self):
         for u in self.uuts:
             print("%s set_abort" % (u.uut))
             u.s0.set_abort = 1
 
+    def post_shot(self):
+        """runs after on_shot_complete(), counted in the shot time, eg upload. Expect subclass override."""
+        pass
+
     def on_shot_complete(self):
         """runs on completion, expect subclass override."""
         for u in self.uuts:
             print("%s SHOT COMPLETE shot:%s" % (u.uut, u.sA.shot))
 
+    def trigger_shot(self, soft_trigger=False, remote_trigger=None):
+        """once armed: soft_trigger uuts[0] unless the uut soft triggers itself, or call remote_trigger()"""
+        if soft_trigger and not self.uuts[0].auto_soft_trigger_enabled():
+            if soft_trigger < 0:
+                print("hit return for soft_trigger")
+                sys.stdin.readline()
+            else:
+                while soft_trigger > 1:
+                    print("sleep {}".format(soft_trigger))
+                    time.sleep(1)
+                    soft_trigger = soft_trigger - 1
+
+            print("%s soft_trigger" % (self.uuts[0].uut))
+            self.uuts[0].s0.soft_trigger = 1
+        elif remote_trigger != None:
+            remote_trigger()
+
     def run_shot(self, soft_trigger=False, acq1014_ext_trigger=0,
                 remote_trigger=None):
         """run_shot() control an entire shot from client.
@@ -149,20 +208,7 @@ class ShotController:
             self.uuts[0].s2.acq1014_trg = 1
         self.prep_shot()
         self.arm_shot()
-        if soft_trigger and not self.uuts[0].auto_soft_trigger_enabled():
-            if soft_trigger < 0:
-                print("hit return for soft_trigger")
-                sys.stdin.readline()
-            else:
-                while soft_trigger > 1:
-                    print("sleep {}".format(soft_trigger))
-                    time.sleep(1)
-                    soft_trigger = soft_trigger - 1
-
-            print("%s soft_trigger" % (self.uuts[0].uut))
-            self.uuts[0].s0.soft_trigger = 1
-        elif remote_trigger != None:
-            remote_trigger()
+        self.trigger_shot(soft_trigger, remote_trigger)
 
         if acq1014_ext_trigger > 0:
             time.sleep(acq1014_ext_trigger)
@@ -170,6 +216,10 @@ class ShotController:
 
         self.wait_complete()
         self.on_shot_complete()
+        self.post_shot()
+        self.timing["shot"] = time.perf_counter() - self.t_shot
+        if self.show_timing:
+            print(self.timing_report())
 
     def map_channels(self, channels):
         cmap = {}
@@ -191,29 +241,173 @@ class ShotController:
             ii = ii + 1
         return cmap
 
-    def read_channels(self, channels=()):
+    async def async_read_channels(self, channels=()):
+        """read_channels() from all uuts concurrently"""
         self.cmap = self.map_channels(channels)
-        chx = [u.read_channels(self.cmap[iu]) for iu, u in enumerate(self.uuts)]
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+
+        async def upload(iu, u):
+            chx = await loop.run_in_executor(self.executor, u.read_channels, self.cmap[iu])
+            self.timing["uut"].setdefault(u.uut, {})["upload"] = time.perf_counter() - t0
+            return chx
 
-        if self.uuts[0].save_data:
-            with open("%s/format" % (self.uuts[0].save_data), 'w') as fid:
-                for iu, u in enumerate(self.uuts):
-                    for ch in self.cmap[iu]:
-                        fid.write("%s_CH%02d RAW %s 1\n" % (u.uut, ch, 's'))
+        chx = list(await asyncio.gather(*[ upload(iu, u) for iu, u in enumerate(self.uuts) ]))
+        self.timing["upload"] = time.perf_counter() - t0
+        return chx
 
+    def read_channels(self, channels=()):
+        chx = self.run(self.async_read_channels(channels))
+        # save_data dirfile format is maintained by Acq400.save_chan()
 
         return (chx, len(self.uuts), len(chx[0]), len(chx[0][0]))
 
+    def timing_report(self):
+        """Returns:
+            str: per phase seconds of the last shot, total then per uut
+        """
+        phases = [ ph for ph in ("set_arm", "arm", "run", "upload", "shot") if ph in self.timing ]
+        lines = [ "timing " + " ".join("{} {:.3f}".format(ph, self.timing[ph]) for ph in phases) ]
+        for uut, tt in self.timing["uut"].items():
+            lines.append("    {} ".format(uut) + " ".join("{} {:.3f}".format(ph, tt[ph]) for ph in phases if ph in tt))
+        return "\n".join(lines)
+
 
     def __init__(self, _uuts, shot=None, zombie_timeout=30):
         if not isinstance(_uuts, list): _uuts = [_uuts]
         self.uuts = _uuts
         self.zombie_timeout = zombie_timeout
+        self.show_timing = SHOT_TIMING
+        self.loop = None                # started on first run()
+        self.loop_thread = None
+        self.loop_lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(self.uuts))
+        self.t_shot = self.t_arm = self.t_armed = time.perf_counter()
+        self.timing = { "uut": { u.uut: {} for u in self.uuts } }
         if shot != None:
             for u in self.uuts:
                 u.s1.shot = shot
 
 
+class ShotPipeline:
+    """overlapped shot loop: host side processing of shot N runs during arm and run of shot N+1
+
+    Each shot has three stages, with explicit dependencies:
+
+    - shot : prepare(N), arm, trigger, wait STOP on all uuts
+    - capture : capture(N), what the uut must hand over before it may re-arm, eg a DEMUX=0 raw copy
+    - process : process(N, data), decode, save, check. On one worker thread, in shot order
+
+    shot N+1 starts when capture N is done and no more than depth process stages are
+    outstanding. Use only where the firmware allows re-arm once capture has finished,
+    eg MGTDRAM offload or DEMUX=0 raw copy: with nothing captured, process must not
+    read from the uut.
+
+    Args:
+        shot_controller (ShotController): arms, triggers and waits on the uuts
+        capture (callable, optional): capture(shot) -> data. Defaults to None, data None.
+        process (callable, optional): process(shot, data). Defaults to None.
+        prepare (callable, optional): prepare(shot) before arm, eg load AWG. Defaults to None.
+        run (callable, optional): run(shot) runs a shot to STOP, replaces the shot_controller sequence. Defaults to None.
+        depth (int, optional): process stages outstanding while a shot runs. Defaults to 1.
+
+    example::
+
+        sc = acq400_hapi.ShotController(uuts)
+        pipe = acq400_hapi.ShotPipeline(sc, capture=lambda shot: sc.read_channels(0)[0],
+                                        process=lambda shot, chx: np.save("shot{}".format(shot), chx))
+        pipe.run(100, soft_trigger=True)
+        print(pipe.report())
+    """
+    def __init__(self, shot_controller, capture=None, process=None, prepare=None, run=None, depth=1):
+        self.sc = shot_controller
+        self.capture = capture
+        self.process = process
+        self.prepare = prepare
+        self.run_one = run
+        self.depth = max(1, depth)
+        self.worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.shots = []                 # timing dict per shot
+        self.elapsed = 0
+
+    def _process(self, shot, data, timing):
+        t0 = time.perf_counter()
+        self.process(shot, data)
+        timing["process"] = time.perf_counter() - t0
+
+    def _shot(self, shot, soft_trigger, remote_trigger):
+        if self.run_one:
+            self.run_one(shot)
+            return
+        sc = self.sc
+        sc.prep_shot()
+        sc.arm_shot()
+        sc.trigger_shot(soft_trigger, remote_trigger)
+        sc.wait_complete()
+        sc.on_shot_complete()
+
+    def run(self, nshots, soft_trigger=False, remote_trigger=None):
+        """run nshots, overlapped
+
+        Args:
+            nshots (int): shots to run
+            soft_trigger (bool or int, optional): as ShotController.run_shot(). Defaults to False.
+            remote_trigger (callable, optional): as ShotController.run_shot(). Defaults to None.
+
+        Returns:
+            list: timing dict per shot: prepare, arm, run, capture, process, process_wait, cycle seconds
+        """
+        inflight = collections.deque()
+        t_start = time.perf_counter()
+        failed = True
+        try:
+            for shot in range(nshots):
+                timing = { "shot": shot }
+                t0 = time.perf_counter()
+                while len(inflight) > self.depth:
+                    inflight.popleft().result()
+                timing["process_wait"] = time.perf_counter() - t0
+
+                t1 = time.perf_counter()
+                if self.prepare:
+                    self.prepare(shot)
+                t2 = time.perf_counter()
+                timing["prepare"] = t2 - t1
+                self._shot(shot, soft_trigger, remote_trigger)
+                t3 = time.perf_counter()
+                if not self.run_one:
+                    timing["arm"] = self.sc.timing.get("arm", 0)
+                timing["run"] = t3 - t2 - timing.get("arm", 0)
+                data = self.capture(shot) if self.capture else None
+                timing["capture"] = time.perf_counter() - t3
+                if self.process:
+                    inflight.append(self.worker.submit(self._process, shot, data, timing))
+                timing["cycle"] = time.perf_counter() - t0
+                self.shots.append(timing)
+            failed = False
+        finally:
+            # let every stage finish, an error here must not mask one from the shot loop
+            concurrent.futures.wait(inflight)
+            self.elapsed = time.perf_counter() - t_start
+        errors = [ fut.exception() for fut in inflight if fut.exception() is not None ]
+        if errors and not failed:
+            raise errors[0]
+        return self.shots
+
+    def report(self):
+        """Returns:
+            str: shots, shots per hour, mean seconds per stage, serial time vs elapsed
+        """
+        if not self.shots:
+            return "no shots"
+        stages = ("prepare", "arm", "run", "capture", "process", "process_wait")
+        means = { st: sum(tt.get(st, 0) for tt in self.shots)/len(self.shots) for st in stages }
+        serial = sum(means[st] for st in stages if st != "process_wait") * len(self.shots)
+        return "pipeline {} shots {:.1f}s {:.0f} shots/hour serial {:.1f}s\n    mean ".format(
+                len(self.shots), self.elapsed, len(self.shots)*3600/self.elapsed if self.elapsed else 0, serial) + \
+               " ".join("{} {:.3f}".format(st, means[st]) for st in stages)
+
+
 class ShotControllerWithDataHandler(ShotController):
        
     def plot_data(self, args, plot_data, chx, ncol, nchan, nsam):
@@ -348,9 +542,7 @@ class ShotControllerWithDataHandler(ShotController):
                 sf.write("{}\n".format(args.shot))
         return args.shot
 
-    def run_shot(self, soft_trigger=False, acq1014_ext_trigger=0,
-            remote_trigger=None):
-            super().run_shot(soft_trigger, acq1014_ext_trigger, remote_trigger)            
+    def post_shot(self):
             if self.args.save_data or self.args.plot_data:
                 self.handle_data(self.args)
 
@@ -0,0 +1,199 @@
+"""slowmon.py batched slowmon record reader and sinks
+
+A slowmon record is one decimated sample: nchan ADC values then nspad u32
+spad words. spad[SPAD_COUNT] is the sample count and spad[SPAD_DELTA] the
+count since the previous record, as computed on the uut.
+
+- SlowmonReader : receives as many records as are available per recv_into()
+  into a preallocated ring of slots, yields (N, nchan), (N, nspad) views,
+  counts records the uut produced but were not received (gaps) vectorially
+- BinarySink : raw records, one write per batch, format as before
+- CsvSink : row, channels (raw or volts), spad, formatted per batch
+
+Yielded views are valid for the next SLOWMON_RING-1 batches, copy to keep longer.
+
+example::
+
+    reader = uut.slowmon_reader()
+    with slowmon.BinarySink("slowmon.dat") as sink:
+        for chx, spx in reader:
+            sink.write(reader.records)
+    print(reader.stats())
+"""
+
+import os
+import numpy as np
+
+SLOWMON_BATCH = int(os.getenv("SLOWMON_BATCH", "1024"))    # max records per batch
+SLOWMON_RING = int(os.getenv("SLOWMON_RING", "4"))         # slots in ring
+
+SPAD_COUNT = 0
+SPAD_DELTA = 2
+
+
+def record_dtype(nchan, ch_dtype, nspad):
+    return np.dtype([('chx', ch_dtype, (nchan,)), ('spx', np.uint32, (nspad,))])
+
+
+def geometry(ssb, data32, spad, nspad=None):
+    """slowmon record layout from uut knobs s0.ssb, s0.data32, s0.spad
+
+    Args:
+        nspad (int, optional): synthetic spad words, eg 4 with slowmon_hw. Defaults to uut spad.
+
+    Returns:
+        tuple: (nchan, ch_dtype, nspad)
+    """
+    data_sz = 4 if int(data32) else 2
+    main_nspad = int(spad.split(',')[1])
+    nchan = (int(ssb) - main_nspad*4)//data_sz
+    return nchan, np.dtype('i4' if data_sz == 4 else 'i2'), nspad if nspad else main_nspad
+
+
+class GapCheck:
+    """count records where the sample count step differs from the uut delta, across batches"""
+    def __init__(self, nspad):
+        self.enabled = nspad > max(SPAD_COUNT, SPAD_DELTA)
+        self.gaps = 0
+        self.last_count = None
+
+    def __call__(self, spx):
+        if not self.enabled or len(spx) == 0:
+            return 0
+        count = spx[:, SPAD_COUNT]
+        ngaps = int(np.count_nonzero(np.diff(count) != spx[1:, SPAD_DELTA]))
+        if self.last_count is not None and (int(count[0]) - self.last_count) & 0xffffffff != spx[0, SPAD_DELTA]:
+            ngaps += 1
+        self.last_count = int(count[-1])
+        self.gaps += ngaps
+        return ngaps
+
+
+class SlowmonReader:
+    """batched slowmon reader
+
+    Args:
+        sock (socket): connected to AcqPorts.SLOWMON
+        nchan (int): ADC channels per record
+        ch_dtype (np.dtype): np.int16 or np.int32
+        nspad (int): spad u32 words per record
+        running (callable, optional): read stops when running() is False. Defaults to always.
+        batch (int, optional): max records per batch. Defaults to SLOWMON_BATCH.
+        ring (int, optional): slots in ring, >= 2. Defaults to SLOWMON_RING.
+    """
+    def __init__(self, sock, nchan, ch_dtype, nspad, running=None, batch=None, ring=None):
+        self.sock = sock
+        self.nchan = nchan
+        self.nspad = nspad
+        self.dtype = record_dtype(nchan, ch_dtype, nspad)
+        self.ssb = self.dtype.itemsize
+        self.running = running if running else lambda: True
+        self.batch = batch if batch else SLOWMON_BATCH
+        self.nslots = max(2, ring if ring else SLOWMON_RING)
+        self.slot_bytes = self.batch * self.ssb
+        self.ring = bytearray(self.nslots * self.slot_bytes)
+        self.records = None             # last batch, structured array
+        self.nrecords = 0
+        self.nbatches = 0
+        self.check_gaps = GapCheck(nspad)
+
+    def batches(self):
+        """Yields:
+            ndarray: record_dtype structured array, all complete records received
+        """
+        ring = memoryview(self.ring)
+        slot = 0
+        fill = 0
+        while self.running():
+            base = slot * self.slot_bytes
+            nrx = self.sock.recv_into(ring[base+fill:base+self.slot_bytes])
+            if nrx == 0:
+                return
+            fill += nrx
+            nrec = fill // self.ssb
+            if nrec == 0:
+                continue
+            records = np.frombuffer(self.ring, self.dtype, count=nrec, offset=base)
+            # partial record moves to the start of the next slot
+            residue = fill - nrec*self.ssb
+            slot = (slot + 1) % self.nslots
+            if residue:
+                nbase = slot * self.slot_bytes
+                ring[nbase:nbase+residue] = ring[base+nrec*self.ssb:base+fill]
+            fill = residue
+            self.check_gaps(records['spx'])
+            self.records = records
+            self.nrecords += nrec
+            self.nbatches += 1
+            yield records
+
+    def __iter__(self):
+        for records in self.batches():
+            yield records['chx'], records['spx']
+
+    def stats(self):
+        """Returns:
+            dict: records, batches, gaps
+        """
+        return { "records": self.nrecords, "batches": self.nbatches, "gaps": self.check_gaps.gaps }
+
+
+class BinarySink:
+    """raw records to file, one write per batch"""
+    def __init__(self, fname):
+        self.fp = open(fname, "wb")
+
+    def write(self, records):
+        self.fp.write(records.view(np.uint8))
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvSink:
+    """CSV row per record: "row, ch1,ch2,..", formatted in one call per batch
+
+    Args:
+        fname (str): output file
+        nchan (int, optional): first nchan channels. Defaults to all.
+        cal (calibration.Calibration, optional): write volts, else raw. Defaults to None.
+        spad (bool, optional): append the spad words to each row. Defaults to False.
+    """
+    def __init__(self, fname, nchan=None, cal=None, spad=False):
+        self.fp = open(fname, "w")
+        self.nchan = nchan
+        self.cal = cal
+        self.spad = spad
+        self.row = 0
+        self.fmt = None
+
+    def write(self, records):
+        chx = records['chx'][:, :self.nchan]
+        spx = records['spx'] if self.spad else records['spx'][:, :0]
+        if self.fmt is None:
+            chfmt = "%.5e" if self.cal is not None else "%d"
+            self.fmt = "%d, " + ",".join([chfmt]*chx.shape[1] + ["%d"]*spx.shape[1])
+        table = np.empty((len(records), 1 + chx.shape[1] + spx.shape[1]), dtype=np.float64)
+        table[:, 0] = np.arange(self.row, self.row + len(records))
+        if self.cal is not None:
+            self.cal.volts(chx, axis=-1, out=table[:, 1:1+chx.shape[1]])
+        else:
+            table[:, 1:1+chx.shape[1]] = chx
+        table[:, 1+chx.shape[1]:] = spx
+        np.savetxt(self.fp, table, fmt=self.fmt)
+        self.row += len(records)
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,311 @@
+"""slowmon_archive.py long running slowmon archive for many uuts
+
+- archive() : one asyncio event loop, one slowmon socket per uut. Data is
+  received straight into a preallocated buffer per uut and written as whole
+  records, there is no per sample Python callback.
+- UutArchive : rolling chunk files, a new chunk every CHUNK_SECONDS, oldest
+  chunks removed beyond max_chunks, so memory and (optionally) disk are bounded
+- ArchiveReader : channel X between t0 and t1, reads only the chunks and
+  records in range through np.memmap
+
+Layout, ROOT/UUT/::
+
+    meta.json               record layout, calibration
+    T0.dat                  raw slowmon records, as slowmon.BinarySink, T0: chunk start, unix ms
+    T0.idx                  time index: (host time, first record) u8 pairs per received batch
+
+example::
+
+    slowmon_archive.run(["acq2106_001", "acq2106_002"], "slowmon_data", runtime=86400)
+
+    ar = slowmon_archive.ArchiveReader("slowmon_data", "acq2106_001")
+    tt, volts = ar.read(1, t0=time.time()-3600, volts=True)
+"""
+
+import asyncio
+import glob
+import json
+import os
+import socket
+import time
+import numpy as np
+
+from . import slowmon
+from .calibration import Calibration
+from .acq400 import AcqPorts
+from .aionetclient import AsyncAcq400
+
+CHUNK_SECONDS = int(os.getenv("SLOWMON_ARCHIVE_CHUNK_SECONDS", "3600"))
+FLUSH_SECONDS = 1           # readers see data at most this late
+RX_BYTES = int(os.getenv("SLOWMON_ARCHIVE_RX_BYTES", "0x40000"), 0)
+
+INDEX_DTYPE = np.dtype([('time', np.float64), ('record', np.int64)])
+
+
+def _uut_dir(root, uut):
+    return os.path.join(root, uut)
+
+
+class UutArchive:
+    """rolling chunked archive for one uut
+
+    Args:
+        root (str): archive root directory
+        uut (str): uut name
+        nchan (int): channels per record
+        ch_dtype (np.dtype): channel data type
+        nspad (int): spad words per record
+        cal (calibration.Calibration, optional): stored in meta.json for volts on read. Defaults to None.
+        chunk_seconds (int, optional): chunk length. Defaults to CHUNK_SECONDS.
+        max_chunks (int, optional): remove the oldest chunks beyond this, 0: keep all. Defaults to 0.
+    """
+    def __init__(self, root, uut, nchan, ch_dtype, nspad, cal=None, chunk_seconds=None, max_chunks=0):
+        self.path = _uut_dir(root, uut)
+        self.uut = uut
+        self.dtype = slowmon.record_dtype(nchan, ch_dtype, nspad)
+        self.chunk_seconds = chunk_seconds if chunk_seconds else CHUNK_SECONDS
+        self.max_chunks = max_chunks
+        self.fp = None
+        self.ifp = None
+        self.t_chunk = 0
+        self.t_flush = 0
+        self.nrec = 0
+        self.records = 0
+        self.check_gaps = slowmon.GapCheck(nspad)
+        os.makedirs(self.path, exist_ok=True)
+        meta = { "uut": uut, "nchan": nchan, "ch_dtype": np.dtype(ch_dtype).str, "nspad": nspad,
+                 "eslo": cal.eslo[1:].tolist() if cal is not None else None,
+                 "eoff": cal.eoff[1:].tolist() if cal is not None else None }
+        with open(os.path.join(self.path, "meta.json"), "w") as fp:
+            json.dump(meta, fp)
+
+    def roll(self, now):
+        self.close()
+        self.t_chunk = now
+        base = os.path.join(self.path, "{:d}".format(int(now*1000)))
+        self.fp = open(base + ".dat", "wb")
+        self.ifp = open(base + ".idx", "wb")
+        self.nrec = 0
+        if self.max_chunks:
+            for old in chunk_files(self.path)[:-self.max_chunks]:
+                for fn in (old, old[:-4] + ".idx"):
+                    try:
+                        os.remove(fn)
+                    except OSError:
+                        pass
+
+    def write(self, view, now):
+        """write whole records in view (bytes like), received at time now"""
+        if self.fp is None or now - self.t_chunk >= self.chunk_seconds:
+            self.roll(now)
+        records = np.frombuffer(view, self.dtype)
+        self.check_gaps(records['spx'])
+        np.array([(now, self.nrec)], dtype=INDEX_DTYPE).tofile(self.ifp)
+        self.fp.write(view)
+        self.nrec += len(records)
+        self.records += len(records)
+        if now - self.t_flush >= FLUSH_SECONDS:
+            self.flush()
+            self.t_flush = now
+
+    def flush(self):
+        if self.fp:
+            self.fp.flush()
+            self.ifp.flush()
+
+    def close(self):
+        if self.fp:
+            self.fp.close()
+            self.ifp.close()
+            self.fp = self.ifp = None
+
+    def stats(self):
+        return { "uut": self.uut, "records": self.records, "gaps": self.check_gaps.gaps }
+
+
+def chunk_files(path):
+    """Returns:
+        list: chunk .dat files in time order
+    """
+    return sorted(glob.glob(os.path.join(path, "*.dat")), key=lambda fn: int(os.path.basename(fn)[:-4]))
+
+
+class ArchiveReader:
+    """query an archive written by UutArchive
+
+    Args:
+        root (str): archive root directory
+        uut (str): uut name
+    """
+    def __init__(self, root, uut):
+        self.path = _uut_dir(root, uut)
+        with open(os.path.join(self.path, "meta.json")) as fp:
+            self.meta = json.load(fp)
+        self.dtype = slowmon.record_dtype(self.meta["nchan"], np.dtype(self.meta["ch_dtype"]), self.meta["nspad"])
+        self.cal = None
+        if self.meta.get("eslo"):
+            self.cal = Calibration(self.meta["eslo"], self.meta["eoff"])
+
+    def chunks(self):
+        """Returns:
+            list: (t_start, dat file)
+        """
+        return [ (int(os.path.basename(fn)[:-4])/1000, fn) for fn in chunk_files(self.path) ]
+
+    def _chunk(self, fn, t0, t1):
+        index = np.fromfile(fn[:-4] + ".idx", dtype=INDEX_DTYPE)
+        nrec = os.path.getsize(fn) // self.dtype.itemsize
+        if len(index) == 0 or nrec == 0:
+            return None
+        index = index[index['record'] < nrec]
+        # a batch is stamped on arrival, at its last record: its records are spread from the
+        # previous arrival to its own. The first batch of a chunk has no previous arrival
+        last = np.append(index['record'][1:], nrec) - 1
+        rtime = np.interp(np.arange(nrec), last, index['time'])
+        r0 = np.searchsorted(rtime, t0, side='left') if t0 is not None else 0
+        r1 = np.searchsorted(rtime, t1, side='right') if t1 is not None else nrec
+        if r1 <= r0:
+            return None
+        records = np.memmap(fn, dtype=self.dtype, mode='r', shape=(nrec,))
+        return rtime[r0:r1], records[r0:r1]
+
+    def read(self, ch, t0=None, t1=None, volts=False):
+        """channel ch (from 1) between t0 and t1, only chunks in range are touched
+
+        Args:
+            ch (int): channel from 1
+            t0 (float, optional): start, unix time. Defaults to start of archive.
+            t1 (float, optional): end, unix time. Defaults to end of archive.
+            volts (bool, optional): apply stored calibration. Defaults to False.
+
+        Returns:
+            tuple: (time, values) ndarrays
+        """
+        chunks = self.chunks()
+        times = []
+        values = []
+        for ic, (tc, fn) in enumerate(chunks):
+            if t1 is not None and tc > t1:
+                break
+            if t0 is not None and ic + 1 < len(chunks) and chunks[ic+1][0] < t0:
+                continue
+            hit = self._chunk(fn, t0, t1)
+            if hit is None:
+                continue
+            times.append(hit[0])
+            values.append(np.array(hit[1]['chx'][:, ch-1]))
+        tt = np.concatenate(times) if times else np.empty(0)
+        yy = np.concatenate(values) if values else np.empty(0, dtype=self.dtype['chx'].base)
+        if volts and self.cal is not None:
+            yy = self.cal.volts(yy, ch)
+        return tt, yy
+
+
+async def uut_layout(uut, nspad=None, egu=True):
+    """Returns:
+        tuple: (nchan, ch_dtype, nspad, Calibration or None), queried in one batch per site
+    """
+    auut = await AsyncAcq400.create(uut)
+    try:
+        s0 = await auut.batch_get(["s0.ssb", "s0.data32", "s0.spad", "s0.aggregator"])
+        if nspad is None:
+            try:
+                nspad = 4 if (await auut.s0.get_knob("slowmon_hw")) == '1' else None
+            except AttributeError:
+                pass
+        nchan, ch_dtype, nspad = slowmon.geometry(s0["s0.ssb"], s0["s0.data32"], s0["s0.spad"], nspad)
+        cal = None
+        if egu:
+            try:
+                sites = s0["s0.aggregator"].split(' ')[1].split('=')[1].split(',')
+                cals = await auut.batch_get(["s{}.{}".format(site, kn) for site in sites for kn in ("AI_CAL_ESLO", "AI_CAL_EOFF")])
+                eslo = [ vv for site in sites for vv in cals["s{}.AI_CAL_ESLO".format(site)].split(' ')[3:] ]
+                eoff = [ vv for site in sites for vv in cals["s{}.AI_CAL_EOFF".format(site)].split(' ')[3:] ]
+                cal = Calibration(np.array(eslo, dtype=np.float64), np.array(eoff, dtype=np.float64))
+            except (AttributeError, IndexError, KeyError, ValueError) as err:
+                print("WARNING: {} no calibration {}".format(uut, err))
+        return nchan, ch_dtype, nspad, cal
+    finally:
+        await auut.close()
+
+
+async def archive_uut(uut, root, stop, chunk_seconds=None, max_chunks=0, nspad=None):
+    """archive one uut until stop (asyncio.Event) is set or the uut closes the connection
+
+    Returns:
+        dict: uut, records, gaps
+    """
+    loop = asyncio.get_event_loop()
+    nchan, ch_dtype, nspad, cal = await uut_layout(uut, nspad)
+    archive = UutArchive(root, uut, nchan, ch_dtype, nspad, cal, chunk_seconds, max_chunks)
+    ssb = archive.dtype.itemsize
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, (uut, AcqPorts.SLOWMON))
+    buf = bytearray(max(RX_BYTES // ssb, 1) * ssb)
+    view = memoryview(buf)
+    fill = 0
+    stopper = asyncio.ensure_future(stop.wait())
+    try:
+        while not stop.is_set():
+            rx = asyncio.ensure_future(loop.sock_recv_into(sock, view[fill:]))
+            await asyncio.wait([rx, stopper], return_when=asyncio.FIRST_COMPLETED)
+            if not rx.done():
+                rx.cancel()
+                break
+            nrx = rx.result()
+            if nrx == 0:
+                break
+            fill += nrx
+            nbytes = fill // ssb * ssb
+            if nbytes:
+                archive.write(view[:nbytes], time.time())
+                # partial record to the front
+                view[:fill-nbytes] = view[nbytes:fill]
+                fill -= nbytes
+    finally:
+        stopper.cancel()
+        sock.close()
+        archive.close()
+    return archive.stats()
+
+
+async def archive(uuts, root, runtime=None, chunk_seconds=None, max_chunks=0, report=60):
+    """archive many uuts concurrently on one event loop
+
+    Args:
+        uuts (list): uut names
+        root (str): archive root directory
+        runtime (float, optional): seconds to run. Defaults to forever.
+        chunk_seconds (int, optional): chunk length. Defaults to CHUNK_SECONDS.
+        max_chunks (int, optional): chunks kept per uut, 0: all. Defaults to 0.
+        report (float, optional): seconds between progress prints, 0: none. Defaults to 60.
+
+    Returns:
+        list: stats per uut
+    """
+    stop = asyncio.Event()
+    tasks = [ asyncio.ensure_future(archive_uut(uut, root, stop, chunk_seconds, max_chunks)) for uut in uuts ]
+    t0 = time.time()
+    try:
+        while not all(task.done() for task in tasks):
+            timeout = report if report else None
+            if runtime is not None:
+                timeout = max(0, min(timeout if timeout else runtime, t0 + runtime - time.time()))
+            await asyncio.wait(tasks, timeout=timeout)
+            if runtime is not None and time.time() - t0 >= runtime:
+                break
+            if report:
+                print("{:.0f}s {}".format(time.time() - t0, ", ".join(
+                        "{} {}".format(uut, "done" if task.done() else "running") for uut, task in zip(uuts, tasks))))
+    finally:
+        stop.set()
+    return list(await asyncio.gather(*tasks, return_exceptions=True))
+
+
+def run(uuts, root, runtime=None, **kwargs):
+    """blocking archive(), Ctrl-C stops cleanly"""
+    try:
+        return asyncio.run(archive(uuts, root, runtime, **kwargs))
+    except KeyboardInterrupt:
+        print("Stopping")
@@ -0,0 +1,277 @@
+"""stl.py state transition list (STL) upload for pattern generators GPG, WRPG, DIO482 PG
+
+An STL is a text list of lines COUNT,STATE or COUNT STATE, +COUNT relative to
+the previous line. The uut acknowledges each line.
+
+- normalise() : strip comments and blanks, check line format, on the host
+- load() : pipelined upload, lines streamed in large writes while a reader
+  thread consumes the per line acknowledgements and checks them for errors,
+  StlTimeout if the uut goes quiet for STL_ACK_TIMEOUT seconds
+- Stl : STL parsed once to numpy arrays (time, state), cached on disk by
+  content hash, compared with the loaded STL so an unchanged upload is skipped
+
+example::
+
+    lines = stl.normalise(open("pattern.stl").read())
+    with netclient.Netclient(uut, AcqPorts.GPGSTL) as nc:
+        stats = stl.load(nc.sock, lines)
+    print("{lines} lines {lines_per_sec:.0f} lines/s".format(**stats))
+
+    pattern = stl.Stl.from_file("STL/sos0.stl")
+    uut.load_gpg(pattern, skip_unchanged=True)      # no upload if already loaded
+"""
+
+import hashlib
+import os
+import re
+import select
+import socket
+import threading
+import time
+import numpy as np
+
+SEND_CHUNK = int(os.getenv("STL_SEND_CHUNK", "65536"))
+ACK_TIMEOUT = float(os.getenv("STL_ACK_TIMEOUT", "30"))        # seconds with no ack before load() gives up
+CACHE_DIR = os.getenv("STL_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "acq400_hapi", "stl"))
+
+STL_LINE = re.compile(r"^\+?[0-9]+(\s*,\s*|\s+)\S+")       # [+]COUNT,STATE or COUNT STATE
+STL_SEP = re.compile(r"\s*,\s*|\s+")
+ERROR_RE = re.compile(rb"error", re.IGNORECASE)
+
+
+class StlTimeout(TimeoutError):
+    """uut stopped acknowledging before the expected acks or EOF"""
+    def __init__(self, timeout, acks, expect, wait_eof):
+        self.timeout = timeout
+        self.acks = acks
+        self.expect = expect
+        self.wait_eof = wait_eof
+    def __str__(self):
+        return "STL load: no reply for {}s, {} acks of {} expected{}".format(
+                self.timeout, self.acks, self.expect, ", no EOF" if self.wait_eof else "")
+
+
+class StlError(Exception):
+    """uut reported errors loading the STL"""
+    def __init__(self, errors):
+        self.errors = errors
+    def __str__(self):
+        return "STL load errors: {}".format("; ".join(self.errors))
+
+
+def normalise(stl, validate=True):
+    """STL text to list of lines to send
+
+    Args:
+        stl (str): stl string each line separated by newlines
+        validate (bool, optional): raise ValueError on a line that is not [+]COUNT,STATE or COUNT STATE. Defaults to True.
+
+    Returns:
+        list: stripped lines, no comment lines, inline comments or blanks, up to any EOF line
+    """
+    lines = []
+    for lnum, ll in enumerate(stl.split("\n"), 1):
+        # inline "# comment" is dropped too, the uut is sent COUNT,STATE only
+        ll = ll.split('#', 1)[0].strip()
+        if len(ll) < 2:
+            continue
+        if ll == "EOF":
+            break
+        if validate and not STL_LINE.match(ll):
+            raise ValueError("STL line {}: bad format \"{}\"".format(lnum, ll))
+        lines.append(ll)
+    return lines
+
+
+def split_line(line):
+    """Returns:
+        list: [count, state] of a normalised line, either separator
+    """
+    return STL_SEP.split(line, 1)
+
+
+class _AckReader(threading.Thread):
+    """consume acknowledgements until EOF, expected count, close, or timeout seconds with nothing received"""
+    def __init__(self, sock, expect, wait_eof, trace, timeout=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.sock = sock
+        self.expect = expect
+        self.wait_eof = wait_eof
+        self.trace = trace
+        self.timeout = timeout
+        self.acks = 0
+        self.errors = []
+        self.eof = False
+        self.timed_out = False
+
+    def run(self):
+        buf = b''
+        try:
+            while not self.finished():
+                if self.timeout and not select.select([self.sock], [], [], self.timeout)[0]:
+                    self.timed_out = True
+                    break
+                rx = self.sock.recv(4096)
+                if not rx:
+                    break
+                if self.trace:
+                    print("< {}".format(rx))
+                if b"EOF" in rx:
+                    self.eof = True
+                *done, buf = (buf + rx).split(b"\n")
+                for ack in done:
+                    if ack.startswith(b"EOF"):
+                        continue
+                    self.acks += 1
+                    if ERROR_RE.search(ack):
+                        self.errors.append(ack.decode("latin-1").strip())
+        except OSError:
+            pass
+
+    def finished(self):
+        return self.eof if self.wait_eof else self.acks >= self.expect
+
+
+def load(sock, lines, wait_eof=True, wait_eol=True, trace=False, timeout=None):
+    """pipelined STL upload on a connected socket
+
+    Args:
+        sock (socket): connection to the STL port
+        lines (list): from normalise()
+        wait_eof (bool, optional): wait for EOF from uut. Defaults to True.
+        wait_eol (bool, optional): uut acknowledges each line. Defaults to True.
+        trace (bool, optional): print each line sent and every ack. Defaults to False.
+        timeout (float, optional): seconds with no reply from the uut before giving up. Defaults to ACK_TIMEOUT.
+
+    Returns:
+        dict: lines, acks, seconds, lines_per_sec
+
+    Raises:
+        StlError: uut reported errors
+        StlTimeout: uut stopped replying, eg acks merged or missing so the count is never reached
+    """
+    t0 = time.perf_counter()
+    reader = None
+    if wait_eof or wait_eol:
+        reader = _AckReader(sock, len(lines) if wait_eol else 0, wait_eof, trace,
+                            timeout if timeout is not None else ACK_TIMEOUT)
+        reader.start()
+
+    chunk = []
+    nchunk = 0
+    for ll in lines + ["EOF"]:
+        if trace:
+            print("> {}".format(ll))
+        chunk.append(ll)
+        nchunk += len(ll) + 1
+        if nchunk >= SEND_CHUNK:
+            sock.sendall(("\n".join(chunk) + "\n").encode())
+            chunk = []
+            nchunk = 0
+    if chunk:
+        sock.sendall(("\n".join(chunk) + "\n").encode())
+    sock.shutdown(socket.SHUT_WR)
+
+    if reader:
+        reader.join()
+    seconds = time.perf_counter() - t0
+    if reader and reader.errors:
+        raise StlError(reader.errors)
+    if reader and reader.timed_out:
+        raise StlTimeout(reader.timeout, reader.acks, reader.expect, wait_eof and not reader.eof)
+    return { "lines": len(lines), "acks": reader.acks if reader else 0,
+             "seconds": seconds, "lines_per_sec": len(lines)/seconds if seconds else 0 }
+
+
+class Stl:
+    """STL as arrays: time (absolute count, int64) and state (uint64) per transition.
+
+    Keeps the normalised lines for upload, "+N" relative counts are resolved in time only.
+
+    Args:
+        lines (list): normalised lines, see normalise()
+        time (ndarray, optional): transition counts. Defaults to parsed from lines.
+        state (ndarray, optional): states. Defaults to parsed from lines.
+    """
+    def __init__(self, lines, time=None, state=None):
+        self.lines = list(lines)
+        if time is None or state is None:
+            time, state = Stl._parse(self.lines)
+        self.time = time
+        self.state = state
+
+    @staticmethod
+    def _parse(lines, first=None):
+        """first: replaces the count of the first line before relative counts are resolved"""
+        fields = [ split_line(ll) for ll in lines ]
+        state = np.array([ int(ss.strip(), 16) for cc, ss in fields ], dtype=np.uint64)
+        time = np.array([ int(cc) for cc, ss in fields ], dtype=np.int64)
+        if first is not None and len(time):
+            time[0] = first
+        rel = np.array([ cc.startswith('+') for cc, ss in fields ], dtype=bool)
+        if rel.any():
+            # relative count: previous transition plus count
+            for ii in np.flatnonzero(rel):
+                time[ii] += time[ii-1] if ii else 0
+        return time, state
+
+    @classmethod
+    def parse(cls, text, validate=True):
+        return cls(normalise(text, validate))
+
+    @classmethod
+    def from_text(cls, text, cache=True):
+        """parse, or load the arrays from the cache if this exact text was seen before"""
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        path = os.path.join(CACHE_DIR, digest + ".npz")
+        if cache:
+            try:
+                with np.load(path) as saved:
+                    lines = str(saved['text'])
+                    return cls(lines.split("\n") if lines else [], saved['time'], saved['state'])
+            except (IOError, OSError, KeyError, ValueError):
+                pass
+        stl = cls.parse(text)
+        if cache:
+            stl.save(path)
+        return stl
+
+    @classmethod
+    def from_file(cls, fname, cache=True):
+        with open(fname) as fp:
+            return cls.from_text(fp.read(), cache)
+
+    def save(self, path):
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as fp:
+                np.savez(fp, text=np.array("\n".join(self.lines)), time=self.time, state=self.state)
+            os.replace(tmp, path)
+        except (IOError, OSError) as err:
+            print("WARNING: Stl cache save {} failed {}".format(path, err))
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+    def rebased_time(self):
+        """Returns:
+            ndarray: transition counts with the first transition at 0, "+N" lines resolved from there
+        """
+        return Stl._parse(self.lines, first=0)[0]
+
+    def digest(self):
+        """hash of the parsed content, independent of formatting"""
+        return hashlib.sha1(self.time.tobytes() + self.state.tobytes()).hexdigest()
+
+    def __eq__(self, other):
+        return isinstance(other, Stl) and np.array_equal(self.time, other.time) and np.array_equal(self.state, other.state)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __repr__(self):
+        return "Stl({} transitions, {})".format(len(self), self.digest()[:8])
@@ -0,0 +1,222 @@
+"""stream_engine.py receive thread, buffer pool and sinks for continuous streams
+
+The socket is read on a dedicated thread into a pool of preallocated
+buffers. Full buffers pass through a bounded queue to the consumer, which
+runs the sinks and returns each buffer to the pool: nothing is copied. A slow
+sink is absorbed by the pool depth instead of stalling the socket; when the
+pool runs dry the receiver waits (backpressure, counted) or, with drop=True,
+keeps draining the socket and counts what was discarded.
+
+- StreamEngine : run(sinks) blocking, or iterate for ndarray views
+- FileSink : append every buffer to one file
+- ValidatorSink : call check(data) per buffer, count failures
+- a sink is any callable sink(data) -> True to stop
+
+example::
+
+    engine = uut.stream_engine(recvlen=0x100000, data_size=4)
+    print(engine.run([stream_engine.FileSink("data.dat"), my_check]))
+
+    uut.stream(sink=FileSink("data.dat"))   # the same, blocking
+"""
+
+import os
+import queue
+import socket
+import threading
+import time
+import numpy as np
+
+STREAM_NBUF = int(os.getenv("STREAM_NBUF", "16"))      # buffers in pool
+
+
+class BufferPool:
+    """nbuf preallocated buffers of nbytes, get() blocks when all are in use"""
+    def __init__(self, nbuf, nbytes):
+        self.nbytes = nbytes
+        self.free = queue.Queue()
+        for ii in range(nbuf):
+            self.free.put(bytearray(nbytes))
+
+    def get(self, block=True, timeout=None):
+        try:
+            return self.free.get(block, timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, buf):
+        self.free.put(buf)
+
+
+class StreamEngine:
+    """receive thread + buffer pool + sinks
+
+    Args:
+        sock (socket): connected stream socket
+        recvlen (int): elements per buffer
+        dtype (np.dtype): element type
+        nbuf (int, optional): buffers in pool. Defaults to STREAM_NBUF.
+        drop (bool, optional): when no buffer is free, discard data rather than wait. Defaults to False.
+        on_stop (callable, optional): called once, after stop() has closed the socket. Defaults to None.
+    """
+    def __init__(self, sock, recvlen, dtype, nbuf=None, drop=False, on_stop=None):
+        self.sock = sock
+        self.on_stop = on_stop
+        self.dtype = np.dtype(dtype)
+        self.nbuf = nbuf if nbuf else STREAM_NBUF
+        self.pool = BufferPool(self.nbuf, recvlen * self.dtype.itemsize)
+        self.full = queue.Queue(self.nbuf + 1)     # all buffers plus end of stream
+        self.drop = drop
+        self.stop_requested = threading.Event()
+        self.thread = None
+        self.scratch = None
+        self.counters = { "buffers": 0, "bytes": 0, "pool_waits": 0, "wait_seconds": 0.0,
+                          "dropped_buffers": 0, "dropped_bytes": 0, "queue_max": 0 }
+        self.t0 = None
+
+    def _fill(self, buf):
+        """fill buf completely unless the stream ends or stop. Returns bytes received"""
+        view = memoryview(buf)
+        pos = 0
+        while pos < len(buf) and not self.stop_requested.is_set():
+            try:
+                nrx = self.sock.recv_into(view[pos:])
+            except OSError:
+                break
+            if nrx == 0:
+                break
+            pos += nrx
+        return pos
+
+    def _receive(self):
+        try:
+            while not self.stop_requested.is_set():
+                buf = self.pool.get(block=False)
+                if buf is None:
+                    if self.drop:
+                        if self.scratch is None:
+                            self.scratch = bytearray(self.pool.nbytes)
+                        nbytes = self._fill(self.scratch)
+                        self.counters["dropped_buffers"] += 1
+                        self.counters["dropped_bytes"] += nbytes
+                        if nbytes < len(self.scratch):
+                            break
+                        continue
+                    t1 = time.perf_counter()
+                    self.counters["pool_waits"] += 1
+                    while buf is None and not self.stop_requested.is_set():
+                        buf = self.pool.get(timeout=0.1)
+                    self.counters["wait_seconds"] += time.perf_counter() - t1
+                    if buf is None:
+                        break
+                nbytes = self._fill(buf)
+                if nbytes:
+                    self.full.put((buf, nbytes))
+                    self.counters["queue_max"] = max(self.counters["queue_max"], self.full.qsize())
+                else:
+                    self.pool.put(buf)
+                if nbytes < len(buf):
+                    break
+        finally:
+            self.full.put(None)
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        self.thread = threading.Thread(target=self._receive, name="StreamEngine", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stop receiving and close the socket, the consumer sees the end of stream"""
+        self.stop_requested.set()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.sock.close()
+        on_stop, self.on_stop = self.on_stop, None
+        if on_stop:
+            on_stop()
+
+    def __iter__(self):
+        """Yields:
+            ndarray: one buffer, valid until the next iteration. Abandoning the iterator stops\
+            the engine and the last buffer is not reused, so next(iter(engine)) is safe to keep.
+        """
+        if self.thread is None:
+            self.start()
+        try:
+            while True:
+                item = self.full.get()
+                if item is None:
+                    return
+                buf, nbytes = item
+                self.counters["buffers"] += 1
+                self.counters["bytes"] += nbytes
+                yield np.frombuffer(buf, self.dtype, count=nbytes // self.dtype.itemsize)
+                # only reached when the consumer asks for the next buffer
+                self.pool.put(buf)
+        finally:
+            self.stop()
+
+    def run(self, sinks):
+        """run until a sink returns True or the stream ends
+
+        Args:
+            sinks (callable or list): sink(data) per buffer, return True to stop
+
+        Returns:
+            dict: stats()
+        """
+        sinks = sinks if isinstance(sinks, (list, tuple)) else [sinks]
+        try:
+            for data in self:
+                if any([ sink(data) for sink in sinks ]):
+                    break
+        finally:
+            self.stop()
+            for sink in sinks:
+                if hasattr(sink, "close"):
+                    sink.close()
+        return self.stats()
+
+    def stats(self):
+        """Returns:
+            dict: buffers, bytes, seconds, MBps, pool_waits, wait_seconds, dropped_buffers, dropped_bytes, queue_max
+        """
+        stats = dict(self.counters)
+        stats["seconds"] = time.perf_counter() - self.t0 if self.t0 else 0
+        stats["MBps"] = stats["bytes"] / 0x100000 / stats["seconds"] if stats["seconds"] else 0
+        return stats
+
+
+class FileSink:
+    """append each buffer to fname, unbuffered: one write per buffer"""
+    def __init__(self, fname):
+        self.fp = open(fname, "wb", buffering=0)
+        self.bytes_written = 0
+
+    def __call__(self, data):
+        self.fp.write(data)
+        self.bytes_written += data.nbytes
+        return False
+
+    def close(self):
+        self.fp.close()
+
+
+class ValidatorSink:
+    """check(data) per buffer, returns True if good. Counts failures, optionally stops on the first"""
+    def __init__(self, check, stop_on_error=False):
+        self.check = check
+        self.stop_on_error = stop_on_error
+        self.buffers = 0
+        self.errors = 0
+
+    def __call__(self, data):
+        self.buffers += 1
+        if not self.check(data):
+            self.errors += 1
+            return self.stop_on_error
+        return False
@@ -0,0 +1,159 @@
+"""waveforms.py vectorized AWG waveform builder
+
+- sine(), sinc(), ramp(), square() : float prototypes, one channel
+- channel_set() : DAC ready (nsam, nchan) int16/int32 set from a prototype plus
+  per channel offsets, converted in row blocks so there is no full size float copy
+- to_dac() : volts to DAC codes, in place into an int array
+- pulse_set() : one pulse per interval, stepping through the channels
+
+Results are cached by parameters (WAVEFORM_CACHE_MAX sets), cached arrays are
+read only: copy before modifying.
+
+example::
+
+    raw = waveforms.channel_set(waveforms.sine(1000000, ncycles=5), 32, offsets=0.1*np.arange(32))
+    uut.load_awg(raw)
+"""
+
+import collections
+import functools
+import os
+import numpy as np
+
+CACHE_MAX = int(os.getenv("WAVEFORM_CACHE_MAX", "16"))
+BLOCK_BYTES = int(os.getenv("WAVEFORM_BLOCK_BYTES", "1048576"))
+
+_cache = collections.OrderedDict()
+
+
+def _key(value):
+    if isinstance(value, np.ndarray):
+        return (value.shape, value.dtype.str, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return tuple(_key(vv) for vv in value)
+    if isinstance(value, type):
+        return np.dtype(value).str
+    return value
+
+
+def cached(fn):
+    """cache fn results by arguments, least recently used dropped beyond CACHE_MAX"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__name__, _key(args), _key(tuple(sorted(kwargs.items()))))
+        try:
+            _cache.move_to_end(key)
+            return _cache[key]
+        except KeyError:
+            pass
+        result = fn(*args, **kwargs)
+        result.flags.writeable = False
+        _cache[key] = result
+        while len(_cache) > CACHE_MAX:
+            _cache.popitem(last=False)
+        return result
+    return wrapper
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def full_scale(dtype=np.int16):
+    return np.iinfo(dtype).max
+
+
+@cached
+def sine(nsam, ncycles=1, phase=0.0, endpoint=False):
+    """sin over ncycles, amplitude 1. endpoint=True includes the last point as np.linspace"""
+    return np.sin(np.linspace(phase, phase + ncycles*2*np.pi, nsam, endpoint=endpoint))
+
+
+@cached
+def square(nsam, ncycles=1, phase=0.0, endpoint=False):
+    return np.sign(sine(nsam, ncycles, phase, endpoint))
+
+
+@cached
+def ramp(nsam, ncycles=1, phase=0.0):
+    """sawtooth 0..1, phase in cycles"""
+    return np.mod(np.linspace(0, ncycles, nsam) + phase, 1)
+
+
+@cached
+def sinc(nsam, ncycles=1, xoff=0):
+    """sin(x)/x, peak 1 at sample nsam//2 + xoff"""
+    xx = (np.arange(nsam) + ((-nsam)//2 - xoff)) * (ncycles*2*np.pi/nsam)
+    return np.sinc(xx/np.pi)
+
+
+def _rows_per_block(nchan, dtype):
+    return max(1, BLOCK_BYTES // (nchan * max(np.dtype(dtype).itemsize, 8)))
+
+
+def to_dac(volts, dtype=np.int16, vfs=10.0, out=None):
+    """volts to DAC codes, truncated as astype(). Float math is buffered by numpy, no full size temp
+
+    Args:
+        volts (ndarray): values in volts
+        dtype (np.dtype, optional): DAC data type. Defaults to np.int16.
+        vfs (float, optional): volts at full scale. Defaults to 10.0.
+        out (ndarray, optional): destination. Defaults to new array.
+    """
+    if out is None:
+        out = np.empty(np.shape(volts), dtype=dtype)
+    np.multiply(volts, full_scale(out.dtype)/vfs, out=out, casting='unsafe')
+    return out
+
+
+def channel_set(wave, nchan, offsets=0.0, amp=1.0, vfs=10.0, dtype=np.int16, raw_offsets=None, out=None):
+    """DAC ready (nsam, nchan) set: channel ch = (wave*amp + offsets[ch]) in volts, plus raw_offsets[ch] in codes
+
+    Args:
+        wave (ndarray): prototype, nsam values in volts
+        nchan (int): channels
+        offsets (float or ndarray, optional): per channel offset, volts. Defaults to 0.0.
+        amp (float or ndarray, optional): per channel gain. Defaults to 1.0.
+        vfs (float, optional): volts at full scale. Defaults to 10.0.
+        dtype (np.dtype, optional): np.int16 or np.int32. Defaults to np.int16.
+        raw_offsets (ndarray, optional): per channel offset, DAC codes. Defaults to None.
+        out (ndarray, optional): (nsam, nchan) destination, filled in place. Defaults to new array.
+
+    Returns:
+        ndarray: (nsam, nchan) DAC codes
+    """
+    if out is None:
+        out = np.empty((len(wave), nchan), dtype=dtype)
+    k = full_scale(out.dtype)/vfs
+    amp = np.broadcast_to(np.asarray(amp, dtype=np.float64), (nchan,))
+    offsets = np.broadcast_to(np.asarray(offsets, dtype=np.float64), (nchan,))
+    add = offsets*k if raw_offsets is None else offsets*k + np.asarray(raw_offsets, dtype=np.float64)
+    scale = amp*k
+    block = _rows_per_block(nchan, out.dtype)
+    for r0 in range(0, len(wave), block):
+        r1 = min(r0 + block, len(wave))
+        tmp = np.multiply(wave[r0:r1, None], scale[None, :])
+        tmp += add[None, :]
+        out[r0:r1] = tmp
+    return out
+
+
+@cached
+def sine_set(nsam, nchan, ncycles=1, amp=1.0, offset_by_channel=0.0, vfs=10.0, dtype=np.int16, endpoint=False):
+    """channel_set() of sine(), channel offset ch*offset_by_channel volts"""
+    return channel_set(sine(nsam, ncycles, endpoint=endpoint), nchan, offsets=np.arange(nchan)*offset_by_channel,
+                       amp=amp, vfs=vfs, dtype=dtype)
+
+
+@cached
+def pulse_set(nsam, nchan, interval, flat_top, amp=1.0, vfs=10.0, dtype=np.int16):
+    """in each interval from the second, one channel in turn pulses amp volts for the last flat_top+1 samples"""
+    out = np.zeros((nsam, nchan), dtype=dtype)
+    nseg = nsam // interval
+    if nseg > 1:
+        segs = np.arange(1, nseg)
+        pulse = np.zeros(interval, dtype=dtype)
+        pulse[interval-1-flat_top:] = to_dac(np.array(amp), dtype, vfs)
+        out3 = out[:nseg*interval].reshape(nseg, interval, nchan)
+        out3[segs, :, segs % nchan] = pulse
+    return out
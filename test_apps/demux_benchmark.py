@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Benchmark host demux: per channel strided loop vs acq400_hapi.demux()
+
+Usage:
+    ./test_apps/demux_benchmark.py
+    ./test_apps/demux_benchmark.py --nchan=96 --nsam=1000000 --data_type=32
+    ./test_apps/demux_benchmark.py --nchan=128 --channels=0:32
+"""
+
+import argparse
+import time
+import numpy as np
+import acq400_hapi
+
+
+def demux_loop(data, nchan, channels, out):
+    """the legacy host_demux idiom, one pass per channel"""
+    for row, ch in enumerate(channels):
+        out[row][:] = data[ch::nchan]
+    return out
+
+
+def bench(label, fn, nbytes, repeats):
+    best = None
+    for rep in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        tt = time.perf_counter() - t0
+        best = tt if best is None else min(best, tt)
+    print("{:>12} {:8.3f} s {:8.2f} GB/s".format(label, best, nbytes/best/1e9))
+    return best
+
+
+def run_main(args):
+    dtype = np.int32 if args.data_type == 32 else np.int16
+    data = np.random.randint(-2**15, 2**15-1, size=args.nsam*args.nchan).astype(dtype)
+    if args.channels:
+        x1, x2 = [int(x) for x in args.channels.split(':')]
+        channels = list(range(x1, x2))
+    else:
+        channels = list(range(args.nchan))
+
+    out = np.empty((len(channels), args.nsam), dtype=dtype)
+    print("nchan {} nsam {} {} selected {} {:.1f} MB".format(
+        args.nchan, args.nsam, np.dtype(dtype).name, len(channels), data.nbytes/1e6))
+
+    t_loop = bench("loop", lambda: demux_loop(data, args.nchan, channels, out), data.nbytes, args.repeats)
+    ref = out.copy()
+    t_demux = bench("demux", lambda: acq400_hapi.demux(data, args.nchan, channels=channels, out=out),
+                    data.nbytes, args.repeats)
+    if not np.array_equal(ref, out):
+        print("ERROR: demux() result does not match loop")
+    print("speedup {:.1f}x".format(t_loop/t_demux))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='demux benchmark')
+    parser.add_argument('--nchan', type=int, default=64, help="channels per sample")
+    parser.add_argument('--nsam', type=int, default=1000000, help="samples")
+    parser.add_argument('--data_type', type=int, default=16, help="16 or 32")
+    parser.add_argument('--channels', type=str, default=None, help="subset from:to, index from 0")
+    parser.add_argument('--repeats', type=int, default=3, help="best of N")
+    return parser
+
+if __name__ == '__main__':
+    run_main(get_parser().parse_args())
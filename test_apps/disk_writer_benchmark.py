@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""Benchmark stream to disk writers, sustained MB/s on a local disk
+
+Compares the writers used by stream_to_host and acq400_stream_multi until now
+with acq400_hapi.disk_writer.DiskWriter. Buffers are "received" by a copy into
+a receive buffer, as recv_into() would. Every case ends with fsync so the rate
+is to disk, not to page cache.
+
+- host : fp.write(buffer[start:cursor]), slice copy per buffer, one file
+- multi : buf.tofile() one file per buffer
+- writer : DiskWriter, one file
+- rolling : DiskWriter, rolling files of --file_mb
+- direct : DiskWriter O_DIRECT, rolling files of --file_mb
+
+Usage:
+    ./test_apps/disk_writer_benchmark.py --dir=/data/bench
+    ./test_apps/disk_writer_benchmark.py --dir=/data/bench --total_mb=8192 --recv_kb=1024
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import time
+import numpy as np
+from acq400_hapi import disk_writer
+
+
+def receive(args):
+    """Yields:
+        memoryview: the receive buffer, refilled for each of total_mb/recv_kb buffers
+    """
+    source = np.random.randint(-32768, 32767, args.recv_kb*1024//2, dtype=np.int16)
+    rxbuf = bytearray(source.nbytes)
+    rxview = memoryview(rxbuf)
+    for ii in range(args.total_mb*1024//args.recv_kb):
+        rxview[:] = source.view(np.uint8)
+        yield rxview
+
+
+def bench_host(args, root):
+    with open(os.path.join(root, "host.dat"), "wb") as fp:
+        for view in receive(args):
+            fp.write(view.obj[0:len(view)])
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def bench_multi(args, root):
+    for ii, view in enumerate(receive(args)):
+        with open(os.path.join(root, "{:06d}.dat".format(ii)), "wb") as fp:
+            np.frombuffer(view, dtype=np.int16).tofile(fp)
+    os.sync()
+
+
+def bench_writer(args, root, file_bytes=None, direct=False):
+    fname = os.path.join(root, "{:04d}.dat" if file_bytes else "writer.dat")
+    with disk_writer.DiskWriter(fname, file_bytes=file_bytes, direct=direct, fsync="file") as writer:
+        for view in receive(args):
+            writer.write(view)
+    return writer.stats()
+
+
+def run_main(args):
+    file_bytes = args.file_mb * 0x100000
+    cases = {
+        "host": lambda root: bench_host(args, root),
+        "multi": lambda root: bench_multi(args, root),
+        "writer": lambda root: bench_writer(args, root),
+        "rolling": lambda root: bench_writer(args, root, file_bytes),
+        "direct": lambda root: bench_writer(args, root, file_bytes, direct=True),
+    }
+    print("{} MB in {} kB buffers to {}".format(args.total_mb, args.recv_kb, args.dir))
+    for label in args.cases.split(','):
+        root = os.path.join(args.dir, label)
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root)
+        t0 = time.perf_counter()
+        stats = cases[label](root)
+        tt = time.perf_counter() - t0
+        nbytes = sum(os.path.getsize(fn) for fn in glob.glob(os.path.join(root, "*.dat")))
+        if nbytes != args.total_mb * 0x100000:
+            print("ERROR: {} wrote {} bytes expected {}".format(label, nbytes, args.total_mb * 0x100000))
+        print("{:>8} {:8.3f} s {:8.2f} MB/s {}".format(label, tt, args.total_mb/tt,
+              "block_waits {block_waits} writes {writes} files {files}".format(**stats) if stats else ""))
+        if not args.keep:
+            shutil.rmtree(root)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="stream to disk writer benchmark")
+    parser.add_argument('--dir', default="./disk_writer_benchmark", help="directory on the disk under test")
+    parser.add_argument('--total_mb', default=2048, type=int, help="data per case, MB")
+    parser.add_argument('--recv_kb', default=1024, type=int, help="receive buffer, kB")
+    parser.add_argument('--file_mb', default=256, type=int, help="rolling file size, MB")
+    parser.add_argument('--cases', default="host,multi,writer,rolling,direct", help="cases to run")
+    parser.add_argument('--keep', default=0, type=int, help="keep output files")
+    return parser
+
+
+if __name__ == '__main__':
+    run_main(get_parser().parse_args())
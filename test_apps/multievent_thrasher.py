@@ -33,6 +33,7 @@ import argparse
 import acq400_hapi
 import subprocess
 from acq400_hapi import PR
+from acq400_hapi import continuity
 
 args = None
 padding = {}
@@ -200,19 +201,8 @@ def check_event(current):
     del data_array
 
 def get_event_signatures(data_array):
-    events = []
     es = 0xaa55f151 #event signature
-    es = 0xaa55f151
-    max_unsigned_32 = 1 << 32
-
-    array_len = len(data_array)
-    for i in range(0, array_len):
-        num = data_array[i][1]
-        if num < 0:
-            num = max_unsigned_32 + num
-        if num == es:
-            events.append(i)
-    return events 
+    return np.flatnonzero(data_array[:, 1].view(np.uint32) == es).tolist()
 
 def check_event_signatures(events, current):
     if not events:
@@ -230,23 +220,22 @@ def check_event_signatures(events, current):
 
 def check_sample_order(data_array, latest):
     sc = 16
-    array_len = len(data_array)
-    previous = data_array[0][sc] - 1
-    for i in range(0, array_len):
+    know_errors = [-1956863,1956865]
+    report = continuity.ContinuityChecker().check_counts(data_array[:, sc])
+    if report.discontinuities:
+        i = int(report.positions[0])
+        diff = int(report.steps[0])
         current = data_array[i][sc]
-        diff = current - previous
-        know_errors = [-1956863,1956865]
-        if diff != 1:
-            if diff in know_errors:
-                log("Sample count rolled back?", PR.Cyan)
-                error("Known Error: {} Sample wrong Current is: {} Previous was: {} Diff is {}".format(i, current, previous, diff))
-                archive_error(latest)
-                return
+        previous = data_array[i-1][sc]
+        if diff in know_errors:
+            log("Sample count rolled back?", PR.Cyan)
+            error("Known Error: {} Sample wrong Current is: {} Previous was: {} Diff is {}".format(i, current, previous, diff))
+        else:
             error("Error: {} Sample wrong Current is: {} Previous was: {} Diff is {}".format(i, current, previous, diff))
-            archive_error(latest)
-            return
-        previous = current
-    log("{} samples in order".format(array_len), PR.Green)
+        log("{} discontinuities {} samples missed steps {}".format(report.discontinuities, report.missed, report.histogram))
+        archive_error(latest)
+        return
+    log("{} samples in order".format(len(data_array)), PR.Green)
 
 def get_filesize(filename):
     event_file = "{}/{}".format(args.data_path, filename)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""Benchmark Siteclient response parsing against a local stand-in site server
+
+Compares the legacy str accumulate + full rescan receive_message() with the
+bytes incremental framer in acq400_hapi.netclient.
+
+Usage:
+    ./test_apps/netclient_benchmark.py
+    ./test_apps/netclient_benchmark.py --reply_bytes=1000000 --queries=5
+"""
+
+import argparse
+import re
+import socket
+import threading
+import time
+from acq400_hapi import netclient
+
+
+PROMPT = "\nacq400.1 {} >"
+
+
+class LegacyNetclient(netclient.Netclient):
+    """receive_message() as it was: decode each chunk, append to str, rescan all"""
+    def __init__(self, addr, port):
+        netclient.Netclient.__init__(self, addr, port)
+        self.buffer = ""
+
+    def receive_message(self, termex, maxlen=4096):
+        match = termex.search(self.buffer)
+        while match == None:
+            self.buffer += self.sock.recv(maxlen).decode("latin-1")
+            match = termex.search(self.buffer)
+        rc = self.buffer[:match.start(1)]
+        self.buffer = self.buffer[match.end(1):]
+        return rc
+
+
+def serve(lsock, reply):
+    """answer every command line with reply and a prompt, like a site service"""
+    while True:
+        conn, addr = lsock.accept()
+        with conn:
+            rx = b""
+            seq = 0
+            while True:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                rx += chunk
+                while b"\n" in rx:
+                    line, rx = rx.split(b"\n", 1)
+                    seq += 1
+                    conn.sendall(reply + PROMPT.format(seq).encode())
+
+
+def bench(label, cls, port, queries, nbytes, termex):
+    nc = cls("127.0.0.1", port)
+    t0 = time.perf_counter()
+    for qq in range(queries):
+        nc.send("help\n")
+        rx = nc.receive_message(termex)
+        if len(rx.rstrip()) != nbytes:
+            print("ERROR: {} reply length {} expected {}".format(label, len(rx.rstrip()), nbytes))
+    tt = time.perf_counter() - t0
+    nc.close()
+    print("{:>8} {:8.3f} s {:8.2f} MB/s".format(label, tt, queries*nbytes/tt/1e6))
+    return tt
+
+
+def run_main(args):
+    reply = (b"AI_CAL_ESLO 1.234567e-04 " * (args.reply_bytes//25 + 1))[:args.reply_bytes]
+    lsock = socket.socket()
+    lsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    lsock.bind(("127.0.0.1", args.port))
+    lsock.listen(4)
+    port = lsock.getsockname()[1]
+    threading.Thread(target=serve, args=(lsock, reply), daemon=True).start()
+
+    termex = re.compile(r"\n(acq400.[0-9]+ ([0-9]+) >)")
+    print("reply {} bytes, {} queries".format(args.reply_bytes, args.queries))
+    t_old = bench("legacy", LegacyNetclient, port, args.queries, len(reply.rstrip()), termex)
+    t_new = bench("framer", netclient.Netclient, port, args.queries, len(reply.rstrip()), termex)
+    print("speedup {:.1f}x".format(t_old/t_new))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='netclient receive benchmark')
+    parser.add_argument('--reply_bytes', type=int, default=500000, help="reply size")
+    parser.add_argument('--queries', type=int, default=10, help="number of queries")
+    parser.add_argument('--port', type=int, default=0, help="local server port, 0: any")
+    return parser
+
+if __name__ == '__main__':
+    run_main(get_parser().parse_args())
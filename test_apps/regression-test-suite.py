@@ -121,7 +121,7 @@ def config_gpg(uut, args, trg=1):
     else:
         stl = create_rtm_stl()
     try:
-        uut.load_gpg(stl)
+        uut.load_gpg(stl, skip_unchanged=True)
     except Exception:
         print("Load GPG has failed. If you want to use the GPG please make sure")
         print("that the GPG package has been enabled.")
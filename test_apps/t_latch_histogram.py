@@ -19,8 +19,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from os.path import expanduser
 import os
-import threading
-import concurrent.futures
+from acq400_hapi import continuity
 
 
 def plot_histogram(histo, args):
@@ -34,31 +33,10 @@ def plot_histogram(histo, args):
 
 
 def collect_dtimes(t_latch):
-    histo = {1: 0, 2: 0, 3: 0}
-    ideal = np.arange(t_latch[0], t_latch.shape[-1]+t_latch[0])
-    if np.array_equal(t_latch, ideal):
-        histo[1] += len(t_latch)
-    else:
-        pos = 0
-        while True:
-            t_latch_test = np.subtract(ideal, t_latch)
-            first_nonzero = (t_latch_test != 0).argmax(axis=0)
-            if first_nonzero == 0:
-                break
-            pos = first_nonzero + 1
-            diff = t_latch[first_nonzero] - ideal[first_nonzero]
-            if diff in histo:
-                histo[diff] += 1
-            else:
-                histo[diff] = 1
-
-            t_latch = t_latch[pos:]
-            ideal = np.arange(t_latch[0], t_latch.shape[-1]+t_latch[0])
-
-            if t_latch.shape[-1] == 0:
-                break
-
-    return histo
+    """Returns:
+        dict: {T_LATCH difference: occurrences}, one vectorized pass
+    """
+    return continuity.ContinuityChecker().check_counts(t_latch).histogram
 
 
 def collect_tlatch(args):
@@ -75,20 +53,13 @@ def collect_tlatch(args):
 
 def run_analysis(args):
     tlatch = collect_tlatch(args)
-    t_latch_split = np.array_split(tlatch, 8)
-    histo = {}
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        results = executor.map(collect_dtimes, t_latch_split)
-        for result in results:
-            for key in result:
-                if key in histo:
-                    histo[key] += result[key]
-                else:
-                    histo[key] = result[key]
+    histo = dict(sorted(collect_dtimes(tlatch).items()))
 
     for key in histo:
         print("T_LATCH differences: ", key,
               ", happened: ", histo[key], " times")
+    if not args.ones:
+        histo.pop(1, None)
     plot_histogram(histo, args)
     return None
 
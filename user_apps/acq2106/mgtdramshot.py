@@ -162,6 +162,9 @@ def host_pull(args, uut, shot):
     if not os.path.isdir(rootdir):
         os.makedirs(rootdir)
 
+    if args.save_data == 2:
+        df = acq400_hapi.DirfileWriter(os.path.join(rootdir, f"{0 if args.overwrite else shot:04d}"), uut=uut_name)
+
     print("Starting host pull {} bytes now data size {}".format(nbytes, _data_size))
 
     for buffer in rc.get_blocks(nbytes, data_size=_data_size):
@@ -176,6 +179,11 @@ def host_pull(args, uut, shot):
             fn = os.path.join(rootdir, f"{shot:04d}.dat")
             buffer.tofile(fn)
             print(f"Data saved to {fn}")
+        elif args.save_data == 2:
+            if bn == 0:
+                for ch in range(1, nchan+1):
+                    df.add_field(f"{uut_name}_CH{ch:02d}", buffer.dtype)
+            df.append_muxed(buffer, nchan)
         else:
             print("Block {} pulled, size bytes : {}.".format(bn, buffer.size))
 
@@ -194,6 +202,9 @@ def host_pull(args, uut, shot):
 
 
     rc.sock.close()
+    if args.save_data == 2:
+        df.close()
+        print(f"Data saved to dirfile {df.root}")
     logprint("Data offloaded {} blocks {}".format(
         bn, "" if args.validate == 'no' else "and all data validation passed."))
     return nread
@@ -420,7 +431,7 @@ def get_parser():
     parser.add_argument('--wait_shot', type=int, default=0,
                         help="1: wait for some external agent to run the shot, then offload all")
     parser.add_argument('--save_data', type=int, default=1,
-                        help='Whether or not to save data to a file in 4MB chunks. Default: 1')
+                        help='Whether or not to save data to a file in 4MB chunks, 2: demux to per channel dirfile as blocks arrive. Default: 1')
     parser.add_argument('--shot', type=int, default=None, help="set a shot number")
     parser.add_argument('--twa', type=int, default=None, help="trigger_when_armed")
     parser.add_argument('--overwrite', type=int, default=0, help="0: new file per shot 1: same file per shot")
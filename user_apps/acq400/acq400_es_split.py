@@ -1,21 +1,14 @@
 #!/usr/bin/env python
 
 import acq400_hapi
+from acq400_hapi import es_index, es_split
 import numpy as np
 import os
 import argparse
 
 
 def check_if_es(data):
-    es_match = np.uint32(0xaa55f150)
-    np_data = np.frombuffer(data, dtype=np.uint32)
-    for es in np_data[0:4]:
-        if es_match == np.bitwise_and(es, es_match):
-
-            continue
-        else:
-            return False
-    return True
+    return es_index.is_es(data)
 
 
 def get_parser():
@@ -26,6 +19,8 @@ def get_parser():
                         help='Sample size bytes. Default=-1 (autodetect). Any other number is override.')
     parser.add_argument('--out_dir', default="./split_files", type=str,
                         help='Directory where split files will be written. Default: ./split_files')
+    parser.add_argument('--stream', default=0, type=int,
+                        help='1: split live stream from uut, until interrupted. Default=0 split --file')
     parser.add_argument('uuts', nargs='+', help="uut[s]")
     return parser
 
@@ -40,31 +35,19 @@ def make_data_dir(directory, verbose):
 
 
 def split_on_es(file, ssb, out_dir):
-    data = [0]
-    new_file_flag = True
-    data_file = None
-    file_num = 0
     make_data_dir(out_dir, 0)
-    loop = 0
-
-    with open(file, 'rb') as fp:
-        while len(data) != 0:
-            data = fp.read(ssb)
-            if len(data) == 0:
-                continue
-            new_file_flag = check_if_es(data)
-
-            if new_file_flag and loop != 0:
-                file_num += 1
-                data_file.close()
-                data_file = None
-                new_file_flag = False
+    nfiles = es_split.split_file(file, ssb, out_dir)
+    print("split {} into {} files in {}".format(file, nfiles, out_dir))
 
-            if data_file == None:
-                data_file = open("{}/{:04d}".format(out_dir, file_num), "wb")
 
-            data_file.write(data)
-            loop += 1
+def split_stream(uut, ssb, out_dir):
+    uut = acq400_hapi.factory(uut)
+    make_data_dir(out_dir, 0)
+    try:
+        nfiles = es_split.split_stream(uut.stream(data_size=4), ssb, out_dir)
+    except KeyboardInterrupt:
+        nfiles = "interrupted,"
+    print("stream split into {} files in {}".format(nfiles, out_dir))
 
 
 def get_ssb(uut, ssb):
@@ -76,7 +59,10 @@ def get_ssb(uut, ssb):
 
 def main(args):
     ssb = get_ssb(args.uuts[0], args.ssb)
-    split_on_es(args.file, ssb, args.out_dir)
+    if args.stream:
+        split_stream(args.uuts[0], ssb, args.out_dir)
+    else:
+        split_on_es(args.file, ssb, args.out_dir)
     return None
 
 
@@ -68,17 +68,6 @@ def timing(f):
     return wrap
 
 
-def file_extender(fd, ext_count):
-    buf = fd.read()
-    buf0 = buf
-
-    while ext_count > 1:
-        buf += buf0
-        ext_count -= 1
-        
-    return buf
-        
-
 @timing
 def load_awg(args, uut, file):
     acq400_hapi.Acq400UI.exec_args(uut, args)
@@ -87,9 +76,9 @@ def load_awg(args, uut, file):
  
     while loaded != 1:
         try:
-            with open(file, "rb") as fd:
-                uut.load_awg(file_extender(fd, args.awg_extend), autorearm=args.mode==2, port=args.port)
-                loaded = 1
+            # awg_extend: repeat the file, sent from the page cache each time
+            uut.load_awg(file, repeats=max(args.awg_extend, 1), autorearm=args.mode==2, port=args.port)
+            loaded = 1
         except Exception as e:
             if loaded == 0:
                 print("First time: caught {}, abort and retry".format(e))
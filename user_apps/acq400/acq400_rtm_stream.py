@@ -80,8 +80,8 @@ def main(args):
 
     #configure_uut(args, uut)
     create_data_dir(args)
-    #uut.stream(FileSink(args))
-    uut.stream(FileSinkFun(args))
+    #uut.stream(sink=FileSink(args))
+    print(uut.stream(sink=FileSinkFun(args)))
 
     return None
 
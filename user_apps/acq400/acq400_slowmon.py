@@ -73,44 +73,37 @@ import time
 import argparse
 import sys
 import shutil
+import functools
 
 
+@functools.lru_cache(maxsize=None)
+def row_format(n, dfmt):
+    return "[ " + ", ".join([dfmt]*n) + " ]"
+
 def str_hex(xarr):
     uview = xarr.view(dtype=(np.uint16 if xarr.dtype == np.int16 else np.uint32))
     dfmt = ("{:04x}"  if xarr.dtype == np.int16 else "{:08x}")
-    dfmte = dfmt + " ]"
-    dfmt = dfmt + ", "
-    #print("dtype: {} dfmt {}".format(xarr.dtype, dmft))
-    txt = "[ "
-    for xx in uview[:-1]:
-        txt += dfmt.format(xx)
-        
-    return txt + dfmte.format(uview[-1])
+    return row_format(len(uview), dfmt).format(*uview.tolist())
 
 def str_dec(xarr):    
     dfmt = ("{:06d}"  if xarr.dtype == np.int16 else "{:10d}")
-    dfmte = dfmt + " ]"
-    dfmt = dfmt + ", "
-    #print("dtype: {} dfmt {}".format(xarr.dtype, dmft))
-    txt = "[ "
-    for xx in xarr[:-1]:
-        txt += dfmt.format(xx)
-    
-    return txt + dfmte.format(xarr[-1])
+    return row_format(len(xarr), dfmt).format(*xarr.tolist())
 
-def to_egu(uut, xarr):
-    egu = [ "{:.5e}".format(uut.chan2volts(ix+1, xx)) for ix, xx in enumerate(xarr)]
-    return ",".join(egu)
+def to_egu(volts):
+    return ",".join("{:.5e}".format(vv) for vv in volts.tolist())
 
 def run_stream(args, uut):
+    cal = uut.get_calibration() if args.egu == 1 else None
+    sink = None
     if args.save_file:
         fn = args.save_file.format(args.uuts[0])
-        csv_file = fn.endswith(".csv")
-        data_file = open(fn, "w" if csv_file else "wb" )
-    else:
-        csv_file = 0
-        
+        if fn.endswith(".csv"):
+            sink = acq400_hapi.slowmon.CsvSink(fn, args.pchan, cal)
+        else:
+            sink = acq400_hapi.slowmon.BinarySink(fn)
+
     t_run = 0
+    row = 0
     
     _nspad = 4 if uut.s0.slowmon_hw == '1' else None
         
@@ -119,38 +112,38 @@ def run_stream(args, uut):
             print("WARNING: slowmon with no hardware assist, slowmon_fs not the absolute rate and actual rate should be tested for each combination")           
         uut.s0.SLOWMON_FS = args.slowmon_fs
 
-    for row, (chx, spx) in enumerate(uut.stream_slowmon(nspad=_nspad)):
+    reader = uut.slowmon_reader(nspad=_nspad)
+    for records in reader.batches():
         if row == 0:
             t0 = time.time()
         else:
             t_run = time.time() - t0
-        #print("{} len {},{} type {},{} shape {},{}\n{} {}".format(row, len(chx), len(spx), chx.dtype, spx.dtype, chx.shape, spx.shape, chx, spx))
-        if args.egu == 1:
-            txt_row = ("{}, {}".format(row, to_egu(uut, chx[:args.pchan])))
-        elif args.show_raw or csv_file:
-            if args.show_raw == 'd':
-                txt_row = ("{} {} {}".format(row, str_dec(chx[:args.pchan]), str_dec(spx)))
-            else:
-                txt_row = ("{} {} {}".format(row, str_hex(chx[:args.pchan]), str_hex(spx)))
-        else:
-            if args.show >= 1:
-                txt_row = "t_run {}/{}s sample: {}".format(int(t_run), args.runtime, row)
-            else:
-                txt_row = "{}".format(row)
-            
+        chx = records['chx'][:, :args.pchan]
+        spx = records['spx']
+
+        if sink:
+            sink.write(records)
+
         if args.show >= 1:
-            print(txt_row)
-            
-        if args.save_file:
-            if csv_file:
-                data_file.write(txt_row+"\n")
+            if args.egu == 1:
+                volts = cal.volts(chx, axis=-1)
+                txt_rows = [ "{}, {}".format(row+ii, to_egu(vv)) for ii, vv in enumerate(volts) ]
+            elif args.show_raw:
+                to_str = str_dec if args.show_raw == 'd' else str_hex
+                txt_rows = [ "{} {} {}".format(row+ii, to_str(cc), to_str(ss)) for ii, (cc, ss) in enumerate(zip(chx, spx)) ]
             else:
-                chx.tofile(data_file)
-                spx.tofile(data_file)
-            
+                txt_rows = [ "t_run {}/{}s sample: {}".format(int(t_run), args.runtime, row+len(chx)-1) ]
+            print("\n".join(txt_rows))
+
+        row += len(chx)
         if t_run >= args.runtime:
-            print("Time up captured {} samples in {} seconds. Approx SLOWMON_FS {} Hz". format(row, args.runtime, row//args.runtime))
-            return
+            break
+
+    if sink:
+        sink.close()
+    stats = reader.stats()
+    print("Time up captured {} samples in {} seconds. Approx SLOWMON_FS {} Hz gaps {}". format(
+            row, args.runtime, row//max(args.runtime, 1), stats["gaps"]))
 
     
 def run_main(args):
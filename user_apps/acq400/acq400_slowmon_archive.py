@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""archive slowmon from many uuts for hours or days, query the archive
+
+Usage:
+    # archive two uuts, one hour chunks, keep the last 48 chunks per uut
+    ./user_apps/acq400/acq400_slowmon_archive.py --root=slowmon_data --max_chunks=48 acq2106_001 acq2106_002
+
+    # plot CH1,CH2 volts for the last 10 minutes from the archive
+    ./user_apps/acq400/acq400_slowmon_archive.py --root=slowmon_data --query=1,2 --last=600 acq2106_001
+"""
+
+import argparse
+import time
+from acq400_hapi import slowmon_archive
+
+
+def list_of_channels(arg):
+    channels = []
+    for chan in arg.split(','):
+        if '-' in chan:
+            chan = list(map(int, chan.split('-')))
+            channels.extend(list(range(chan[0], chan[1] + 1)))
+            continue
+        channels.append(int(chan))
+    return channels
+
+def run_query(args):
+    from matplotlib import pyplot as plt
+    t1 = time.time()
+    t0 = t1 - args.last if args.last else None
+    for uut in args.uuts:
+        ar = slowmon_archive.ArchiveReader(args.root, uut)
+        for ch in args.query:
+            tt, yy = ar.read(ch, t0, None, volts=args.egu == 1)
+            print("{} CH{:02d} {} samples".format(uut, ch, len(tt)))
+            plt.plot(tt - tt[0] if len(tt) else tt, yy, label="{} CH{:02d}".format(uut, ch))
+    plt.xlabel("Time (s)")
+    plt.ylabel("Volts (V)" if args.egu == 1 else "raw")
+    plt.legend()
+    plt.show()
+
+def run_main(args):
+    if args.query:
+        run_query(args)
+        return
+    stats = slowmon_archive.run(args.uuts, args.root, args.runtime if args.runtime > 0 else None,
+                                chunk_seconds=args.chunk_seconds, max_chunks=args.max_chunks, report=args.report)
+    for st in stats or []:
+        print(st)
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='archive slowmon from many uuts, query the archive')
+    parser.add_argument('--root', default="slowmon_data", help="archive directory")
+    parser.add_argument('--runtime', default=0, type=int, help="seconds to run, 0: until interrupted")
+    parser.add_argument('--chunk_seconds', default=None, type=int, help="seconds per chunk file [default=3600]")
+    parser.add_argument('--max_chunks', default=0, type=int, help="chunks kept per uut, 0: keep all")
+    parser.add_argument('--report', default=60, type=int, help="seconds between progress reports, 0: quiet")
+    parser.add_argument('--query', default=None, type=list_of_channels, help="plot channels from the archive eg 1,2,3-5")
+    parser.add_argument('--last', default=0, type=int, help="query the last N seconds, 0: all")
+    parser.add_argument('--egu', default=1, type=int, help="query in volts (1) or raw (0)")
+    parser.add_argument('uuts', nargs='+', help="uut hostnames")
+    return parser
+
+if __name__ == '__main__':
+    run_main(get_parser().parse_args())
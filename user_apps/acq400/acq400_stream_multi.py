@@ -65,6 +65,7 @@ import sys
 import signal
 import shutil
 from acq400_hapi.acq400_print import DISPLAY
+from acq400_hapi import disk_writer
 
 import multiprocessing as MP
 import threading
@@ -138,6 +139,7 @@ class StreamsOne:
         self.delay = delay
         self.status = self.pipe_conn(pipe)
         self.previous = None
+        self.data_writer = None
         self.log_file = os.path.join(args.root, f"{uut_name}_times.log")
         open(self.log_file, 'w').close()
 
@@ -155,7 +157,22 @@ class StreamsOne:
             self.status.send()
             time.sleep(1)
 
+    def file_name(self, index):
+        """cycle directory per files_per_cycle files, or one combined file per cycle"""
+        if self.args.combine:
+            cycle, fnum = index, 0
+        else:
+            cycle, fnum = divmod(index, self.args.files_per_cycle)
+        root = os.path.join(self.args.root, self.uut_name, "{:06d}".format(cycle))
+        if fnum == 0:
+            make_data_dir(root, self.args.verbose)
+        if self.args.combine:
+            return os.path.join(root, f"{0:04d}-{self.args.files_per_cycle:04d}.dat")
+        return os.path.join(root, f"{fnum:04d}.dat")
+
     def stop_proccess(self, reason):
+        if self.data_writer:
+            self.data_writer.close()
         self.status.set('stopped', True)
         self.uut.stream_close()
         self.halt.wait()
@@ -166,10 +183,9 @@ class StreamsOne:
         self.uut = acq400_hapi.factory(self.uut_name)
         threading.Thread(target=self.update_status_forever, daemon=True).start()
         time.sleep(self.delay)
-        cycle = -1
-        fnum = 999       # force initial directory create
         data_bytes = 0
         files = 0
+        flush_files = False
 
         signal.signal(signal.SIGINT, signal.SIG_IGN)
 
@@ -187,6 +203,7 @@ class StreamsOne:
             self.args.filesamples = bod_len
             if self.args.trigger_from_here != 0:
                 callback = self_burst_trigger_callback(self.uut, bod_job)
+                flush_files = True
                 self.thread = threading.Thread(target=self_start_trigger_callback(self.uut))
                 self.thread.daemon = True
                 self.thread.start()
@@ -219,7 +236,11 @@ class StreamsOne:
 
         t_run = 0
         fn = "no-file"
-        data_file = None
+
+        if not self.args.nowrite:
+            file_bytes = self.args.filesize * (self.args.files_per_cycle if self.args.combine else 1)
+            self.data_writer = disk_writer.DiskWriter(self.file_name, file_bytes=file_bytes,
+                                                      direct=self.args.direct, fsync=self.args.fsync)
 
         for buf in self.uut.stream(recvlen=blen, data_size=data_size):
 
@@ -242,28 +263,12 @@ class StreamsOne:
             self.status.set('rate', f"{data_bytes / t_run / 0x100000  if t_run else 0:.2f}MB/s")
             self.status.set('files', f"{files}")
 
-            if not self.args.nowrite:
-                if fnum >= self.args.files_per_cycle:
-                    fnum = 0
-                    cycle += 1
-                    if data_file:
-                        data_file.close()
-                        data_file = None
-                    root = os.path.join(self.args.root, self.uut_name, "{:06d}".format(cycle))
-                    make_data_dir(root, self.args.verbose)
-                
-                if not self.args.combine:
-                    fn = os.path.join(root, f"{fnum:04d}.dat")
-                    with open(fn, 'wb') as data_file:
-                        buf.tofile(data_file)
-                    data_file = None
-                    files += 1
-                else:
-                    if not data_file:
-                        fn = os.path.join(root, f"{0:04d}-{self.args.files_per_cycle:04d}.dat")
-                        data_file = open(fn, "wb")
-                        files += 1
-                    buf.tofile(data_file)
+            if self.data_writer:
+                self.data_writer.write(buf)
+                fn = self.data_writer.last_file
+                files = self.data_writer.file_index + 1
+                if flush_files:
+                    self.data_writer.flush()
 
             if self.args.verbose == 0:
                 pass
@@ -273,7 +278,6 @@ class StreamsOne:
                 if t_run > 0:
                     print("{:8.3f} {} files {:4d} total bytes: {:10d} data bytes: {} rate: {:.2f} MB/s".
                             format(t_run, fn, files, int(data_bytes), int(data_bytes), data_bytes/t_run/0x100000))
-            fnum += 1
 
             if callback(fn) or t_run >= self.args.runtime or data_bytes > self.args.totaldata:
                 break
@@ -372,6 +376,8 @@ def get_parser(parser=None):
     parser.add_argument('--verbose', default=0, type=int, help='Prints status messages as the stream is running')
     parser.add_argument('--display', default=1, type=int, help='Render display')
     parser.add_argument('--combine', default=0, type=int, help='Combine all cycle files into one')
+    parser.add_argument('--direct', default=0, type=int, help='write with O_DIRECT, bypass page cache')
+    parser.add_argument('--fsync', default=disk_writer.WRITER_FSYNC, choices=('none', 'file', 'batch'), help='fsync policy')
     if is_client:
         parser.add_argument('uuts', nargs='+', help="uuts")
     return parser
@@ -107,11 +107,15 @@ def channel_required(args, ch):
 
 def create_npdata(args, nblk, nchn):
     channels = []
+    required = [ ch for ch in range(nchn) if channel_required(args, ch) ]
+    args.chdata = np.zeros((len(required), int(nblk)*args.NSAM), dtype=args.np_data_type)
+    args.required = required
 
+    row = 0
     for counter in range(nchn):
        if channel_required(args, counter):
-           channels.append(np.zeros((int(nblk)*args.NSAM), dtype=args.np_data_type))
-
+           channels.append(args.chdata[row])
+           row += 1
        else:
            channels.append(np.zeros(16, dtype=args.np_data_type))
     # print "length of data = ", len(total_data)
@@ -177,7 +181,7 @@ def read_data(args, NCHAN):
 
 
     if args.NSAM == 0:
-        args.NSAM = GROUP*os.path.getsize(data_files[0])/args.WSIZE/NCHAN
+        args.NSAM = GROUP*os.path.getsize(data_files[0])//args.WSIZE//NCHAN
         print("NSAM set {}".format(args.NSAM))
 
     NBLK = len(data_files)
@@ -191,6 +195,7 @@ def read_data(args, NCHAN):
     blocks = 0
     i0 = 0
     iblock = 0
+    group = []
     for blknum, blkfile in enumerate(data_files):
         if blocks >= NBLK:
             break
@@ -198,25 +203,19 @@ def read_data(args, NCHAN):
 
             print(blkfile, blknum)
             # concatenate 3 blocks to ensure modulo 3 channel align
-            if iblock == 0:
-                data = np.fromfile(blkfile, dtype=args.np_data_type)
-            else:
-                data = np.append(data, np.fromfile(blkfile, dtype=args.np_data_type))
-
-
+            group.append(np.fromfile(blkfile, dtype=args.np_data_type))
 
             iblock += 1
             if iblock < GROUP:
                 continue
 
+            data = group[0] if GROUP == 1 else np.concatenate(group)
             i1 = i0 + args.NSAM
-            for ch in range(NCHAN):
-                if channel_required(args, ch):
-                    raw_channels[ch][i0:i1] = (data[ch::NCHAN])
-                # print x
+            acq400_hapi.demux(data, NCHAN, channels=args.required, out=args.chdata[:, i0:i1])
             i0 = i1
             blocks += 1
             iblock = 0
+            group = []
 
     print("length of data = ", len(raw_channels))
     print("length of data[0] = ", len(raw_channels[0]))
@@ -378,8 +377,8 @@ def plot_data_kst(args, raw_channels):
         yu1 = yu
         if args.egu:
             try:
-            # chan2volts ch index from 1:
-                channel = args.the_uut.chan2volts(ch1, channel)
+            # calibration ch index from 1, fetched once per shot:
+                channel = args.the_uut.get_calibration().volts(channel, ch1)
             except IndexError:
                 yu1 = 'code'
                 print("ERROR: no calibration for CH{:02d}".format(ch1))
@@ -26,6 +26,8 @@ Windows::
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+import acq400_hapi
+from acq400_hapi import es_index
 
 
 
@@ -84,21 +86,20 @@ def find_zero_index(args):
     
     hits = 0
 
-    for pos, lvnu in enumerate(args.data32):
-        if isES(args.data32[pos:pos+ESL]):
-            print("DEBUG ES found at {}".format(pos))
-            hits += 1
-            
-            # Check current index
-            if hits == 1:
-                if pos == 0:
-                    first_es_position = pos
-                    break            # ES at zero good.
-                else:
-                    pass             # first hit not zero .. bad
-            else:            # ES comes in pairs, skip #2 as well
+    for pos in find_all_isES(args.data32):
+        print("DEBUG ES found at {}".format(pos))
+        hits += 1
+        
+        # Check current index
+        if hits == 1:
+            if pos == 0:
                 first_es_position = pos
-                break
+                break            # ES at zero good.
+            else:
+                pass             # first hit not zero .. bad
+        else:            # ES comes in pairs, skip #2 as well
+            first_es_position = pos
+            break
 
     print("DEBUG: hits: {} first_es_position {}".format(hits, first_es_position))
     # loop over all the event samples. Look at the "index" value before and
@@ -107,55 +108,44 @@ def find_zero_index(args):
     
     # normalise to first_es_pos
     normal32 = args.data32[first_es_position:]
-    for pos, lvnu in enumerate(normal32):        
-        if pos > 0 and pos % next_es == 0:
-            if not isES(normal32[pos:pos+ESL]):
-                print("ERROR: expected ES at {}".format(pos))
-                exit(1)
-            print("DEBUG: counter {} samples {}".format(pos, pos//LPS))            
-            if args.isNewIndex(normal32[pos - PREV_INDEX], normal32[pos + NEXT_INDEX]):
-                return pos+first_es_position    # relative to original data..
+    for pos in range(next_es, len(normal32), next_es):
+        if not isES(normal32[pos:pos+ESL]):
+            print("ERROR: expected ES at {}".format(pos))
+            exit(1)
+        print("DEBUG: counter {} samples {}".format(pos, pos//LPS))            
+        if args.isNewIndex(normal32[pos - PREV_INDEX], normal32[pos + NEXT_INDEX]):
+            return pos+first_es_position    # relative to original data..
 
     print("ERROR: we do not want to be here")
     exit(1)
 
+def find_all_isES(data32):
+    # isES() at every word position, vectorized: a signature with another one LPS later
+    sig = es_index.find_es(data32)
+    return sig[np.isin(sig + LPS, sig)]
+
 def find_all_es(args):
-    hits = 0
     pos0 = 0
 
-    for pos, lvnu in enumerate(args.data32):
-        if isES(args.data32[pos:pos+ESL]):
-            hits += 1
-            print("ES#{:4d}: {:6d} {:8.1f}  len:{:6.1f}".format(hits, pos, pos/LPS, (pos-pos0)/LPS))
-            pos0 = pos 
+    for hits, pos in enumerate(find_all_isES(args.data32), 1):
+        print("ES#{:4d}: {:6d} {:8.1f}  len:{:6.1f}".format(hits, pos, pos/LPS, (pos-pos0)/LPS))
+        pos0 = pos 
 
 def extract_bursts(args):
     burst32 = args.transient_length*LPS
     burst16 = args.transient_length*SPS
     burst_es = args.transient_length*LPS + ESL
-    data = []
+    ai16 = []
+    cx32 = []
 
     print("extract_bursts() {}, {}, {}".format(args.zero_index+ESL, len(args.data32), burst_es))
-    first_time = True
-    for bxx in range(args.zero_index+ESL, len(args.data32), burst_es):        
-        b32 = bxx + 2       # skip AI
+    for bxx in range(args.zero_index+ESL, len(args.data32), burst_es):
         b16 = bxx * 2       # scale to data16
-        if first_time:
-            for ic in range(0, 4):
-                data.append(args.data16[b16:b16+burst16:SPS])
-                b16 += 1
-            for ic in range(0, 4):
-                data.append(args.data32[b32:b32+burst32:LPS])
-                b32 +=1
-            #print(data)
-            first_time = False
-        else:
-            for ic in range(0, 4):
-                data[ic] = np.concatenate((data[ic], args.data16[b16:b16+burst16:SPS]))
-                b16 += 1
-            for ic in range(0, 4):
-                data[ic+4] = np.concatenate((data[ic+4], args.data32[b32:b32+burst32:LPS]))
-                b32 +=1
+        ai16.append(acq400_hapi.demux(args.data16[b16:b16+burst16], SPS, channels=range(0, 4)))
+        cx32.append(acq400_hapi.demux(args.data32[bxx:bxx+burst32], LPS, channels=range(IX_FACET, LPS)))
+
+    # one concatenate per channel set, not one per burst
+    data = list(np.concatenate(ai16, axis=1)) + list(np.concatenate(cx32, axis=1))
     
     if args.msb_direct:
         tmp = np.bitwise_and(data[CH_FACET], 0x80000000)
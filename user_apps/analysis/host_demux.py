@@ -37,6 +37,9 @@ example usage::
     # plot data from LLC, 128 channels, show one "channel" from each site.
     # 97 was actually the LSB of TLATCH.
 
+    ./host_demux.py --nchan=96 --src=/data/ACQ400DATA/1 --save=DATA --jobs=8 --pchan=none acq2106_061
+    # long stream: demux cycles in 8 processes, append per channel files as groups complete
+
 .. rst-class:: hidden
     usage::
 
@@ -117,11 +120,16 @@ def channel_required(args, ch):
 
 def create_npdata(args, nblk, nchn):
     channels = []
+    required = [ ch for ch in range(nchn) if channel_required(args, ch) ]
+    # one 2D block for all required channels, so demux() can write a whole group at once
+    args.chdata = np.zeros((len(required), int(nblk)*args.NSAM), dtype=args.np_data_type)
+    args.required = required
 
+    row = 0
     for counter in range(nchn):
         if channel_required(args, counter):
-            channels.append(np.zeros((int(nblk)*args.NSAM), dtype=args.np_data_type))
-
+            channels.append(args.chdata[row])
+            row += 1
         else:
             channels.append(np.zeros(16, dtype=args.np_data_type))
     # print "length of data = ", len(total_data)
@@ -202,6 +210,7 @@ def read_data(args, NCHAN):
     blocks = 0
     i0 = 0
     iblock = 0
+    group = []
     for blknum, blkfile in enumerate(data_files):
         if blocks >= NBLK:
             break
@@ -212,25 +221,19 @@ def read_data(args, NCHAN):
 
 #            print("iblock={} blkfile={}, blknum={}".format(iblock, blkfile, blknum))
             # concatenate 3 blocks to ensure modulo 3 channel align
-            if iblock == 0:
-                data = np.fromfile(blkfile, dtype=args.np_data_type)
-            else:
-                data = np.append(data, np.fromfile(blkfile, dtype=args.np_data_type))
-
-            print(f"hello data {len(data)}")
+            group.append(np.fromfile(blkfile, dtype=args.np_data_type))
 
             iblock += 1
             if iblock < GROUP:
                 continue
 
+            data = group[0] if GROUP == 1 else np.concatenate(group)
             i1 = i0 + args.NSAM
-            for ch in range(NCHAN):
-                if channel_required(args, ch):
-                    raw_channels[ch][i0:i1] = (data[ch::NCHAN])
-                # print x
+            acq400_hapi.demux(data, NCHAN, channels=args.required, out=args.chdata[:, i0:i1])
             i0 = i1
             blocks += 1
             iblock = 0
+            group = []
     args.src = "{}..{}".format(args.src, os.path.basename(blkfile))
 
     print("length of data = ", len(raw_channels))
@@ -238,6 +241,69 @@ def read_data(args, NCHAN):
     print("length of data[1] = ", len(raw_channels[1]))
     return raw_channels
 
+def demux_group(job):
+    """pipeline worker: read one group of files, return demuxed [channel][sample] for required channels"""
+    files, np_data_type, nchan, required = job
+    data = np.concatenate([ np.fromfile(f, dtype=np_data_type) for f in files ])
+    return acq400_hapi.demux(data, nchan, channels=required)
+
+def get_output_map(args, NCHAN):
+    """list of (output ch1, source ch0) to save, after optional embedded channel mapping"""
+    cmap = list(range(NCHAN))
+    if args.cmap:
+        try:
+            cmap = [ int(ch0) for ch0 in args.the_uut.s0.channel_mapping.split(',') ]
+        except:
+            print("WARNING: channel_mapping request failed (old firmware?), use 1:1")
+    return [ (ch0+1, src) for ch0, src in enumerate(cmap) if not args.schan or ch0+1 in args.schan ]
+
+def demux_pipelined(args, NCHAN):
+    """reader/demux in a process pool, ordered writer appends to per channel files.
+
+    Memory is bounded to 2 groups in flight per worker, groups of 3 files keep modulo 3 channel alignment.
+    """
+    import multiprocessing
+    from collections import deque
+
+    data_files = get_file_names(args)
+    GROUP = 3 if NCHAN % 3 == 0 else 1
+    if args.nblks > 0:
+        data_files = data_files[:args.nblks]
+    groups = [ data_files[ii:ii+GROUP] for ii in range(0, len(data_files) - len(data_files)%GROUP, GROUP) ]
+    args.src = "{}..{}".format(data_files[0], os.path.basename(data_files[-1]))
+
+    outputs = get_output_map(args, NCHAN)
+    required = sorted(set(src for ch1, src in outputs))
+    row = { src: ix for ix, src in enumerate(required) }
+
+    make_saveroot(args)
+    fields = [ "{}_{:02d}.dat".format(args.uut, ch1) for ch1, src in outputs ]
+    df = acq400_hapi.DirfileWriter(args.saveroot, fields, dtype=args.np_data_type, uut=args.uut)
+    rows = [ row[src] for ch1, src in outputs ]
+    print("demux_pipelined {} groups of {} files, {} processes".format(len(groups), GROUP, args.jobs))
+
+    t0 = time.time()
+    nbytes = 0
+    inflight = deque()
+    with multiprocessing.Pool(args.jobs) as pool:
+        for files in groups:
+            inflight.append(pool.apply_async(demux_group, ((files, args.np_data_type, NCHAN, required),)))
+            if len(inflight) < 2*args.jobs:
+                continue
+            nbytes += write_group(df, rows, inflight.popleft().get())
+        while inflight:
+            nbytes += write_group(df, rows, inflight.popleft().get())
+
+    df.close()
+    tt = time.time() - t0
+    print("data saved to directory: {} {:.1f} MB in {:.1f} s {:.1f} MB/s".format(
+                    args.saveroot, nbytes/1e6, tt, nbytes/1e6/tt if tt > 0 else 0))
+
+def write_group(df, rows, chx):
+    """append one demuxed group, readers may tail the dirfile meanwhile"""
+    df.append(chx[rows])
+    return chx.nbytes
+
 def read_data_file(args, NCHAN):
     # NCHAN = args.nchan
     data = np.fromfile(args.src, dtype=args.np_data_type)
@@ -251,19 +317,16 @@ def read_data_file(args, NCHAN):
 
 def save_dirfile(args, raw_channels):
     uutname = args.uut
+    df = acq400_hapi.DirfileWriter(args.saveroot, uut=uutname)
     for ch0, channel in enumerate(raw_channels):
         ch1 = ch0+1
         if args.schan:
             if ch1 not in args.schan:
                 continue
-        data_file = open("{}/{}_{:02d}.dat".format(args.saveroot, uutname, ch1), "wb+")
-        channel.tofile(data_file, '')
+        df.write_field("{}_{:02d}.dat".format(uutname, ch1), channel)
+    df.close()
 
     print("data saved to directory: {}".format(args.saveroot))
-    with open("{}/format".format(args.saveroot), 'w') as fmt:
-        fmt.write("# dirfile format file for {}\n".format(uutname))
-        for enum, channel in enumerate(raw_channels):
-            fmt.write("{}_{:02d}.dat RAW s 1\n".format(uutname, enum+1))
 
 def save_numpy(args, raw_channels):
     npfile = "{}/{}.npy".format(args.saveroot, args.uut)
@@ -271,8 +334,7 @@ def save_numpy(args, raw_channels):
     print("save_numpy {}  {}".format(npfile, cooked))
     np.save(npfile, cooked)
 
-def save_data(args, raw_channels):
-
+def make_saveroot(args):
     if os.name == "nt": # if system is windows.
         path = r'{}:\\demuxed\{}'.format(args.drive_letter, args.uut) # raw string literal so we can use \ in path.
         if not os.path.exists(path):
@@ -282,6 +344,9 @@ def save_data(args, raw_channels):
     else:
         subprocess.call(["mkdir", "-p", args.saveroot])
 
+def save_data(args, raw_channels):
+    make_saveroot(args)
+
     if args.save == 'npy':
         save_numpy(args, raw_channels)
     else:
@@ -395,8 +460,8 @@ def plot_data_kst(args, raw_channels):
         yu1 = yu
         if args.egu:
             try:
-            # chan2volts ch index from 1:
-                channel = args.the_uut.chan2volts(ch1, channel)
+            # calibration ch index from 1, fetched once per shot:
+                channel = args.the_uut.get_calibration().volts(channel, ch1)
             except IndexError:
                 yu1 = 'code'
                 print("ERROR: no calibration for CH{:02d}".format(ch1))
@@ -470,6 +535,11 @@ def process_data(args):
         NCHAN = args.nchan * 2
         print("nchan = ", args.nchan)
 
+    if args.jobs > 1 and args.save != None and args.save != 'npy' and not os.path.isfile(args.src) \
+                and not args.double_up and not args.stack_480:
+        demux_pipelined(args, NCHAN)
+        return
+
     raw_data = read_data(args, NCHAN) if not os.path.isfile(args.src) else read_data_file(args, NCHAN)
 
     if args.cmap:
@@ -636,6 +706,7 @@ def get_parser(parser=None):
     parser.add_argument('--traces_per_plot', default=1, type=int, help="traces_per_plot")
     parser.add_argument('--schan', default=None, type=list_of_ints, help="channels to save ie 1,49,50")
     parser.add_argument('--cmap', default=1, type=int, help="use embedded channel mapping")
+    parser.add_argument('--jobs', default=1, type=int, help="N>1: pipelined demux in N processes, --save is written incrementally, no plot")
     if is_client:
         parser.add_argument('uuts', nargs='+',help='uut - for auto configuration data_type, nchan, egu or just a label')
     return parser
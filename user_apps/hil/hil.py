@@ -8,6 +8,7 @@ assumes that clocking has been pre-assigned.
 usage: hil.py [-h] [--files FILES] [--loop LOOP] [--store STORE]
               [--nchan NCHAN] [--aochan AOCHAN] [--awglen AWGLEN]
               [--post POST] [--trg TRG] [--wait_user WAIT_USER]
+              [--pipeline PIPELINE]
               uuts
 
 acq1001 HIL demo
@@ -27,6 +28,7 @@ optional arguments:
   --trg TRG             trg "int|ext rising|falling"
   --wait_user WAIT_USER
                         1: force user input each shot
+  --pipeline PIPELINE   N: store shot while next N shots run
 """
 
 
@@ -66,6 +68,24 @@ def run_shots(args):
         
     store = store_file
     loader = work.load()
+
+    if args.pipeline and (not args.store or args.wait_user):
+        print("WARNING: --pipeline ignored with {}, shots run in series".format(
+                "--wait_user" if args.wait_user else "--store 0"))
+    elif args.pipeline:
+        # DEMUX=0: the raw copy frees the uut, store shot N while shot N+1 runs
+        def prepare(ii):
+            print("shot: %d" % (ii))
+            print("Loaded %s" % (next(loader)))
+        pipe = acq400_hapi.ShotPipeline(acq400_hapi.ShotController([uut]), prepare=prepare,
+                    run=lambda ii: uut.run_oneshot(),
+                    capture=lambda ii: uut.read_chan(0, args.post*args.nchan),
+                    process=lambda ii, rdata: store(ii, rdata, args.nchan, args.post),
+                    depth=args.pipeline)
+        pipe.run(args.loop)
+        print(pipe.report())
+        return
+
     for ii in range(0, args.loop):
         print("shot: %d" % (ii))
         f = next(loader)
@@ -91,6 +111,7 @@ def run_main():
     parser.add_argument('--post', type=int, default=100000, help='samples in ADC waveform')
     parser.add_argument('--trg', default="int", help='trg "int|ext rising|falling"')
     parser.add_argument('--wait_user', type=int, default=0, help='1: force user input each shot')
+    parser.add_argument('--pipeline', type=int, default=0, help='N: store shot while next N shots run')
     parser.add_argument('uuts', nargs=1, help="uut ")
     run_shots(parser.parse_args())
 
@@ -5,6 +5,8 @@ Read data from 0:SLOWMON:MEAN then plot and save
 
 Usage:
     ./user_apps/pyepics/slowmon_archiver.py  acq2106_007 --runtime=60 --pchan=1-5,161 --ptime=1
+
+For long runs on many uuts without EPICS see user_apps/acq400/acq400_slowmon_archive.py
 """
 
 import argparse
@@ -96,7 +98,7 @@ def callback(pvname, value, *args, **kwargs):
     uut = pvname.split(':')[0]
     samplelen = len(value)
     start = dataset[uut].cursor
-    if cursor >= dataset[uut].datalen:
+    if start >= dataset[uut].datalen:
         return
     finish = start + samplelen
     dataset[uut].data[start:finish] = value
@@ -19,15 +19,13 @@ $MAD32 --len=8192 --amp=0.1 --offset_by_channel=0.1 --ncycles=64 32CH_0V1_8192_P
 
 import numpy as np
 import argparse
+from acq400_hapi import waveforms
 
 def make_awg_data(args):
-    x = np.linspace(0, args.ncycles*np.pi, args.len)
-    y = args.amp * np.sin(x)
-    volts = np.zeros([args.len, args.nchan])
-    for ch in range(args.nchan):
-        volts[:,ch] = np.add(y, ch*args.offset_by_channel)
-    
-    raw = (volts * 32767/10).astype(np.int16)
+    # ncycles half cycles, end point included
+    y = waveforms.sine(args.len, args.ncycles/2, endpoint=True)
+    raw = waveforms.channel_set(y, args.nchan, offsets=np.arange(args.nchan)*args.offset_by_channel,
+                                amp=args.amp, vfs=10)
     raw.tofile(args.fname[0])
     
     
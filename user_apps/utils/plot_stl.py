@@ -12,38 +12,27 @@ Usage:
 import argparse
 import matplotlib.pyplot as plt
 import numpy as np
+from acq400_hapi.stl import Stl, split_line
 
 def run_main(args):
 
-    stl_def = []
-    hex_max = ''
+    stl = Stl.from_file(args.stl)
+    hex_max = max((split_line(ll)[1] for ll in stl.lines), key=len)
 
-    with open(args.stl, 'r') as fp:
-        for line in fp:
-
-            line = line.split('#')[0].strip()
-            if not line: continue
-            pos, state = line.split(',')
-            if not stl_def: pos = '0'
-
-            bitmask = hex_to_bitmask(state)
-            if len(state) > len(hex_max): hex_max = state
-
-            last_pos = 0
-            if pos.startswith('+'): last_pos += stl_def[-1][0] if stl_def else 0
-            stl_def.append((int(pos) + last_pos, state, bitmask))
-
-    last_pos = stl_def[-1][0]
+    pos = stl.rebased_time()
+    last_pos = pos[-1]
     bits = len(hex_to_bitmask(hex_max))
     if args.ndo > bits: args.ndo = bits
+    # one row per bit, LSB first
+    masks = (stl.state[:, None] >> np.arange(bits, dtype=np.uint64)) & np.uint64(1)
     data = np.zeros((bits, last_pos), dtype=bool)
 
-    for idx, (pos, hex, mask) in enumerate(stl_def):
+    for idx, (line, mask) in enumerate(zip(stl.lines, masks)):
 
-        next_pos = stl_def[idx + 1][0] if idx + 1 < len(stl_def) else None
-        data[:, pos:next_pos] = np.array(mask[::-1])[:, None]
+        next_pos = pos[idx + 1] if idx + 1 < len(pos) else None
+        data[:, pos[idx]:next_pos] = mask.astype(bool)[:, None]
 
-        print(f"transition {pos} = {hex}")
+        print(f"transition {pos[idx]} = {split_line(line)[1]}")
 
     fig, axes = plt.subplots(args.ndo, 1, figsize=(10, 2 * args.ndo), sharex=True, squeeze=False)
 
@@ -37,6 +37,7 @@ import argparse
 import numpy as np
 import time
 from matplotlib import pyplot as plt
+from acq400_hapi import waveforms
 
 class WaveGen():
 
@@ -154,7 +155,8 @@ class WaveGen():
             if not hush:
                 print(f"CH {chan + 1} {gen_wave.__name__} offset[{offset}] phase[{phase}] spos[{spos}] scale[{scale}] wavelength[{wavelength}] crop[{crop}]")
 
-            self.data[chan::self.nchan][d0:d1] = (gen_wave(wavelength, phase) * (self.max_value * scale) ).astype(self.dtype)[w0:w1]
+            np.multiply(gen_wave(wavelength, phase)[w0:w1], self.max_value * scale,
+                        out=self.data[chan::self.nchan][d0:d1], casting='unsafe')
             self.data[chan::self.nchan] += offset
 
     def __get_wave(self, chan):
@@ -219,13 +221,13 @@ class WaveGen():
         return int((self.__cycler_generic(self.offset, "offset") / self.voltage) * self.max_value)
     
     def __gen_sine(self, wavelength, phase):
-        return np.sin(np.linspace(-phase, -phase + (self.cycles * 2) * np.pi, wavelength))
+        return waveforms.sine(wavelength, self.cycles, phase=-phase, endpoint=True)
     
     def __gen_ramp(self, wavelength, phase):
-        return np.mod(np.linspace(0, self.cycles, wavelength) + phase, 1)
+        return waveforms.ramp(wavelength, self.cycles, phase)
     
     def __gen_square(self, wavelength, phase):
-        return np.sign(self.__gen_sine(wavelength, phase))
+        return waveforms.square(wavelength, self.cycles, phase=-phase, endpoint=True)
     
     def __gen_null(self, wavelength, phase):
         return np.zeros(self.wavelength, dtype=self.dtype)